@@ -1,6 +1,9 @@
+import os
 from setuptools import setup, find_packages
 
-__version__ = '0.2.3'
+# Read without importing vlite, whose dependencies are not installed yet
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vlite', 'version.py')) as version_file:
+    exec(version_file.read())
 
 setup(
     name='vlite',
@@ -23,7 +26,8 @@ setup(
         'tokenizers==0.15.2',
     ],
     extras_require={
-        'ocr': ['surya-ocr-vlite']
+        'ocr': ['surya-ocr-vlite'],
+        'onnx': ['onnxruntime==1.17.1']
     },
     python_requires='>=3.10',
     classifiers=[
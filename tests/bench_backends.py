@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.model import EmbeddingModel
+
+
+def sample_corpus(num_texts, seed=0):
+    rng = np.random.default_rng(seed)
+    words = "the quick brown fox jumps over a lazy dog while vector search engines index binary codes".split()
+    return [" ".join(rng.choice(words, size=rng.integers(4, 64))) for _ in range(num_texts)]
+
+
+def main(model_name, backends, num_texts) -> pd.DataFrame:
+    """Benchmark the embedding backends on the CPU and compare their binary codes.
+
+    Parameters
+    ----------
+    model_name : str
+        The embedding model to load.
+    backends : list
+        The backends to time; the first one is the reference for the code comparison.
+    num_texts : int
+        The number of texts embedded by each backend.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The load time, throughput and differing bits of each backend.
+    """
+    texts = sample_corpus(num_texts)
+    results = []
+    reference = None
+    for backend in backends:
+        t0 = time.perf_counter()
+        model = EmbeddingModel(model_name, device='cpu', backend=backend)
+        load_time = time.perf_counter() - t0
+        model.embed(texts[:8])
+        t0 = time.perf_counter()
+        codes = model.embed(texts)
+        elapsed = time.perf_counter() - t0
+        if reference is None:
+            reference = codes
+        differing_bits = int(np.unpackbits(codes ^ reference).sum())
+        print(f"{backend:>6}: load {load_time:7.2f} s, {num_texts / elapsed:8.1f} texts/s, {differing_bits} bits differ")
+        results.append({"backend": backend, "load_s": load_time, "texts_per_s": num_texts / elapsed, "differing_bits": differing_bits})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vlite embedding backends.")
+    parser.add_argument("--model", default="mixedbread-ai/mxbai-embed-large-v1")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--texts", type=int, default=1000)
+    args = parser.parse_args()
+    results = main(args.model, args.backends, args.texts)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_backend_benchmark.csv"), index=False)
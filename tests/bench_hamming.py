@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.hamming import hamming_distances
+
+
+def reference_distances(query, codes):
+    return np.unpackbits(codes ^ query, axis=1).sum(axis=1)
+
+
+def main(sizes, code_size, num_queries) -> pd.DataFrame:
+    """Benchmark the packed Hamming scan over corpora of increasing size.
+
+    Parameters
+    ----------
+    sizes : list
+        The numbers of codes to scan.
+    code_size : int
+        The width of each packed code in bytes.
+    num_queries : int
+        The number of queries timed for each corpus size.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The mean scan latency and throughput for each corpus size.
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        codes = rng.integers(0, 256, size=(size, code_size), dtype=np.uint8)
+        queries = rng.integers(0, 256, size=(num_queries, code_size), dtype=np.uint8)
+        check = min(size, 10000)
+        assert np.array_equal(hamming_distances(queries[0], codes[:check]), reference_distances(queries[0], codes[:check]))
+
+        t0 = time.perf_counter()
+        for query in queries:
+            hamming_distances(query, codes)
+        elapsed = (time.perf_counter() - t0) / num_queries
+
+        print(f"{size:>10} codes: {elapsed * 1000:9.3f} ms/query, {size / elapsed / 1e6:8.2f} M codes/s")
+        results.append({"num_codes": size, "code_size": code_size, "latency_ms": elapsed * 1000, "mcodes_per_s": size / elapsed / 1e6})
+        del codes
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vlite Hamming kernel.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--code-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+    results = main(args.sizes, args.code_size, args.queries)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_hamming_benchmark.csv"), index=False)
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.hamming import hamming_search
+from vlite.index import HnswIndex
+from bench_mih import clustered_codes
+
+
+def main(size, code_size, num_queries, top_k, m, ef_construction, ef_searches, flip_rate) -> pd.DataFrame:
+    """Report recall@k against latency of the HNSW graph for several ef_search, against the linear scan.
+
+    Parameters
+    ----------
+    size : int
+        The number of codes to index.
+    code_size : int
+        The width of each packed code in bytes.
+    num_queries : int
+        The number of queries timed for each setting.
+    top_k : int
+        The number of neighbours returned per query.
+    m : int
+        The number of neighbours of every node on the upper layers (2 * m on layer 0).
+    ef_construction : int
+        The number of candidates considered when inserting a node.
+    ef_searches : list
+        The numbers of candidates considered per query.
+    flip_rate : float
+        The fraction of bits flipped between a code and its cluster center.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The recall@k and mean query latency of the scan and of every ef_search.
+    """
+    rng = np.random.default_rng(0)
+    codes = clustered_codes(rng, size, code_size, max(size // 100, 1), flip_rate)
+    queries = codes[rng.integers(0, size, num_queries)] ^ np.packbits(rng.random((num_queries, code_size * 8)) < flip_rate, axis=1)
+
+    t0 = time.perf_counter()
+    expected = [hamming_search(query, codes, top_k)[0] for query in queries]
+    scan_latency = (time.perf_counter() - t0) / num_queries
+    print(f"scan: recall@{top_k} 1.000, {scan_latency * 1000:9.3f} ms/query")
+    results = [{"engine": "scan", "ef_search": 0, "build_s": 0.0, "recall": 1.0, "latency_ms": scan_latency * 1000}]
+
+    t0 = time.perf_counter()
+    index = HnswIndex(m=m, ef_construction=ef_construction).build(codes)
+    build_time = time.perf_counter() - t0
+    print(f"hnsw: {size} nodes on {index.max_level + 1} layers inserted in {build_time:.2f} s ({build_time / size * 1000:.3f} ms/insert)")
+    for ef_search in ef_searches:
+        index.ef_search = ef_search
+        t0 = time.perf_counter()
+        found = [index.search(query, codes, top_k)[0] for query in queries]
+        latency = (time.perf_counter() - t0) / num_queries
+        recall = np.mean([len(np.intersect1d(rows, expected_rows)) / len(expected_rows) for rows, expected_rows in zip(found, expected)])
+        print(f"hnsw ef_search {ef_search:>4}: recall@{top_k} {recall:.3f}, {latency * 1000:9.3f} ms/query")
+        results.append({"engine": "hnsw", "ef_search": ef_search, "build_s": build_time, "recall": recall, "latency_ms": latency * 1000})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall@k vs latency of the vlite HNSW graph.")
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--code-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-searches", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--flip-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    results = main(args.size, args.code_size, args.queries, args.top_k, args.m, args.ef_construction, args.ef_searches, args.flip_rate)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_hnsw_benchmark.csv"), index=False)
@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.hamming import hamming_search
+from vlite.index import InvertedFileIndex
+from bench_mih import clustered_codes
+
+
+def main(size, code_size, num_queries, top_k, nlist, nprobes, flip_rate) -> pd.DataFrame:
+    """Report recall@k against latency of the IVF index for several nprobe, against the linear scan.
+
+    Parameters
+    ----------
+    size : int
+        The number of codes to index.
+    code_size : int
+        The width of each packed code in bytes.
+    num_queries : int
+        The number of queries timed for each setting.
+    top_k : int
+        The number of neighbours returned per query.
+    nlist : int
+        The number of posting lists, or 0 for about sqrt(size).
+    nprobes : list
+        The numbers of posting lists probed per query.
+    flip_rate : float
+        The fraction of bits flipped between a code and its cluster center.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The recall@k and mean query latency of the scan and of every nprobe.
+    """
+    rng = np.random.default_rng(0)
+    codes = clustered_codes(rng, size, code_size, max(size // 100, 1), flip_rate)
+    queries = codes[rng.integers(0, size, num_queries)] ^ np.packbits(rng.random((num_queries, code_size * 8)) < flip_rate, axis=1)
+
+    t0 = time.perf_counter()
+    expected = [hamming_search(query, codes, top_k)[0] for query in queries]
+    scan_latency = (time.perf_counter() - t0) / num_queries
+    print(f"scan: recall@{top_k} 1.000, {scan_latency * 1000:9.3f} ms/query")
+    results = [{"engine": "scan", "nlist": 0, "nprobe": 0, "build_s": 0.0, "recall": 1.0, "latency_ms": scan_latency * 1000}]
+
+    t0 = time.perf_counter()
+    index = InvertedFileIndex(nlist=nlist or None).build(codes)
+    build_time = time.perf_counter() - t0
+    print(f"ivf: {len(index.centroids)} lists trained and filled in {build_time:.2f} s")
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        t0 = time.perf_counter()
+        found = [index.search(query, codes, top_k)[0] for query in queries]
+        latency = (time.perf_counter() - t0) / num_queries
+        recall = np.mean([len(np.intersect1d(rows, expected_rows)) / len(expected_rows) for rows, expected_rows in zip(found, expected)])
+        print(f"ivf nprobe {nprobe:>4}: recall@{top_k} {recall:.3f}, {latency * 1000:9.3f} ms/query")
+        results.append({"engine": "ivf", "nlist": len(index.centroids), "nprobe": nprobe, "build_s": build_time, "recall": recall, "latency_ms": latency * 1000})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall@k vs latency of the vlite IVF index.")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--code-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--flip-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    results = main(args.size, args.code_size, args.queries, args.top_k, args.nlist, args.nprobes, args.flip_rate)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_ivf_benchmark.csv"), index=False)
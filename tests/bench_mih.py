@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.hamming import hamming_search
+from vlite.index import BinaryVectorIndex
+
+
+def clustered_codes(rng, size, code_size, num_clusters, flip_rate):
+    """Codes scattered around random centers, like the codes of embeddings of related texts."""
+    centers = rng.integers(0, 256, size=(num_clusters, code_size), dtype=np.uint8)
+    codes = centers[rng.integers(0, num_clusters, size)]
+    for start in range(0, size, 100_000):
+        block = codes[start:start + 100_000]
+        block ^= np.packbits(rng.random((len(block), code_size * 8)) < flip_rate, axis=1)
+    return codes
+
+
+def main(sizes, code_size, num_queries, top_k, flip_rate) -> pd.DataFrame:
+    """Benchmark multi-index hashing against the linear Hamming scan.
+
+    Parameters
+    ----------
+    sizes : list
+        The numbers of codes to index.
+    code_size : int
+        The width of each packed code in bytes.
+    num_queries : int
+        The number of queries timed for each corpus size.
+    top_k : int
+        The number of neighbours returned per query.
+    flip_rate : float
+        The fraction of bits flipped between a code and its cluster center.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The build time and the mean query latency of both engines for each corpus size.
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        codes = clustered_codes(rng, size, code_size, max(size // 100, 1), flip_rate)
+        queries = codes[rng.integers(0, size, num_queries)] ^ np.packbits(rng.random((num_queries, code_size * 8)) < flip_rate, axis=1)
+
+        t0 = time.perf_counter()
+        index = BinaryVectorIndex().build(codes)
+        build_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        expected = [hamming_search(query, codes, top_k) for query in queries]
+        scan_latency = (time.perf_counter() - t0) / num_queries
+        t0 = time.perf_counter()
+        found = [index.search(query, codes, top_k) for query in queries]
+        mih_latency = (time.perf_counter() - t0) / num_queries
+        exact = all(np.array_equal(rows, expected_rows) for (rows, _), (expected_rows, _) in zip(found, expected))
+
+        print(f"{size:>10} codes: build {build_time:7.2f} s, scan {scan_latency * 1000:9.3f} ms/query, mih {mih_latency * 1000:9.3f} ms/query, exact {exact}")
+        results.append({
+            "num_codes": size,
+            "code_size": code_size,
+            "substrings": len(index.bounds),
+            "build_s": build_time,
+            "scan_latency_ms": scan_latency * 1000,
+            "mih_latency_ms": mih_latency * 1000,
+            "speedup": scan_latency / mih_latency,
+            "exact": exact,
+        })
+        del codes, index
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vlite multi-index hashing against the linear scan.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--code-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--flip-rate", type=float, default=0.03)
+    args = parser.parse_args()
+    results = main(args.sizes, args.code_size, args.queries, args.top_k, args.flip_rate)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_mih_benchmark.csv"), index=False)
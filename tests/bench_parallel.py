@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.hamming import hamming_search
+from vlite.index import ShardedScanIndex
+
+
+def main(sizes, code_size, num_queries, top_k, thread_counts) -> pd.DataFrame:
+    """Benchmark the sharded scan against the single-threaded scan for increasing thread counts.
+
+    Parameters
+    ----------
+    sizes : list
+        The numbers of codes to scan.
+    code_size : int
+        The width of each packed code in bytes.
+    num_queries : int
+        The number of queries timed for each setting.
+    top_k : int
+        The number of neighbours returned per query.
+    thread_counts : list
+        The numbers of scan threads to time.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The mean query latency, throughput and speedup over the single-threaded scan for each
+        corpus size and thread count.
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        codes = rng.integers(0, 256, size=(size, code_size), dtype=np.uint8)
+        queries = rng.integers(0, 256, size=(num_queries, code_size), dtype=np.uint8)
+
+        t0 = time.perf_counter()
+        expected = [hamming_search(query, codes, top_k) for query in queries]
+        scan_latency = (time.perf_counter() - t0) / num_queries
+        print(f"{size:>10} codes, scan: {scan_latency * 1000:9.3f} ms/query, {size / scan_latency / 1e6:8.2f} M codes/s")
+        results.append({"num_codes": size, "threads": 0, "latency_ms": scan_latency * 1000, "mcodes_per_s": size / scan_latency / 1e6, "speedup": 1.0})
+
+        for num_threads in thread_counts:
+            index = ShardedScanIndex(num_threads=num_threads)
+            # The first search starts the pool
+            index.search(queries[0], codes, top_k)
+            t0 = time.perf_counter()
+            found = [index.search(query, codes, top_k) for query in queries]
+            latency = (time.perf_counter() - t0) / num_queries
+            assert all(np.array_equal(rows, expected_rows) for (rows, _), (expected_rows, _) in zip(found, expected))
+            print(f"{size:>10} codes, {num_threads:>3} threads: {latency * 1000:9.3f} ms/query, {size / latency / 1e6:8.2f} M codes/s, {scan_latency / latency:5.2f}x")
+            results.append({"num_codes": size, "threads": num_threads, "latency_ms": latency * 1000, "mcodes_per_s": size / latency / 1e6, "speedup": scan_latency / latency})
+            if index.executor is not None:
+                index.executor.shutdown()
+        del codes
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark the vlite sharded Hamming scan.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 4_000_000])
+    parser.add_argument("--code-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({2 ** i for i in range(cpu_count.bit_length())} | {cpu_count}))
+    args = parser.parse_args()
+    results = main(args.sizes, args.code_size, args.queries, args.top_k, args.threads)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_parallel_benchmark.csv"), index=False)
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.model import EmbeddingModel
+from vlite.hamming import hamming_search, sign_bit_disagreement
+from bench_backends import sample_corpus
+
+
+def recall_at_k(reference_codes, codes, top_k):
+    """Mean overlap of the top_k neighbours of every text under the two sets of codes."""
+    overlaps = []
+    for reference_query, query in zip(reference_codes, codes):
+        expected, _ = hamming_search(reference_query, reference_codes, top_k)
+        found, _ = hamming_search(query, codes, top_k)
+        overlaps.append(len(set(expected.tolist()) & set(found.tolist())) / top_k)
+    return float(np.mean(overlaps))
+
+
+def main(model_name, backends, num_texts, top_k) -> pd.DataFrame:
+    """Compare the binary codes of the dynamically quantized int8 model with the fp32 model.
+
+    Parameters
+    ----------
+    model_name : str
+        The embedding model to load.
+    backends : list
+        The backends to check, each in fp32 and int8.
+    num_texts : int
+        The number of texts of the sample corpus.
+    top_k : int
+        The number of neighbours compared for recall.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The throughput of each mode, and the sign-bit disagreement and recall@k of int8 against fp32.
+    """
+    texts = sample_corpus(num_texts)
+    results = []
+    for backend in backends:
+        codes = {}
+        for quantize in (False, True):
+            model = EmbeddingModel(model_name, device='cpu', backend=backend, quantize=quantize)
+            model.embed(texts[:8])
+            t0 = time.perf_counter()
+            codes[quantize] = model.embed(texts)
+            elapsed = time.perf_counter() - t0
+            result = {"backend": backend, "precision": "int8" if quantize else "fp32", "texts_per_s": num_texts / elapsed}
+            if quantize:
+                result.update(sign_bit_disagreement(codes[False], codes[True]))
+                result[f"recall@{top_k}"] = recall_at_k(codes[False], codes[True], top_k)
+            print(result)
+            results.append(result)
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the accuracy and speed of the int8 embedding model.")
+    parser.add_argument("--model", default="mixedbread-ai/mxbai-embed-large-v1")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    results = main(args.model, args.backends, args.texts, args.top_k)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_quantization_benchmark.csv"), index=False)
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vlite.model import EmbeddingModel
+from vlite.hamming import hamming_search
+from vlite.rescore import rescore
+from bench_backends import sample_corpus
+
+
+def main(model_name, num_texts, num_queries, top_k, multipliers) -> pd.DataFrame:
+    """Measure recall@k of binary retrieval with and without rescoring, against exact float search.
+
+    Parameters
+    ----------
+    model_name : str
+        The embedding model to load.
+    num_texts : int
+        The number of texts in the corpus.
+    num_queries : int
+        The number of queries.
+    top_k : int
+        The number of results compared per query.
+    multipliers : list
+        The rescore multipliers to try.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        The recall@k and mean query latency of each configuration.
+    """
+    model = EmbeddingModel(model_name, device='cpu')
+    texts, queries = sample_corpus(num_texts, seed=1), sample_corpus(num_queries, seed=2)
+    codes, int8, float16, floats = model.embed_many(texts, ("binary", "int8", "float16", "float32"))
+    query_codes, query_floats = model.embed_many(queries, ("binary", "float32"))
+    exact = [set(np.argsort(-(floats @ query))[:top_k].tolist()) for query in query_floats]
+
+    def evaluate(name, search):
+        t0 = time.perf_counter()
+        found = [search(query_code, query_float) for query_code, query_float in zip(query_codes, query_floats)]
+        latency = (time.perf_counter() - t0) / num_queries
+        recall = np.mean([len(expected & set(rows.tolist())) / top_k for expected, rows in zip(exact, found)])
+        print(f"{name:>20}: recall@{top_k} {recall:.3f}, {latency * 1000:8.3f} ms/query")
+        return {"configuration": name, f"recall@{top_k}": recall, "latency_ms": latency * 1000}
+
+    results = [evaluate("binary", lambda code, _: hamming_search(code, codes, top_k)[0])]
+    for name, vectors in (("int8", int8), ("float16", float16)):
+        for multiplier in multipliers:
+            results.append(evaluate(
+                f"{name} x{multiplier}",
+                lambda code, query, vectors=vectors, multiplier=multiplier: rescore(query, vectors, hamming_search(code, codes, top_k * multiplier)[0], top_k)[0]
+            ))
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark two-stage retrieval with rescoring.")
+    parser.add_argument("--model", default="mixedbread-ai/mxbai-embed-large-v1")
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--multipliers", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+    results = main(args.model, args.texts, args.queries, args.top_k, args.multipliers)
+    results.to_csv(os.path.join(os.path.dirname(__file__), "vlite_rescore_benchmark.csv"), index=False)
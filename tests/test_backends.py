@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+from vlite.model import EmbeddingModel
+
+HAS_ONNX = all(importlib.util.find_spec(name) for name in ("onnxruntime", "torch", "transformers"))
+
+
+@unittest.skipUnless(HAS_ONNX, "needs onnxruntime, torch and transformers")
+class TestOnnxBackend(unittest.TestCase):
+    def setUp(self):
+        import torch
+        from transformers import BertConfig, BertModel, BertTokenizerFast
+        # A tiny randomly initialized BERT saved locally, so nothing is downloaded
+        self.directory = tempfile.mkdtemp()
+        self.model_dir = os.path.join(self.directory, "tiny-bert")
+        os.makedirs(self.model_dir)
+        vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [chr(char) for char in range(ord("a"), ord("z") + 1)] + ["vlite", "binary", "code"]
+        vocab_path = os.path.join(self.model_dir, "vocab.txt")
+        with open(vocab_path, "w") as file:
+            file.write("\n".join(vocab))
+        BertTokenizerFast(vocab_path).save_pretrained(self.model_dir)
+        torch.manual_seed(0)
+        config = BertConfig(vocab_size=len(vocab), hidden_size=128, num_hidden_layers=2, num_attention_heads=2, intermediate_size=256, max_position_embeddings=64)
+        BertModel(config).save_pretrained(self.model_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_codes_match_the_torch_backend(self):
+        # Inputs of different lengths, so micro-batches are padded
+        texts = ["vlite binary code", "a b c d e f g h", "hello world", "code", "x y z vlite"] * 3
+        torch_model = EmbeddingModel(self.model_dir, backend="torch", code_bits=128)
+        onnx_model = EmbeddingModel(self.model_dir, backend="onnx", code_bits=128, backend_options={"cache_dir": os.path.join(self.directory, "onnx")})
+        torch_codes, torch_vectors = torch_model.embed_many(texts, ("binary", "float32"))
+        onnx_codes, onnx_vectors = onnx_model.embed_many(texts, ("binary", "float32"))
+        self.assertEqual(onnx_codes.shape, (len(texts), 16))
+        # Features within rounding error of zero may flip their sign, nothing else may
+        self.assertLessEqual(int(np.unpackbits(torch_codes ^ onnx_codes).sum()), len(texts))
+        np.testing.assert_allclose(onnx_vectors, torch_vectors, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
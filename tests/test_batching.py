@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+from vlite.batching import token_budget_batches
+
+
+class TestTokenBudgetBatches(unittest.TestCase):
+    def test_batches_cover_inputs_under_budget(self):
+        rng = np.random.default_rng(0)
+        lengths = rng.integers(1, 512, size=1000)
+        batches = token_budget_batches(lengths, max_batch_tokens=4096, max_batch_size=64)
+        covered = np.concatenate(batches)
+        self.assertEqual(sorted(covered.tolist()), list(range(1000)))
+        for batch in batches:
+            self.assertLessEqual(len(batch), 64)
+            self.assertLessEqual(len(batch) * lengths[batch].max(), 4096)
+
+    def test_longest_first_and_oversized_inputs(self):
+        batches = token_budget_batches([3, 10, 1, 10], max_batch_tokens=8)
+        self.assertEqual([batch.tolist() for batch in batches], [[1], [3], [0, 2]])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
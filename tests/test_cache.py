@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from vlite.cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.cache")
+        self.codes = np.random.default_rng(0).integers(0, 256, size=(3, 64), dtype=np.uint8)
+        self.keys = [EmbeddingCache.key("model", "binary", text) for text in ["a", "b", "c"]]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keys_depend_on_model_and_precision(self):
+        self.assertNotEqual(EmbeddingCache.key("model", "binary", "a"), EmbeddingCache.key("other", "binary", "a"))
+        self.assertNotEqual(EmbeddingCache.key("model", "binary", "a"), EmbeddingCache.key("model", "int8", "a"))
+
+    def test_lru_eviction_and_counters(self):
+        cache = EmbeddingCache(capacity=2)
+        cache.put_many(self.keys, self.codes)
+        codes = cache.get_many(self.keys)
+        self.assertIsNone(codes[0])
+        np.testing.assert_array_equal(codes[2], self.codes[2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_disk_tier(self):
+        cache = EmbeddingCache(capacity=1, path=self.path)
+        cache.put_many(self.keys, self.codes)
+        # A torn record at the end of the file is ignored
+        with open(self.path, "ab") as file:
+            file.write(b"\x00" * 10)
+        reopened = EmbeddingCache(capacity=1, path=self.path)
+        self.assertEqual(len(reopened), 3)
+        for key, code in zip(self.keys, self.codes):
+            np.testing.assert_array_equal(reopened.get_many([key])[0], code)
+        self.assertEqual(reopened.stats()["disk_hits"], 3)
+        reopened.put_many([EmbeddingCache.key("model", "binary", "d")], self.codes[:1])
+        self.assertEqual(len(EmbeddingCache(path=self.path)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import struct
+import json
+import unittest
+import numpy as np
+from vlite.ctx import Ctx, CtxFile, CtxSectionType
+
+
+class TestCtxWriteAheadLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ctx = Ctx(directory=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def vector(self, value):
+        return np.full(64, value, dtype=np.uint8)
+
+    def test_replay_on_load(self):
+        ctx_file = self.ctx.create("wal")
+        ctx_file.append_put([("a_0", self.vector(1), "first", {"k": 1}), ("b_0", self.vector(2), "second", {})])
+        ctx_file.append_put([("a_0", self.vector(3), "first, updated", {"k": 2})])
+        ctx_file.append_delete(["b_0"])
+        self.assertFalse(os.path.exists(ctx_file.file_path))
+
+        loaded = self.ctx.read("wal")
+        loaded.load()
+        self.assertEqual(list(loaded.metadata), ["a_0"])
+        self.assertEqual(loaded.contexts, ["first, updated"])
+        self.assertEqual(loaded.metadata["a_0"], {"k": 2})
+        np.testing.assert_array_equal(loaded.embeddings, [self.vector(3)])
+
+    def test_compact_folds_log_into_base(self):
+        ctx_file = self.ctx.create("wal")
+        ctx_file.add_embedding(self.vector(1))
+        ctx_file.add_context("base")
+        ctx_file.add_metadata("a_0", {})
+        ctx_file.save()
+        ctx_file.append_put([("b_0", self.vector(2), "logged", {"x": True})])
+        self.assertGreater(ctx_file.wal_size(), 0)
+
+        self.ctx.compact("wal")
+        self.assertEqual(ctx_file.wal_size(), 0)
+        loaded = self.ctx.read("wal")
+        loaded.load()
+        self.assertEqual(loaded.contexts, ["base", "logged"])
+        self.assertEqual(list(loaded.metadata), ["a_0", "b_0"])
+        np.testing.assert_array_equal(loaded.embeddings, [self.vector(1), self.vector(2)])
+
+    def test_truncated_record_is_ignored(self):
+        ctx_file = self.ctx.create("wal")
+        ctx_file.append_put([("a_0", self.vector(1), "kept", {})])
+        ctx_file.append_put([("b_0", self.vector(2), "torn", {})])
+        with open(ctx_file.wal_path, "r+b") as file:
+            file.truncate(ctx_file.wal_size() - 10)
+        loaded = self.ctx.read("wal")
+        loaded.load()
+        self.assertEqual(loaded.contexts, ["kept"])
+
+    def test_rescore_embeddings_survive_replay_and_save(self):
+        ctx_file = self.ctx.create("wal")
+        rescores = np.arange(12, dtype=np.int8).reshape(3, 4)
+        ctx_file.append_put([(f"{i}_0", self.vector(i), f"c{i}", {}, rescores[i]) for i in range(3)])
+        ctx_file.append_delete(["1_0"])
+
+        loaded = self.ctx.read("wal")
+        loaded.load()
+        np.testing.assert_array_equal(loaded.rescore_array(), rescores[[0, 2]])
+
+        self.ctx.compact("wal")
+        loaded = self.ctx.read("wal")
+        loaded.load()
+        self.assertEqual(loaded.header["rescore_dtype"], "int8")
+        self.assertEqual(loaded.header["rescore_size"], 4)
+        np.testing.assert_array_equal(loaded.rescore_array(), rescores[[0, 2]])
+
+
+class TestCtxEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ctx = Ctx(directory=self.directory)
+        self.codes = np.random.default_rng(0).integers(0, 256, size=(10, 64), dtype=np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_embeddings_are_memory_mapped(self):
+        ctx_file = self.ctx.create("mapped")
+        ctx_file.embeddings = self.codes
+        for i in range(10):
+            ctx_file.add_context(f"context {i}")
+            ctx_file.add_metadata(f"item_{i}", {})
+        ctx_file.save()
+
+        loaded = self.ctx.read("mapped")
+        loaded.load()
+        self.assertIsInstance(loaded.embeddings, np.memmap)
+        self.assertEqual(loaded.embeddings.offset % CtxFile.EMBEDDING_ALIGNMENT, 0)
+        np.testing.assert_array_equal(loaded.embeddings, self.codes)
+        self.assertEqual(loaded.contexts[9], "context 9")
+
+    def test_header_records_native_dtype(self):
+        ctx_file = self.ctx.create("native")
+        ctx_file.set_header(embedding_model="m", embedding_size=0, embedding_dtype="float16", context_length=512)
+        vectors = np.random.default_rng(1).standard_normal((3, 24)).astype(np.float16)
+        for i, vector in enumerate(vectors):
+            ctx_file.add_embedding(vector.tolist())
+            ctx_file.add_context("")
+            ctx_file.add_metadata(f"item_{i}", {})
+        ctx_file.save()
+        self.assertLess(ctx_file.base_size(), 3 * 24 * 4 + 512)
+
+        loaded = self.ctx.read("native")
+        loaded.load()
+        self.assertEqual(loaded.header["embedding_dtype"], "float16")
+        self.assertEqual(loaded.header["embedding_size"], 24)
+        self.assertEqual(loaded.embeddings.dtype, np.float16)
+        np.testing.assert_array_equal(loaded.embeddings, vectors)
+
+    def test_header_records_code_bits(self):
+        ctx_file = self.ctx.create("bits")
+        ctx_file.embeddings = self.codes[:, :16]
+        for i in range(10):
+            ctx_file.add_context("")
+            ctx_file.add_metadata(f"item_{i}", {})
+        ctx_file.save()
+
+        loaded = self.ctx.read("bits")
+        loaded.load()
+        self.assertEqual(loaded.header["code_bits"], 128)
+        self.assertEqual(loaded.code_bits(), 128)
+        del loaded.header["code_bits"]
+        self.assertEqual(loaded.code_bits(), 128)
+
+    def test_reads_version_1(self):
+        path = self.ctx.get("legacy")
+        header = json.dumps({"embedding_model": "m", "embedding_size": 64, "embedding_dtype": "float32", "context_length": 512}).encode("utf-8")
+        embeddings = b"".join(struct.pack("<64f", *(code.astype(np.int16) - 128)) for code in self.codes)
+        contexts = b"".join(struct.pack("<I", 1) + b"x" for _ in self.codes)
+        metadata = json.dumps({f"item_{i}": {} for i in range(10)}).encode("utf-8")
+        with open(path, "wb") as file:
+            file.write(CtxFile.MAGIC_NUMBER + struct.pack("<I", 1))
+            for section_type, data in ((CtxSectionType.HEADER, header), (CtxSectionType.EMBEDDINGS, embeddings),
+                                       (CtxSectionType.CONTEXTS, contexts), (CtxSectionType.METADATA, metadata)):
+                file.write(struct.pack("<II", section_type.value, len(data)) + data)
+
+        loaded = self.ctx.read("legacy")
+        loaded.load()
+        np.testing.assert_array_equal(loaded.embeddings, self.codes)
+        self.assertEqual(loaded.header["embedding_dtype"], "uint8")
+        self.assertEqual(len(loaded.contexts), 10)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,36 @@
+import os
+import unittest
+from unittest import mock
+from vlite import device
+
+
+class TestResolveDevice(unittest.TestCase):
+    def setUp(self):
+        device.reset_device_cache()
+
+    def tearDown(self):
+        device.reset_device_cache()
+
+    def test_explicit_device_and_env_override(self):
+        self.assertEqual(device.resolve_device("cpu"), "cpu")
+        with mock.patch.dict(os.environ, {device.DEVICE_ENV_VAR: "mps"}):
+            self.assertEqual(device.resolve_device(), "mps")
+        with mock.patch.dict(os.environ, {device.DEVICE_ENV_VAR: "tpu"}):
+            with self.assertRaises(ValueError):
+                device.resolve_device()
+
+    def test_detection_is_cached(self):
+        with mock.patch.dict(os.environ, {device.DEVICE_ENV_VAR: ""}), \
+                mock.patch.object(device, "cuda_available", return_value=False) as cuda, \
+                mock.patch.object(device, "mps_available", return_value=False):
+            self.assertEqual(device.resolve_device(), "cpu")
+            self.assertEqual(device.resolve_device(), "cpu")
+        self.assertEqual(cuda.call_count, 1)
+
+    def test_no_mps_on_arm_linux(self):
+        with mock.patch("platform.system", return_value="Linux"), mock.patch("platform.machine", return_value="aarch64"):
+            self.assertFalse(device.mps_available())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,89 @@
+import unittest
+from unittest import mock
+import numpy as np
+from vlite import hamming
+from vlite.hamming import hamming_distances, hamming_search, hamming_search_batch, popcount, sign_bit_disagreement
+from vlite.topk import TopK, top_k_smallest
+
+
+class TestHamming(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def reference(self, query, codes):
+        return np.unpackbits(codes ^ query, axis=1).sum(axis=1)
+
+    def test_popcount(self):
+        words = self.rng.integers(0, 2**63, size=100, dtype=np.uint64)
+        expected = [bin(int(w)).count("1") for w in words]
+        self.assertEqual(popcount(words).astype(int).tolist(), expected)
+
+    def test_exact_bit_distances(self):
+        for code_size in (64, 12):
+            codes = self.rng.integers(0, 256, size=(1000, code_size), dtype=np.uint8)
+            query = codes[3]
+            distances = hamming_distances(query, codes, block_size=128)
+            np.testing.assert_array_equal(distances, self.reference(query, codes))
+            self.assertEqual(distances[3], 0)
+
+    def test_popcount_fallback_without_bitwise_count(self):
+        # The SWAR and table paths numpy < 2.0 runs, whatever numpy the tests run with
+        with mock.patch.object(hamming, "HAS_BITWISE_COUNT", False):
+            words = self.rng.integers(0, 2**63, size=100, dtype=np.uint64)
+            self.assertEqual(popcount(words).astype(int).tolist(), [bin(int(w)).count("1") for w in words])
+            for rows, code_size in ((1000, 64), (37, 12), (257, 256), (5, 3), (100, 264)):
+                codes = self.rng.integers(0, 256, size=(rows, code_size), dtype=np.uint8)
+                query = self.rng.integers(0, 256, size=code_size, dtype=np.uint8)
+                np.testing.assert_array_equal(hamming_distances(query, codes, block_size=128), self.reference(query, codes))
+                indices, distances = hamming_search_batch(codes[:3], codes, 1)[0]
+                self.assertEqual((indices[0], distances[0]), (0, 0))
+
+    def test_top_k_smallest(self):
+        distances = np.array([5, 1, 3, 1, 9, 0], dtype=np.int32)
+        self.assertEqual(top_k_smallest(distances, 3).tolist(), [5, 1, 3])
+        self.assertEqual(top_k_smallest(distances, 10).tolist(), [5, 1, 3, 2, 0, 4])
+
+    def test_bounded_heap_merges_blocks(self):
+        distances = self.rng.integers(0, 50, size=5000).astype(np.int32)
+        top = TopK(20)
+        for start in range(0, 5000, 700):
+            top.push(distances[start:start + 700], np.arange(start, min(start + 700, 5000)))
+        rows, kept = top.result()
+        expected = np.lexsort((np.arange(5000), distances))[:20]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertEqual(kept.tolist(), distances[expected].tolist())
+
+    def test_search_matches_full_sort(self):
+        codes = self.rng.integers(0, 256, size=(3000, 64), dtype=np.uint8)
+        query = self.rng.integers(0, 256, size=64, dtype=np.uint8)
+        mask = self.rng.random(3000) > 0.3
+        rows, distances = hamming_search(query, codes, 10, mask=mask, block_size=256)
+        reference = self.reference(query, codes)
+        candidates = np.flatnonzero(mask)
+        expected = candidates[np.lexsort((candidates, reference[candidates]))[:10]]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertEqual(distances.tolist(), reference[expected].tolist())
+
+    def test_batch_search_matches_single_queries(self):
+        codes = self.rng.integers(0, 256, size=(2000, 64), dtype=np.uint8)
+        queries = self.rng.integers(0, 256, size=(37, 64), dtype=np.uint8)
+        mask = self.rng.random(2000) > 0.5
+        results = hamming_search_batch(queries, codes, 7, mask=mask, query_tile=8, row_tile=300)
+        self.assertEqual(len(results), 37)
+        for query, (rows, distances) in zip(queries, results):
+            expected_rows, expected_distances = hamming_search(query, codes, 7, mask=mask)
+            self.assertEqual(rows.tolist(), expected_rows.tolist())
+            self.assertEqual(distances.tolist(), expected_distances.tolist())
+
+    def test_sign_bit_disagreement(self):
+        codes = self.rng.integers(0, 256, size=(4, 64), dtype=np.uint8)
+        flipped = codes.copy()
+        flipped[1, 0] ^= 0b101
+        report = sign_bit_disagreement(codes, flipped)
+        self.assertEqual(report["bit_error_rate"], 2 / (4 * 512))
+        self.assertEqual(report["codes_changed"], 0.25)
+        self.assertEqual(report["max_bits_changed"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
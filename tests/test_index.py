@@ -0,0 +1,272 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from vlite.main import VLite
+from vlite.hamming import hamming_search, hamming_search_batch
+from vlite.index import BinaryVectorIndex, HnswIndex, InvertedFileIndex, ItemIndex, MetadataIndex, ShardedScanIndex, k_majority
+
+
+class TestMetadataIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MetadataIndex()
+        self.index.add(0, {"category": "A", "year": 2023})
+        self.index.add(1, {"category": "B", "year": 2023, "tags": ["x", "y"]})
+        self.index.add(2, {"category": "A", "year": 2024})
+        self.index.add(3, {})
+
+    def test_lookup_intersects_filters(self):
+        self.assertEqual(self.index.lookup({"category": "A"}).tolist(), [0, 2])
+        self.assertEqual(self.index.lookup({"category": "A", "year": 2023}).tolist(), [0])
+        self.assertEqual(self.index.lookup({"category": "C"}).tolist(), [])
+        self.assertEqual(self.index.lookup({"tags": ["x", "y"]}).tolist(), [1])
+        self.assertEqual(self.index.lookup({"category": None}).tolist(), [3])
+
+    def test_update_and_remove(self):
+        self.index.add(0, {"category": "B"})
+        self.assertEqual(self.index.lookup({"category": "B"}).tolist(), [0, 1])
+        self.assertEqual(self.index.lookup({"year": 2023}).tolist(), [1])
+        self.index.remove(1)
+        self.assertEqual(self.index.lookup({"category": "B"}).tolist(), [0])
+        self.assertIsInstance(self.index.lookup({}), np.ndarray)
+        self.assertEqual(self.index.lookup({}).tolist(), [0, 2, 3])
+
+    def test_remap_after_compaction(self):
+        index = MetadataIndex()
+        for row, metadata in enumerate([{"a": 1}, {"a": 2}, {"a": 1}, {}]):
+            index.add(row, metadata)
+        index.remove(1)
+        index.remap(np.array([0, 2, 3]))
+        self.assertEqual(index.lookup({"a": 1}).tolist(), [0, 1])
+        self.assertEqual(index.lookup({"a": None}).tolist(), [2])
+
+
+class TestItemIndex(unittest.TestCase):
+    def test_chunks_of_item(self):
+        index = ItemIndex()
+        for chunk_id in ["doc_1_0", "doc_1_1", "doc_10_0", "doc_0"]:
+            index.add(chunk_id)
+        self.assertEqual(index.get("doc_1"), ["doc_1_0", "doc_1_1"])
+        self.assertEqual(index.get("doc"), ["doc_0"])
+        self.assertEqual(index.item("doc_10_0"), "doc_10")
+        index.remove("doc_1_0")
+        index.remove("doc_1_1")
+        self.assertNotIn("doc_1", index)
+        self.assertEqual(index.get("doc_1"), [])
+
+
+
+class TestBinaryVectorIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Clusters of near-duplicate codes, so most neighbours are found at small radii
+        centers = rng.integers(0, 256, size=(50, 16), dtype=np.uint8)
+        noise = np.packbits(rng.random((3000, 128)) < 0.05, axis=1)
+        self.codes = centers[rng.integers(0, 50, 3000)] ^ noise
+        self.queries = np.concatenate([self.codes[:5] ^ noise[5:10], rng.integers(0, 256, size=(3, 16), dtype=np.uint8)])
+        self.mask = rng.random(3000) > 0.2
+
+    def assertExact(self, index, codes, **filters):
+        for query in self.queries:
+            rows, distances = index.view().search(query, codes, 10, **filters)
+            expected_rows, expected_distances = hamming_search(query, codes, 10, **filters)
+            np.testing.assert_array_equal(rows, expected_rows)
+            np.testing.assert_array_equal(distances, expected_distances)
+
+    def test_search_matches_brute_force(self):
+        index = BinaryVectorIndex(substring_bytes=2).build(self.codes)
+        self.assertEqual(len(index.bounds), 8)
+        self.assertExact(index, self.codes)
+        self.assertExact(index, self.codes, mask=self.mask)
+        self.assertExact(index, self.codes, rows=np.flatnonzero(self.mask))
+
+    def test_added_and_overwritten_rows(self):
+        index = BinaryVectorIndex(substring_bytes=2).build(self.codes[:1000])
+        codes = self.codes.copy()
+        index.add(np.arange(1000, 3000), codes)
+        codes[[3, 2500]] = self.queries[:2]
+        index.add([3, 2500], codes)
+        self.assertExact(index, codes)
+        index._merge(codes)
+        self.assertEqual(len(index.pending), 0)
+        self.assertExact(index, codes, mask=self.mask)
+
+    def test_remap_after_compaction(self):
+        index = BinaryVectorIndex(substring_bytes=2).build(self.codes)
+        live_rows = np.flatnonzero(self.mask)
+        index.remap(live_rows)
+        self.assertEqual(len(index), len(live_rows))
+        self.assertExact(index, self.codes[live_rows])
+
+
+
+class TestInvertedFileIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.centers = rng.integers(0, 256, size=(8, 16), dtype=np.uint8)
+        noise = np.packbits(rng.random((2000, 128)) < 0.05, axis=1)
+        self.codes = self.centers[np.arange(2000) % 8] ^ noise
+        self.queries = self.codes[:5] ^ noise[5:10]
+
+    def test_k_majority_recovers_clusters(self):
+        centroids = k_majority(self.codes, 8, seed=1)
+        distances = np.unpackbits(centroids[:, None] ^ self.centers[None], axis=2).sum(axis=2)
+        self.assertEqual(sorted(distances.argmin(axis=1).tolist()), list(range(8)))
+        self.assertLessEqual(distances.min(axis=1).max(), 2)
+
+    def test_probing_every_list_is_exact(self):
+        index = InvertedFileIndex(nlist=8, nprobe=8).train(self.codes)
+        self.assertEqual(sum(len(rows) for rows in index.lists), 2000)
+        mask = np.arange(2000) % 3 > 0
+        for query in self.queries:
+            for filters in ({}, {"mask": mask}, {"rows": np.flatnonzero(mask)}):
+                rows, distances = index.view().search(query, self.codes, 10, **filters)
+                expected_rows, expected_distances = hamming_search(query, self.codes, 10, **filters)
+                np.testing.assert_array_equal(rows, expected_rows)
+                np.testing.assert_array_equal(distances, expected_distances)
+
+    def test_added_overwritten_and_remapped_rows(self):
+        index = InvertedFileIndex(nlist=8, nprobe=1).train(self.codes[:1000])
+        codes = self.codes.copy()
+        index.add(np.arange(1000, 2000), codes)
+        codes[3] = self.centers[5]
+        index.add([3], codes)
+        self.assertIn(3, index.lists[index.labels[3]])
+        self.assertEqual(sum(len(rows) for rows in index.lists), 2000)
+        rows, distances = index.search(self.centers[5], codes, 1)
+        self.assertEqual((rows[0], distances[0]), (3, 0))
+        live_rows = np.arange(1, 2000)
+        index.remap(live_rows)
+        rows, _ = index.search(self.centers[5], codes[live_rows], 1)
+        self.assertEqual(rows[0], 2)
+
+    def test_small_collections_stay_exact_after_reopening(self):
+        cwd, directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            codes = self.codes[:200]
+            vlite = VLite(collection="ivf", engine="ivf", engine_options={"nprobe": 1})
+            vlite.set_batch([f"text {idx}" for idx in range(200)], codes)
+            vlite.save()
+            reopened = VLite(collection="ivf", engine="ivf", engine_options={"nprobe": 1})
+            self.assertIsNone(reopened.search_index.centroids)
+            for query in self.queries:
+                expected = hamming_search(query, codes, 10)[1]
+                found = [score for _, _, _, score in reopened.retrieve_by_vector(query, top_k=10, return_scores=True)]
+                self.assertEqual(found, expected.tolist())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+
+class TestShardedScanIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Few distinct codes, so there are many ties across shard boundaries
+        self.codes = rng.integers(0, 256, size=(64, 16), dtype=np.uint8)[rng.integers(0, 64, 50000)]
+        self.queries = rng.integers(0, 256, size=(4, 16), dtype=np.uint8)
+        self.index = ShardedScanIndex(num_threads=4, min_shard_rows=1000)
+
+    def test_shards_cover_rows(self):
+        shards = self.index.shards(50000)
+        self.assertEqual(len(shards), 4)
+        self.assertEqual([shards[0][0], shards[-1][1]], [0, 50000])
+        self.assertTrue(all(stop == start for (_, stop), (start, _) in zip(shards, shards[1:])))
+        self.assertEqual(ShardedScanIndex(num_threads=4, min_shard_rows=1000).shards(1500), [(0, 1500)])
+
+    def test_matches_single_scan(self):
+        mask = np.arange(50000) % 3 > 0
+        for filters in ({}, {"mask": mask}, {"rows": np.flatnonzero(mask)}):
+            for query in self.queries:
+                rows, distances = self.index.search(query, self.codes, 25, **filters)
+                expected_rows, expected_distances = hamming_search(query, self.codes, 25, **filters)
+                np.testing.assert_array_equal(rows, expected_rows)
+                np.testing.assert_array_equal(distances, expected_distances)
+            for (rows, distances), (expected_rows, expected_distances) in zip(self.index.search_batch(self.queries, self.codes, 25, **filters), hamming_search_batch(self.queries, self.codes, 25, **filters)):
+                np.testing.assert_array_equal(rows, expected_rows)
+                np.testing.assert_array_equal(distances, expected_distances)
+
+
+class TestHnswIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.integers(0, 256, size=(10, 16), dtype=np.uint8)
+        noise = np.packbits(rng.random((600, 128)) < 0.1, axis=1)
+        self.codes = centers[np.arange(600) % 10] ^ noise
+        self.queries = self.codes[:10] ^ noise[10:20]
+        self.index = HnswIndex(m=8, ef_construction=32, ef_search=32).build(self.codes[:500])
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def recall(self, index, codes, **filters):
+        found = [len(np.intersect1d(index.search(query, codes, 10, **filters)[0], hamming_search(query, codes, 10, **filters)[0])) for query in self.queries]
+        return sum(found) / (10 * len(self.queries))
+
+    def test_graph_finds_nearest_neighbours(self):
+        self.assertGreaterEqual(self.index.max_level, 1)
+        self.assertTrue(np.all((self.index.level0[:500] >= 0).sum(axis=1) > 0))
+        self.assertGreater(self.recall(self.index, self.codes[:500]), 0.9)
+
+    def test_tombstones_are_never_returned(self):
+        mask = np.arange(500) % 2 == 0
+        for query in self.queries:
+            rows, _ = self.index.view().search(query, self.codes[:500], 10, mask=mask)
+            self.assertEqual(len(rows), 10)
+            self.assertTrue(mask[rows].all())
+        self.assertGreater(self.recall(self.index, self.codes[:500], mask=mask), 0.9)
+
+    def test_save_and_load_with_new_rows(self):
+        path = os.path.join(self.directory, "graph.hnsw")
+        self.index.save(path, self.codes[:500])
+        loaded = HnswIndex(m=8, ef_construction=32, ef_search=32)
+        self.assertTrue(loaded.load(path, self.codes))
+        self.assertEqual(len(loaded), 600)
+        np.testing.assert_array_equal(loaded.levels[:500], self.index.levels[:500])
+        self.assertGreater(self.recall(loaded, self.codes), 0.9)
+        self.assertFalse(HnswIndex(m=8).load(path, self.codes[::-1]))
+
+    def test_fingerprint_covers_every_row(self):
+        codes = np.tile(self.codes, (5, 1))
+        changed = codes.copy()
+        changed[1, 0] ^= 1
+        self.assertNotEqual(HnswIndex.fingerprint(codes), HnswIndex.fingerprint(changed))
+        path = os.path.join(self.directory, "graph.hnsw")
+        self.index.save(path, self.codes[:500])
+        changed = self.codes.copy()
+        changed[1, 0] ^= 1
+        self.assertFalse(HnswIndex(m=8).load(path, changed))
+
+    def test_updated_vectors_invalidate_the_saved_graph(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            options = dict(collection="graph", engine="hnsw", engine_options={"m": 8, "ef_construction": 32})
+            vlite = VLite(**options)
+            vlite.set_batch([f"text {idx}" for idx in range(200)], self.codes[:200])
+            vlite.save()
+            item_id = vlite.item_index.item(vlite.store.chunk_ids[1])
+            index_path = vlite.ctx.index_path("graph")
+            saved_at = os.path.getmtime(index_path)
+            vlite.update(item_id, vector=self.codes[300])
+            self.assertEqual(os.path.getmtime(index_path), saved_at)
+            with self.assertLogs("vlite.main", level="INFO") as logs:
+                reopened = VLite(**options)
+            self.assertTrue(any("Built the hnsw index" in line for line in logs.output))
+            rows, distances = reopened.search_index.search(self.codes[300], reopened.store.codes, 1)
+            self.assertEqual((rows[0], distances[0]), (1, 0))
+        finally:
+            os.chdir(cwd)
+
+    def test_remap_after_compaction(self):
+        live_rows = np.flatnonzero(np.arange(500) % 5 > 0)
+        self.index.remap(live_rows)
+        self.assertEqual(len(self.index), len(live_rows))
+        self.assertLess(self.index.level0.max(), len(live_rows))
+        self.assertGreater(self.recall(self.index, self.codes[live_rows]), 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,113 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from vlite.ingest import prepare_document
+from vlite.main import VLite
+
+
+class CharacterTokenizer:
+    """Stands in for the model's tokenizer: one token per character."""
+
+    def __call__(self, texts, truncation=True):
+        input_ids = [[1] + [ord(char) % 1000 for char in text][:63] for text in texts]
+        return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, encodings, padding=True, return_tensors='np'):
+        length = max(len(ids) for ids in encodings["input_ids"])
+        return {key: np.array([values + [0] * (length - len(values)) for values in rows]) for key, rows in encodings.items()}
+
+
+class ExclusiveTokenizer(CharacterTokenizer):
+    """Like a Hugging Face fast tokenizer, fails when two threads use one instance at once."""
+
+    def __init__(self):
+        self.borrowed = False
+
+    def borrow(self, call, *args, **kwargs):
+        if self.borrowed:
+            raise RuntimeError("Already borrowed")
+        self.borrowed = True
+        try:
+            time.sleep(0.002)
+            return call(*args, **kwargs)
+        finally:
+            self.borrowed = False
+
+    def __call__(self, texts, truncation=True):
+        return self.borrow(super().__call__, texts, truncation)
+
+    def pad(self, encodings, padding=True, return_tensors='np'):
+        return self.borrow(super().pad, encodings, padding, return_tensors)
+
+
+class HashBackend:
+    """Stands in for the transformer: a pseudo-random embedding seeded by the tokens."""
+
+    def __call__(self, inputs):
+        return np.stack([
+            np.random.default_rng(ids[mask > 0].tolist()).standard_normal(1024).astype(np.float32)
+            for ids, mask in zip(inputs["input_ids"], inputs["attention_mask"])
+        ])
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.documents = [{"text": f"document {idx} " * 40, "metadata": {"doc": idx}, "id": f"doc{idx}"} for idx in range(30)]
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def open(self, **options):
+        vlite = VLite(collection="ingest", **options)
+        vlite.model._tokenizer = CharacterTokenizer()
+        vlite.model._backend = HashBackend()
+        return vlite
+
+    def test_prepare_document(self):
+        item_id, chunks, metadata = prepare_document({"text": "x" * 5000, "metadata": {"a": 1}, "id": "doc"}, fast=True)
+        self.assertEqual((item_id, metadata), ("doc", {"a": 1}))
+        self.assertEqual("".join(chunks), "x" * 5000)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(prepare_document("text", need_chunks=False)[1:], (["text"], {}))
+
+    def test_streams_micro_batches_into_the_collection(self):
+        vlite = self.open()
+        reports = []
+        stats = vlite.ingest(iter(self.documents), batch_size=8, num_workers=3, max_pending=4, fast=True, metadata={"source": "test"}, progress=reports.append)
+        self.assertEqual(stats["documents"], 30)
+        self.assertEqual(stats["chunks"], 30)
+        self.assertEqual([report["chunks"] for report in reports], [8, 16, 24, 30])
+        self.assertEqual(vlite.count(), 30)
+        self.assertEqual(vlite.get(ids=["doc7"])[0][2], {"doc": 7, "source": "test"})
+        # Codes match those of embedding the chunk on its own
+        text = self.documents[7]["text"]
+        np.testing.assert_array_equal(vlite.store.get("doc7_0"), vlite.model.embed([text])[0])
+        self.assertEqual(vlite.retrieve(text, top_k=1)[0][0], "doc7_0")
+        # Every micro-batch was committed to the write-ahead log
+        self.assertEqual(self.open().count(), 30)
+
+    def test_tokenizing_and_embedding_threads_do_not_share_a_tokenizer(self):
+        vlite = self.open()
+        vlite.model._tokenizer = ExclusiveTokenizer()
+        # Small token budgets split every micro-batch into several padded forward passes
+        vlite.model.max_batch_size = 2
+        stats = vlite.ingest(self.documents, batch_size=4, num_workers=2)
+        self.assertEqual((stats["chunks"], stats["batches"]), (30, 8))
+        self.assertEqual(vlite.count(), 30)
+
+    def test_rescore_embeddings_are_stored(self):
+        vlite = self.open(rescore="int8")
+        vlite.ingest(self.documents[:10], batch_size=4)
+        self.assertEqual(vlite.store.vectors.dtype, np.int8)
+        self.assertEqual(len(vlite.store), 10)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
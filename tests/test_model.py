@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+import numpy as np
+from vlite.main import VLite
+from vlite.model import EmbeddingModel
+
+
+class TestCodeWidth(unittest.TestCase):
+    def setUp(self):
+        # Quantization never loads the model
+        self.embeddings = np.random.default_rng(0).standard_normal((4, 1024)).astype(np.float32)
+
+    def test_codes_keep_the_leading_features(self):
+        for code_bits in (128, 256, 512, 1024):
+            codes = EmbeddingModel(code_bits=code_bits).quantize(self.embeddings, "binary")
+            self.assertEqual(codes.shape, (4, code_bits // 8))
+            np.testing.assert_array_equal(np.unpackbits(codes, axis=1), self.embeddings[:, :code_bits] > 0)
+
+    def test_unsupported_widths_are_rejected(self):
+        with self.assertRaises(ValueError):
+            EmbeddingModel(code_bits=100)
+        with self.assertRaises(ValueError):
+            EmbeddingModel(code_bits=1024).quantize(self.embeddings[:, :512], "binary")
+
+    def test_cache_keys_depend_on_the_width(self):
+        narrow, wide = EmbeddingModel(code_bits=128), EmbeddingModel(code_bits=256)
+        self.assertNotEqual(narrow.cache_key("binary", "text"), wide.cache_key("binary", "text"))
+        self.assertEqual(narrow.cache_key("int8", "text"), wide.cache_key("int8", "text"))
+
+    def test_cache_keys_depend_on_the_backend_and_quantization(self):
+        keys = {
+            EmbeddingModel(backend=backend, quantize=quantize).cache_key("binary", "text")
+            for backend in ("torch", "onnx") for quantize in (False, True)
+        }
+        self.assertEqual(len(keys), 4)
+
+
+class TestLazyLoading(unittest.TestCase):
+    def setUp(self):
+        self.cwd, self.directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_import_does_not_load_the_frameworks(self):
+        # A fresh interpreter, so modules imported by other tests do not count
+        code = "import sys, vlite; print(','.join(name for name in ('torch', 'transformers') if name in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_reads_and_writes_of_codes_do_not_load_the_model(self):
+        codes = np.random.default_rng(0).integers(0, 256, size=(3, 64), dtype=np.uint8)
+        with mock.patch("vlite.model.load_backend") as load_backend, \
+                mock.patch.object(EmbeddingModel, "load", autospec=True, side_effect=EmbeddingModel.load) as load:
+            vlite = VLite(collection="lazy")
+            vlite.set_batch(["alpha", "beta", "gamma"], codes)
+            self.assertEqual(vlite.count(), 3)
+            item_id = vlite.item_index.item(vlite.store.chunk_ids[0])
+            self.assertEqual(vlite.get(item_id)[0][1], "alpha")
+            self.assertEqual(vlite.retrieve_by_vector(codes[1], top_k=1)[0][1], "beta")
+            self.assertEqual(vlite.delete(item_id), 1)
+            vlite.save()
+            reopened = VLite(collection="lazy")
+            self.assertEqual(reopened.count(), 2)
+        load.assert_not_called()
+        load_backend.assert_not_called()
+        self.assertFalse(vlite.model.loaded or reopened.model.loaded)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+from vlite.rescore import dequantize, quantize_embeddings, rescore, sign_embeddings
+
+
+class TestRescore(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.embeddings = self.rng.standard_normal((200, 256)).astype(np.float32)
+
+    def test_quantized_embeddings_keep_their_direction(self):
+        for precision in ("int8", "float16"):
+            quantized = quantize_embeddings(self.embeddings, precision)
+            cosines = np.sum(dequantize(quantized) * dequantize(self.embeddings), axis=1)
+            self.assertGreater(cosines.min(), 0.999)
+
+    def test_rescore_reranks_candidates(self):
+        query = self.embeddings[7] + 0.1 * self.rng.standard_normal(256).astype(np.float32)
+        vectors = quantize_embeddings(self.embeddings, "int8")
+        rows, distances = rescore(query, vectors, np.arange(0, 200, 7), 3)
+        self.assertEqual(rows[0], 7)
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(np.all(np.diff(distances) >= 0))
+
+    def test_sign_embeddings(self):
+        codes = np.packbits(self.embeddings[:, :128] > 0, axis=1)
+        signs = sign_embeddings(codes, 256, "float16")
+        self.assertEqual(signs.shape, (200, 256))
+        np.testing.assert_array_equal(signs[:, :128] > 0, self.embeddings[:, :128] > 0)
+        self.assertFalse(signs[:, 128:].any())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
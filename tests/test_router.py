@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from vlite.router import VLiteRouter, merge_results, shard_of
+
+
+class TestMergeResults(unittest.TestCase):
+    def test_merges_by_score_with_provenance(self):
+        shard_results = [
+            ("a", [("x_0", "x", {}, 1), ("y_0", "y", {}, 7)]),
+            ("b", [("z_0", "z", {}, 3), ("w_0", "w", {}, 7)]),
+            ("c", []),
+        ]
+        self.assertEqual(merge_results(shard_results, 3, return_scores=True), [("x_0", "x", {}, 1, "a"), ("z_0", "z", {}, 3, "b"), ("y_0", "y", {}, 7, "a")])
+        self.assertEqual(merge_results(shard_results, 2), [("x_0", "x", {}, "a"), ("z_0", "z", {}, "b")])
+
+    def test_shard_of_is_stable(self):
+        self.assertEqual(shard_of("item", 4), shard_of("item", 4))
+        self.assertEqual({shard_of(f"item-{idx}", 4) for idx in range(100)}, {0, 1, 2, 3})
+
+
+class TestVLiteRouter(unittest.TestCase):
+    def setUp(self):
+        # Every worker opens its collection under the working directory
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.router = VLiteRouter(["shard_0", "shard_1", "empty"])
+
+    def tearDown(self):
+        self.router.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_fans_out_and_merges(self):
+        rng = np.random.default_rng(0)
+        codes = rng.integers(0, 256, size=(40, 64), dtype=np.uint8)
+        self.router.call("shard_0", "set_batch", [f"text {idx}" for idx in range(20)], codes[:20], [{"shard": 0}] * 20)
+        self.router.call("shard_1", "set_batch", [f"text {idx}" for idx in range(20, 40)], codes[20:], [{"shard": 1}] * 20)
+        self.assertEqual(self.router.count(), 40)
+
+        results = self.router.retrieve_by_vectors(codes[[3, 25]], top_k=5, return_scores=True)
+        self.assertEqual([results[0][0][1], results[0][0][3], results[0][0][4]], ["text 3", 0, "shard_0"])
+        self.assertEqual([results[1][0][1], results[1][0][3], results[1][0][4]], ["text 25", 0, "shard_1"])
+        for query_results in results:
+            scores = [score for _, _, _, score, _ in query_results]
+            self.assertEqual(len(scores), 5)
+            self.assertEqual(scores, sorted(scores))
+
+        filtered = self.router.retrieve_by_vector(codes[3], top_k=5, where={"shard": 1})
+        self.assertEqual({collection for _, _, _, collection in filtered}, {"shard_1"})
+        self.assertEqual(len(self.router.get(where={"shard": 0})), 20)
+
+        # Items placed without the router's hash are still updated in the collection that holds them
+        for item_id, _, _, _ in self.router.get(where={"shard": 1})[:3]:
+            self.assertTrue(self.router.update(item_id, metadata={"updated": True}))
+        self.assertEqual(len(self.router.get(where={"updated": True})), 3)
+        self.assertFalse(self.router.update("missing", metadata={"updated": True}))
+
+    def test_worker_errors_are_raised(self):
+        with self.assertRaises(ValueError):
+            self.router.call("shard_0", "retrieve_by_vectors", np.zeros((1, 64), dtype=np.uint8))
+        self.assertEqual(self.router.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
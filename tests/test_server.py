@@ -48,6 +48,36 @@ def test_retrieve_similar_texts():
     assert response.status_code == 200
     assert len(response.json()) == 2
 
+def test_retrieve_by_vector():
+    # Float embeddings are binarized by their signs, without the embedding model
+    vlite.clear()
+    codes = np.random.default_rng(1).integers(0, 256, size=(3, 64), dtype=np.uint8)
+    vlite.set_batch(["first", "second", "third"], codes)
+
+    vectors = np.where(np.unpackbits(codes[[0, 2]], axis=1), 0.5, -0.5)
+    response = client.post("/retrieve_vector", json={"vectors": vectors.tolist(), "top_k": 2})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert [results[0][1] for results in response.json()] == ["first", "third"]
+    assert [results[0][3] for results in response.json()] == [0, 0]
+
+    response = client.post("/retrieve_vector", json={"vectors": [[1.0, -1.0]], "top_k": 2})
+    assert response.status_code == 400
+
+def test_retrieve_vector_with_binary_codes():
+    # Packed codes are searched as they are, without the embedding model
+    vlite.clear()
+    codes = np.random.default_rng(0).integers(0, 256, size=(3, 64), dtype=np.uint8)
+    vlite.set_batch(["first", "second", "third"], codes)
+
+    response = client.post("/retrieve_vector", json={"vectors": codes[[2, 0]].tolist(), "binary": True, "top_k": 1})
+    assert response.status_code == 200
+    assert [results[0][1] for results in response.json()] == ["third", "first"]
+    assert [results[0][3] for results in response.json()] == [0, 0]
+
+    response = client.post("/retrieve_vector", json={"vectors": [[300] * 64], "binary": True})
+    assert response.status_code == 400
+
 def test_retrieve_text_by_id():
     vlite.clear()
     text = "This is a text with custom ID."
@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+import numpy as np
+from vlite.ctx import CtxFile, CtxSectionType
+from vlite.main import VLite
+from vlite.store import BinaryVectorStore, as_binary_codes, as_query_codes
+
+
+class TestBinaryVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def random_codes(self, n, code_size=64):
+        return self.rng.integers(0, 256, size=(n, code_size), dtype=np.uint8)
+
+    def test_append_grows_in_place(self):
+        store = BinaryVectorStore(capacity=4)
+        codes = self.random_codes(10)
+        rows = store.append_batch([f"item_{i}" for i in range(10)], codes)
+        self.assertEqual(rows.tolist(), list(range(10)))
+        self.assertEqual(len(store), 10)
+        self.assertGreaterEqual(store.capacity, 10)
+        view, alive = store.view()
+        np.testing.assert_array_equal(view, codes)
+        self.assertTrue(alive.all())
+
+    def test_remove_and_replace(self):
+        store = BinaryVectorStore()
+        codes = self.random_codes(3)
+        store.append_batch(["a_0", "b_0", "c_0"], codes)
+        self.assertTrue(store.remove("b_0"))
+        self.assertFalse(store.remove("b_0"))
+        store.append("a_0", codes[2])
+        _, alive = store.view()
+        self.assertEqual(alive.tolist(), [False, False, True, True])
+        np.testing.assert_array_equal(store.get("a_0"), codes[2])
+        self.assertEqual(len(store), 2)
+
+    def test_rejects_mismatched_width(self):
+        store = BinaryVectorStore()
+        store.append("a_0", self.random_codes(1))
+        with self.assertRaises(ValueError):
+            store.append("b_0", self.random_codes(1, code_size=32))
+
+    def test_compact_reclaims_dead_rows(self):
+        store = BinaryVectorStore(capacity=2)
+        codes = self.random_codes(6)
+        store.append_batch([f"item_{i}" for i in range(6)], codes)
+        store.remove("item_1")
+        store.remove("item_4")
+        view_before, alive_before = store.view()
+        self.assertAlmostEqual(store.dead_fraction(), 2 / 6)
+        live_rows = store.compact()
+        self.assertEqual(live_rows.tolist(), [0, 2, 3, 5])
+        self.assertEqual(store.dead_fraction(), 0.0)
+        self.assertEqual(store.rows, {"item_0": 0, "item_2": 1, "item_3": 2, "item_5": 3})
+        np.testing.assert_array_equal(store.get("item_5"), codes[5])
+        # Views taken before compaction are left untouched
+        np.testing.assert_array_equal(view_before, codes)
+        self.assertEqual(alive_before.sum(), 4)
+        store.append("item_6", codes[1])
+        self.assertEqual(store.rows["item_6"], 4)
+
+    def test_legacy_int8_codes(self):
+        codes = self.random_codes(5)
+        legacy = (codes.astype(np.int16) - 128).astype(np.int8)
+        np.testing.assert_array_equal(as_binary_codes(legacy), codes)
+        np.testing.assert_array_equal(as_binary_codes(legacy.astype(np.float32)), codes)
+
+    def test_wide_integer_codes_are_not_shifted(self):
+        codes = self.random_codes(5)
+        np.testing.assert_array_equal(as_binary_codes(codes.astype(np.int64)), codes)
+        with self.assertRaises(ValueError):
+            as_binary_codes(np.full((1, 64), -1, dtype=np.int32))
+
+    def test_set_batch_with_int64_codes(self):
+        cwd, directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            codes = self.random_codes(2)
+            vlite = VLite(collection="int64")
+            vlite.set_batch(["alpha", "beta"], codes.astype(np.int64))
+            item_id, text, _ = vlite.get()[0]
+            self.assertEqual(text, "alpha")
+            chunk_id = f"{item_id}_0"
+            np.testing.assert_array_equal(vlite.store.get(chunk_id), codes[0])
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+    def test_missing_and_log_only_collections(self):
+        cwd, directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            with self.assertLogs("vlite.main", level="WARNING"):
+                vlite = VLite(collection="fresh")
+            vlite.set_batch(["alpha"], self.random_codes(1))
+            # Only the write-ahead log exists until the collection is saved
+            self.assertFalse(os.path.exists(vlite.ctx_file.file_path))
+            self.assertEqual(VLite(collection="fresh").count(), 1)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+    def test_legacy_collections_open_with_any_model(self):
+        cwd, directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            # VERSION 1 files always named the default model, whatever model embedded them
+            codes = self.random_codes(3)
+            header = json.dumps({"embedding_model": "mixedbread-ai/mxbai-embed-large-v1", "embedding_size": 64, "embedding_dtype": "float32", "context_length": 512}).encode("utf-8")
+            embeddings = b"".join(struct.pack("<64f", *(code.astype(np.int16) - 128)) for code in codes)
+            contexts = b"".join(struct.pack("<I", 1) + b"x" for _ in codes)
+            metadata = json.dumps({f"item{i}_0": {} for i in range(3)}).encode("utf-8")
+            vlite = VLite(collection="legacy")
+            with open(vlite.ctx_file.file_path, "wb") as file:
+                file.write(CtxFile.MAGIC_NUMBER + struct.pack("<I", 1))
+                for section_type, data in ((CtxSectionType.HEADER, header), (CtxSectionType.EMBEDDINGS, embeddings),
+                                           (CtxSectionType.CONTEXTS, contexts), (CtxSectionType.METADATA, metadata)):
+                    file.write(struct.pack("<II", section_type.value, len(data)) + data)
+            with self.assertLogs("vlite.main", level="WARNING"):
+                legacy = VLite(collection="legacy", model_name="BAAI/bge-small-en-v1.5")
+            self.assertEqual(legacy.count(), 3)
+            np.testing.assert_array_equal(legacy.store.get("item1_0"), codes[1])
+            # Files that record the model they were embedded with still reject another one
+            legacy.save()
+            with self.assertRaises(ValueError):
+                VLite(collection="legacy")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+    def test_results_deleted_after_the_search_are_skipped(self):
+        cwd, directory = os.getcwd(), tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            codes = self.random_codes(3)
+            vlite = VLite(collection="deleted")
+            vlite.set_batch(["alpha", "beta", "gamma"], codes)
+            results = vlite.rank_and_filter(codes[0], 3)
+            # A delete between the search and reading the results
+            vlite.delete(vlite.item_index.item(results[0][0]))
+            entries = vlite._entries(results, return_scores=True)
+            self.assertEqual([idx for idx, _, _, _ in entries], [idx for idx, _ in results[1:]])
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+    def test_query_codes_from_floats_and_bytes(self):
+        floats = self.rng.standard_normal((2, 1024)).astype(np.float32)
+        codes = as_query_codes(floats, 64)
+        np.testing.assert_array_equal(codes, np.packbits(floats[:, :512] > 0, axis=1))
+        np.testing.assert_array_equal(as_query_codes(codes[0].astype(np.int64), 64), codes[:1])
+        with self.assertRaises(ValueError):
+            as_query_codes(floats[:, :100], 64)
+        with self.assertRaises(ValueError):
+            as_query_codes(np.full((1, 64), 300), 64)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
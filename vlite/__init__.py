@@ -1,2 +1,3 @@
 from .main import VLite
-from .model import EmbeddingModel
\ No newline at end of file
+from .model import EmbeddingModel
+from .router import VLiteRouter
@@ -0,0 +1,149 @@
+import os
+import re
+import inspect
+import time
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Exported ONNX graphs are cached here, one directory per model
+ONNX_CACHE_DIR = os.environ.get("VLITE_ONNX_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "vlite", "onnx"))
+
+
+class TorchBackend:
+    """
+    Runs the transformer with PyTorch on `device`.
+
+    With `quantize`, the weights of the linear layers are quantized to int8 and their activations
+    are quantized dynamically at inference time; this is only available on the CPU.
+    """
+
+    name = "torch"
+
+    def __init__(self, model_name, device='cpu', quantize=False):
+        import torch
+        from transformers import AutoModel
+        self.torch = torch
+        self.device = device
+        self.model = AutoModel.from_pretrained(model_name).to(device)
+        self.model.eval()
+        if quantize and device != 'cpu':
+            logger.warning(f"[TorchBackend.__init__] Dynamic int8 quantization runs on the CPU only, ignoring it on device: {device}")
+        elif quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def __call__(self, inputs):
+        """Return the first-token hidden states of a padded batch of numpy inputs, as float32."""
+        inputs = {key: self.torch.from_numpy(value).to(self.device) for key, value in inputs.items()}
+        with self.torch.no_grad():
+            outputs = self.model(**inputs).last_hidden_state[:, 0]
+        return outputs.float().cpu().numpy()
+
+
+class OnnxBackend:
+    """
+    Runs the transformer with ONNX Runtime on the CPU.
+
+    The model is exported with PyTorch the first time it is used and the graph is cached in
+    `cache_dir`; later processes load the cached graph and never import torch. ONNX Runtime
+    applies all graph optimizations and runs with `num_threads` intra-op threads.
+
+    With `quantize`, the exported graph is dynamically quantized to int8 weights (also cached).
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name, device='cpu', cache_dir=None, num_threads=None, quantize=False):
+        import onnxruntime
+        if device != 'cpu':
+            logger.warning(f"[OnnxBackend.__init__] The ONNX backend runs on the CPU, ignoring device: {device}")
+        self.model_path = self.export(model_name, cache_dir or ONNX_CACHE_DIR)
+        if quantize:
+            self.model_path = self.quantize(self.model_path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = num_threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [session_input.name for session_input in self.session.get_inputs()]
+
+    @staticmethod
+    def export(model_name, cache_dir):
+        """Export `model_name` to ONNX unless it is cached already, and return the path of the graph."""
+        model_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name.strip("/")))
+        model_path = os.path.join(model_dir, "model.onnx")
+        if os.path.exists(model_path):
+            return model_path
+        start_time = time.time()
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        sample = tokenizer(["vlite"], return_tensors='pt')
+        input_names = list(sample.keys())
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        # Write to a temporary file first so an interrupted export is never picked up from the cache
+        tmp_path = f"{model_path}.tmp"
+        class LastHiddenState(torch.nn.Module):
+            # Positional inputs in a fixed order, and a plain tensor output, export the same on every torch version
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+        # Newer torch releases default to the dynamo exporter, which needs onnxscript
+        export_options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                LastHiddenState(),
+                tuple(sample[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                **export_options,
+            )
+        os.replace(tmp_path, model_path)
+        end_time = time.time()
+        logger.info(f"[OnnxBackend.export] Exported {model_name} to {model_path} in {end_time - start_time:.5f} seconds")
+        return model_path
+
+    @staticmethod
+    def quantize(model_path):
+        """Quantize the weights of an exported graph to int8 unless it is cached already, and return its path."""
+        quantized_path = model_path.replace(".onnx", ".int8.onnx")
+        if os.path.exists(quantized_path):
+            return quantized_path
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = f"{quantized_path}.tmp"
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+        logger.info(f"[OnnxBackend.quantize] Quantized {model_path} to {quantized_path}")
+        return quantized_path
+
+    def __call__(self, inputs):
+        """Return the first-token hidden states of a padded batch of numpy inputs, as float32."""
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names if name in inputs}
+        outputs = self.session.run(["last_hidden_state"], feed)[0]
+        return outputs[:, 0].astype(np.float32)
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def load_backend(name, model_name, device='cpu', **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unsupported backend: {name}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_name, device=device, **options)
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def token_budget_batches(lengths, max_batch_tokens, max_batch_size=None):
+    """
+    Group inputs into batches whose padded size stays under a token budget.
+
+    Inputs are sorted by token length, longest first, so each batch only pads up to inputs of
+    similar length and the most memory-hungry batch runs first.
+
+    Args:
+        lengths (List[int]): The token length of every input.
+        max_batch_tokens (int): The maximum of batch size x longest input in the batch.
+        max_batch_size (int, optional): The maximum number of inputs in a batch.
+
+    Returns:
+        List[np.ndarray]: The indices of the inputs in each batch.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        # The first input of a batch is its longest, so it fixes the padded length
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(max_batch_tokens // longest, 1)
+        if max_batch_size is not None:
+            size = min(size, max_batch_size)
+        batches.append(order[start:start + size])
+        start += size
+    return batches
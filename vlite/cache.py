@@ -0,0 +1,124 @@
+import os
+import struct
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Cache of embeddings, as raw bytes, keyed by a hash of the model name, the precision and the text.
+
+    Recently used embeddings are kept in an in-memory LRU. With a `path`, every embedding is also
+    appended to a sidecar file, so a later process can reuse it; only the offsets of the file's
+    records are kept in memory, the codes are read back on a miss of the LRU.
+
+    Each record of the file is a 32-byte key, a little-endian uint32 length and the code bytes.
+    """
+
+    RECORD_HEADER = struct.Struct("<32sI")
+
+    def __init__(self, capacity=100000, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.entries = OrderedDict()
+        self.offsets = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path is not None:
+            self._scan()
+
+    @staticmethod
+    def key(model_name, precision, text):
+        return hashlib.sha256(f"{model_name}\0{precision}\0{text}".encode("utf-8")).digest()
+
+    def __len__(self):
+        return len(self.offsets.keys() | self.entries.keys())
+
+    def _scan(self):
+        """Index the records of the sidecar file; a torn record at the end is ignored."""
+        if not os.path.exists(self.path):
+            return
+        file_size = os.path.getsize(self.path)
+        with open(self.path, "rb") as file:
+            offset = 0
+            while offset + self.RECORD_HEADER.size <= file_size:
+                key, length = self.RECORD_HEADER.unpack(file.read(self.RECORD_HEADER.size))
+                if offset + self.RECORD_HEADER.size + length > file_size:
+                    break
+                self.offsets[key] = (offset + self.RECORD_HEADER.size, length)
+                offset += self.RECORD_HEADER.size + length
+                file.seek(offset)
+        if offset < file_size:
+            # Drop the torn record so later appends stay readable
+            os.truncate(self.path, offset)
+        logger.debug(f"[EmbeddingCache._scan] Indexed {len(self.offsets)} cached embeddings in {self.path}")
+
+    def _remember(self, key, code):
+        self.entries[key] = code
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return the cached code of every key, or None where the key is not cached."""
+        codes = []
+        file = None
+        try:
+            for key in keys:
+                code = self.entries.get(key)
+                if code is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                elif key in self.offsets:
+                    if file is None:
+                        file = open(self.path, "rb")
+                    offset, length = self.offsets[key]
+                    file.seek(offset)
+                    code = np.frombuffer(file.read(length), dtype=np.uint8)
+                    self._remember(key, code)
+                    self.hits += 1
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                codes.append(code)
+        finally:
+            if file is not None:
+                file.close()
+        return codes
+
+    def put_many(self, keys, codes):
+        records = []
+        for key, code in zip(keys, codes):
+            # Embeddings of any dtype are kept as their raw bytes
+            code = np.ascontiguousarray(code).reshape(-1).view(np.uint8)
+            self._remember(key, code)
+            if self.path is not None and key not in self.offsets:
+                records.append((key, code.tobytes()))
+        if not records:
+            return
+        with open(self.path, "ab") as file:
+            offset = file.tell()
+            for key, data in records:
+                file.write(self.RECORD_HEADER.pack(key, len(data)) + data)
+                self.offsets[key] = (offset + self.RECORD_HEADER.size, len(data))
+                offset += self.RECORD_HEADER.size + len(data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
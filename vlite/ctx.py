@@ -15,28 +15,47 @@ class CtxSectionType(Enum):
     EMBEDDINGS = 1
     CONTEXTS = 2
     METADATA = 3
+    RESCORE_EMBEDDINGS = 4
+
+class CtxRecordType(Enum):
+    PUT = 0
+    DELETE = 1
 
 class CtxFile:
     MAGIC_NUMBER = b"CTXF"
-    VERSION = 1
+    VERSION = 4
+    SUPPORTED_VERSIONS = (1, 2, 3, 4)
+    # Versions before this one wrote the default model name into the header, whatever model was used
+    MODEL_NAME_VERSION = 3
+    # Codes in the EMBEDDINGS section start on a cache line so they can be memory-mapped as 64-bit words
+    EMBEDDING_ALIGNMENT = 64
 
     def __init__(self, file_path):
         self.file_path = file_path
+        self.wal_path = f"{file_path}.wal"
         self.header = {
             "embedding_model": "default",
             "embedding_size": 0,
-            "embedding_dtype": "float32",
+            "embedding_dtype": "uint8",
             "context_length": 0,
+            "code_bits": 0,
+            "rescore_size": 0,
+            "rescore_dtype": "int8",
         }
         self.embeddings = []
+        # Optional higher-precision embeddings used to rerank the Hamming candidates, one per entry
+        self.rescore_embeddings = []
         self.contexts = []
         self.metadata = {}
+        # The version of the loaded file, or the one it is written with
+        self.version = self.VERSION
 
-    def set_header(self, embedding_model: str, embedding_size: int, embedding_dtype: str, context_length: int):
+    def set_header(self, embedding_model: str, embedding_size: int, embedding_dtype: str, context_length: int, code_bits: int = 0):
         self.header["embedding_model"] = embedding_model
         self.header["embedding_size"] = embedding_size
         self.header["embedding_dtype"] = embedding_dtype
         self.header["context_length"] = context_length
+        self.header["code_bits"] = code_bits
 
     def add_embedding(self, embedding: List[float]):
         self.embeddings.append(embedding)
@@ -46,23 +65,209 @@ class CtxFile:
 
     def add_metadata(self, key: str, value: Union[int, float, str]):
         self.metadata[key] = value
-        
+
+    def embedding_dtype(self) -> np.dtype:
+        """The little-endian dtype embeddings are stored in; "binary" means packed uint8 codes."""
+        try:
+            dtype = np.dtype(self.header["embedding_dtype"])
+        except TypeError:
+            dtype = np.dtype(np.uint8)
+        return dtype.newbyteorder("<")
+
+    def rescore_dtype(self) -> np.dtype:
+        return np.dtype(self.header.get("rescore_dtype", "int8")).newbyteorder("<")
+
+    def code_bits(self) -> int:
+        """The width of the binary codes in bits, 0 if unknown; older files only record their width in bytes."""
+        if self.header.get("code_bits"):
+            return self.header["code_bits"]
+        if self.embedding_dtype() != np.uint8:
+            return 0
+        return (self.header["embedding_size"] or self.embedding_array().shape[1]) * 8
+
+    def embedding_array(self) -> np.ndarray:
+        """Return the embeddings as one (n, embedding_size) array in their native dtype."""
+        return self._as_array(self.embeddings, self.header["embedding_size"], self.embedding_dtype())
+
+    def rescore_array(self) -> np.ndarray:
+        """Return the rescoring embeddings as one (n, rescore_size) array, empty when the file has none."""
+        return self._as_array(self.rescore_embeddings, self.header.get("rescore_size", 0), self.rescore_dtype())
+
+    @staticmethod
+    def _as_array(embeddings, size, dtype) -> np.ndarray:
+        if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+            return embeddings
+        if not len(embeddings):
+            return np.zeros((0, size), dtype=dtype)
+        embeddings = np.asarray(embeddings, dtype=dtype)
+        return embeddings.reshape(len(embeddings), -1)
+
+    def encode_embedding(self, embedding) -> bytes:
+        return np.asarray(embedding).tobytes()
+
+    def decode_embedding(self, data: bytes, dtype: str) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder("<"))
+
+    def append_put(self, entries):
+        """
+        Append PUT records for (key, embedding, context, metadata) entries to the write-ahead log,
+        optionally followed by a rescoring embedding. A PUT replaces any existing entry with the same key.
+        """
+        records = []
+        for key, embedding, context, metadata, *rescore in entries:
+            embedding = np.asarray(embedding)
+            record = {"key": key, "context": context, "metadata": metadata, "dtype": embedding.dtype.name}
+            data = self.encode_embedding(embedding)
+            if rescore and rescore[0] is not None:
+                rescore = np.asarray(rescore[0])
+                record.update(embedding_nbytes=len(data), rescore_dtype=rescore.dtype.name)
+                data += self.encode_embedding(rescore)
+            record_json = json.dumps(record).encode("utf-8")
+            payload = struct.pack("<I", len(record_json)) + record_json + data
+            records.append(struct.pack("<II", CtxRecordType.PUT.value, len(payload)) + payload)
+        self._append_records(records)
+
+    def append_delete(self, keys):
+        """Append DELETE records for the given keys to the write-ahead log."""
+        records = []
+        for key in keys:
+            payload = json.dumps({"key": key}).encode("utf-8")
+            records.append(struct.pack("<II", CtxRecordType.DELETE.value, len(payload)) + payload)
+        self._append_records(records)
+
+    def _append_records(self, records):
+        if not records:
+            return
+        with open(self.wal_path, "ab") as file:
+            file.write(b"".join(records))
+
+    def wal_size(self) -> int:
+        return os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+
+    def exists(self) -> bool:
+        """Whether the collection has a base file or a write-ahead log to load."""
+        return os.path.exists(self.file_path) or os.path.exists(self.wal_path)
+
+    def unload(self):
+        """Drop the loaded sections; appending to the log does not need them."""
+        self.__init__(self.file_path)
+
+    def base_size(self) -> int:
+        return os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0
+
+    def replay(self):
+        """Apply the records of the write-ahead log on top of the loaded sections."""
+        try:
+            with open(self.wal_path, "rb") as file:
+                wal_data = file.read()
+        except FileNotFoundError:
+            return
+        keys = list(self.metadata.keys())
+        positions = {key: idx for idx, key in enumerate(keys)}
+        # An int refers to a row of the loaded embeddings, so the base codes are only copied once
+        embeddings = list(range(len(keys)))
+        rescore_embeddings = list(range(len(keys)))
+        contexts = list(self.contexts)
+        metadata = dict(self.metadata)
+        offset = 0
+        while offset + 8 <= len(wal_data):
+            record_type, record_length = struct.unpack_from("<II", wal_data, offset)
+            if offset + 8 + record_length > len(wal_data):
+                break
+            payload = wal_data[offset + 8 : offset + 8 + record_length]
+            offset += 8 + record_length
+            if record_type == CtxRecordType.PUT.value:
+                json_length = struct.unpack_from("<I", payload)[0]
+                record = json.loads(payload[4 : 4 + json_length].decode("utf-8"))
+                data = payload[4 + json_length :]
+                rescore = None
+                if "rescore_dtype" in record:
+                    rescore = self.decode_embedding(data[record["embedding_nbytes"]:], record["rescore_dtype"])
+                    data = data[:record["embedding_nbytes"]]
+                embedding = self.decode_embedding(data, record.get("dtype", "uint8"))
+                key = record["key"]
+                if key in positions:
+                    idx = positions[key]
+                    embeddings[idx], contexts[idx], rescore_embeddings[idx] = embedding, record["context"], rescore
+                else:
+                    positions[key] = len(keys)
+                    keys.append(key)
+                    embeddings.append(embedding)
+                    contexts.append(record["context"])
+                    rescore_embeddings.append(rescore)
+                metadata[key] = record["metadata"]
+            elif record_type == CtxRecordType.DELETE.value:
+                key = json.loads(payload.decode("utf-8"))["key"]
+                idx = positions.pop(key, None)
+                if idx is not None:
+                    keys[idx] = None
+                    metadata.pop(key)
+            else:
+                raise ValueError(f"Unknown record type: {record_type}")
+        if offset != len(wal_data):
+            logger.warning(f"[CtxFile.replay] Ignoring truncated record at the end of {self.wal_path}")
+        live = [idx for idx, key in enumerate(keys) if key is not None]
+        self.embeddings = self._gather_embeddings([embeddings[idx] for idx in live])
+        # Rescoring embeddings are kept only if every entry has one
+        rescore_base = self.rescore_array()
+        rescore_rows = [rescore_embeddings[idx] for idx in live]
+        if all(row is not None and (not isinstance(row, int) or row < len(rescore_base)) for row in rescore_rows):
+            self.rescore_embeddings = self._gather_embeddings(rescore_rows, rescore_base, rescore_base.shape[1], rescore_base.dtype)
+        else:
+            self.rescore_embeddings = rescore_base[:0]
+        self.contexts = [contexts[idx] for idx in live]
+        self.metadata = {keys[idx]: metadata[keys[idx]] for idx in live}
+
+    def _gather_embeddings(self, rows, base=None, width=None, dtype=None) -> np.ndarray:
+        if base is None:
+            base, width, dtype = self.embedding_array(), self.header["embedding_size"], self.embedding_dtype()
+        logged = [idx for idx, row in enumerate(rows) if not isinstance(row, int)]
+        if len(base):
+            width, dtype = base.shape[1], base.dtype
+        elif logged:
+            width, dtype = len(rows[logged[0]]), rows[logged[0]].dtype
+        embeddings = np.zeros((len(rows), width), dtype=dtype)
+        from_base = [idx for idx, row in enumerate(rows) if isinstance(row, int) and row < len(base)]
+        if from_base:
+            embeddings[from_base] = base[[rows[idx] for idx in from_base]]
+        for idx in logged:
+            embeddings[idx] = rows[idx]
+        return embeddings
+
+    def compact(self):
+        """Fold the write-ahead log into a new base file."""
+        self.load()
+        self.save()
+
     def save(self):
-        with open(self.file_path, "wb") as file:
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "wb") as file:
             file.write(self.MAGIC_NUMBER)
             file.write(struct.pack("<I", self.VERSION))
 
+            # The header records the dtype and width the codes are actually stored with
+            embeddings = self.embedding_array()
+            if len(embeddings):
+                embeddings = embeddings.astype(embeddings.dtype.newbyteorder("<"), copy=False)
+                self.header["embedding_size"] = embeddings.shape[1]
+                self.header["embedding_dtype"] = embeddings.dtype.name
+                if embeddings.dtype == np.uint8:
+                    self.header["code_bits"] = embeddings.shape[1] * 8
+            rescore_embeddings = self.rescore_array()
+            if len(rescore_embeddings):
+                rescore_embeddings = rescore_embeddings.astype(rescore_embeddings.dtype.newbyteorder("<"), copy=False)
+                self.header["rescore_size"] = rescore_embeddings.shape[1]
+                self.header["rescore_dtype"] = rescore_embeddings.dtype.name
             header_json = json.dumps(self.header).encode("utf-8")
             file.write(struct.pack("<II", CtxSectionType.HEADER.value, len(header_json)))
             file.write(header_json)
 
-            if self.embeddings:
-                embeddings_data = b"".join(
-                    struct.pack(f"<{64}f", *emb[:64])  # Use a fixed size of 64
-                    for emb in self.embeddings
-                )
-                file.write(struct.pack("<II", CtxSectionType.EMBEDDINGS.value, len(embeddings_data)))
-                file.write(embeddings_data)
+            for section_type, section in ((CtxSectionType.EMBEDDINGS, embeddings), (CtxSectionType.RESCORE_EMBEDDINGS, rescore_embeddings)):
+                if len(section):
+                    padding = -(file.tell() + 8) % self.EMBEDDING_ALIGNMENT
+                    file.write(struct.pack("<II", section_type.value, padding + section.nbytes))
+                    file.write(b"\0" * padding)
+                    file.write(section.tobytes())
 
             contexts_data = b"".join(struct.pack("<I", len(context.encode("utf-8"))) + context.encode("utf-8") for context in self.contexts)
             file.write(struct.pack("<II", CtxSectionType.CONTEXTS.value, len(contexts_data)))
@@ -71,7 +276,10 @@ class CtxFile:
             metadata_json = json.dumps(self.metadata).encode("utf-8")
             file.write(struct.pack("<II", CtxSectionType.METADATA.value, len(metadata_json)))
             file.write(metadata_json)
-        
+        # The new base holds everything the log recorded
+        os.replace(tmp_path, self.file_path)
+        if os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
 
     def load(self):
         try:
@@ -82,8 +290,9 @@ class CtxFile:
                     raise ValueError(f"Invalid magic number: {magic_number}")
 
                 version = struct.unpack("<I", file.read(4))[0]
-                if version != self.VERSION:
+                if version not in self.SUPPORTED_VERSIONS:
                     raise ValueError(f"Unsupported version: {version}")
+                self.version = version
 
                 # Read sections
                 while True:
@@ -95,15 +304,19 @@ class CtxFile:
                     if section_type == CtxSectionType.HEADER.value:
                         header_json = file.read(section_length).decode("utf-8")
                         self.header = json.loads(header_json)
-                    elif section_type == CtxSectionType.EMBEDDINGS.value:
+                    elif section_type == CtxSectionType.EMBEDDINGS.value and version == 1:
                         embeddings_data = file.read(section_length)
-                        if embeddings_data:
-                            embedding_size = 64  # Use a fixed size of 64
-                            num_embeddings = len(embeddings_data) // (embedding_size * 4)
-                            self.embeddings = [
-                                list(struct.unpack_from(f"<{embedding_size}f", embeddings_data, i * embedding_size * 4))
-                                for i in range(num_embeddings)
-                            ]
+                        # VERSION 1 stored every code byte as the float32 of its signed form (byte - 128)
+                        values = np.frombuffer(embeddings_data, dtype="<f4").reshape(-1, 64)
+                        self.embeddings = (values.astype(np.int16) + 128).astype(np.uint8)
+                        self.header.update(embedding_size=64, embedding_dtype="uint8")
+                    elif section_type == CtxSectionType.EMBEDDINGS.value:
+                        if version == 2:
+                            # VERSION 2 always stored packed uint8 codes, whatever the header said
+                            self.header["embedding_dtype"] = "uint8"
+                        self.embeddings = self._map_section(file, section_length, self.header["embedding_size"], self.embedding_dtype())
+                    elif section_type == CtxSectionType.RESCORE_EMBEDDINGS.value:
+                        self.rescore_embeddings = self._map_section(file, section_length, self.header["rescore_size"], self.rescore_dtype())
                     elif section_type == CtxSectionType.CONTEXTS.value:
                         contexts_data = file.read(section_length)
                         self.contexts = []
@@ -124,6 +337,20 @@ class CtxFile:
                         raise ValueError(f"Unknown section type: {section_type}")
         except FileNotFoundError:
             pass
+        self.replay()
+
+    def _map_section(self, file, section_length, size, dtype) -> np.ndarray:
+        # Map the aligned embeddings instead of reading them: loading is O(1) and the
+        # pages are shared by every process that opens the file
+        data_start = file.tell()
+        padding = -data_start % self.EMBEDDING_ALIGNMENT
+        num_embeddings = (section_length - padding) // (size * dtype.itemsize)
+        embeddings = np.memmap(
+            self.file_path, dtype=dtype, mode="c",
+            offset=data_start + padding, shape=(num_embeddings, size)
+        )
+        file.seek(data_start + section_length)
+        return embeddings
 
     def __repr__(self):
         output = "CtxFile:\n\n"
@@ -157,6 +384,14 @@ class Ctx:
     def get(self, user):
         return os.path.join(self.directory, f"{user}.ctx")
 
+    def cache_path(self, user: str) -> str:
+        """Path of the embedding cache sidecar of a collection."""
+        return os.path.join(self.directory, f"{user}.cache")
+
+    def index_path(self, user: str) -> str:
+        """Path of the search graph sidecar of a collection."""
+        return os.path.join(self.directory, f"{user}.hnsw")
+
     def create(self, user: str) -> CtxFile:
         file_path = self.get(user)
         return CtxFile(file_path)
@@ -165,7 +400,11 @@ class Ctx:
         file_path = self.get(user_id)
         return CtxFile(file_path)
 
+    def compact(self, user_id: str):
+        self.read(user_id).compact()
+
     def delete(self, user_id: str):
         file_path = self.get(user_id)
-        if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+        for path in (file_path, f"{file_path}.wal", self.index_path(user_id)):
+            if os.path.exists(path):
+                os.remove(path)
\ No newline at end of file
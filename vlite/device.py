@@ -0,0 +1,80 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+import platform
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Set to 'cpu', 'cuda' or 'mps' to skip detection
+DEVICE_ENV_VAR = "VLITE_DEVICE"
+DEVICES = ("cpu", "cuda", "mps")
+
+_device = None
+_lock = threading.Lock()
+
+
+def cuda_available():
+    """
+    Probe for a CUDA device in-process.
+
+    When torch is already imported it is asked directly; otherwise the CUDA driver library is
+    loaded and queried for devices, which avoids both importing torch and spawning nvidia-smi.
+    """
+    if "torch" in sys.modules:
+        return sys.modules["torch"].cuda.is_available()
+    names = ["libcuda.so.1", "libcuda.so", ctypes.util.find_library("cuda"), "nvcuda.dll"]
+    for name in filter(None, names):
+        try:
+            driver = ctypes.CDLL(name)
+        except OSError:
+            continue
+        count = ctypes.c_int(0)
+        return driver.cuInit(0) == 0 and driver.cuDeviceGetCount(ctypes.byref(count)) == 0 and count.value > 0
+    return False
+
+
+def mps_available():
+    """Metal Performance Shaders only exist on Apple silicon Macs."""
+    if platform.system() != "Darwin" or platform.machine() != "arm64":
+        return False
+    if "torch" in sys.modules:
+        return sys.modules["torch"].backends.mps.is_available()
+    return True
+
+
+def resolve_device(device=None):
+    """
+    Return the device to embed on: `device` if given, else $VLITE_DEVICE, else the best available
+    of 'cuda', 'mps' and 'cpu'. Detection runs once per process and its answer is cached.
+    """
+    global _device
+    if device is not None:
+        return device
+    override = os.environ.get(DEVICE_ENV_VAR)
+    if override:
+        if override not in DEVICES:
+            raise ValueError(f"Unsupported {DEVICE_ENV_VAR}: {override}, expected one of {DEVICES}")
+        return override
+    with _lock:
+        if _device is None:
+            start_time = time.time()
+            if cuda_available():
+                _device = "cuda"
+            elif mps_available():
+                _device = "mps"
+            else:
+                _device = "cpu"
+            end_time = time.time()
+            logger.debug(f"[resolve_device] Detected device {_device} in {end_time - start_time:.5f} seconds")
+        return _device
+
+
+def reset_device_cache():
+    global _device
+    with _lock:
+        _device = None
@@ -0,0 +1,196 @@
+import numpy as np
+import logging
+from .topk import TopK
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rows scanned per block: keeps the XOR temporaries small enough to stay in cache
+BLOCK_SIZE = 16384
+# Tile shape of the (queries x rows) distance matrix in batched scans
+QUERY_TILE = 16
+ROW_TILE = 4096
+
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+M1 = np.uint64(0x5555555555555555)
+M2 = np.uint64(0x3333333333333333)
+M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+M8 = np.uint64(0x00FF00FF00FF00FF)
+H01 = np.uint64(0x0101010101010101)
+H0001 = np.uint64(0x0001000100010001)
+# numpy >= 2.0 counts bits natively; older versions fall back to SWAR and table lookups
+HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+
+
+def _byte_counts(x):
+    """SWAR step: replace every byte of a uint64 array by the number of bits set in it."""
+    x = x - ((x >> np.uint64(1)) & M1)
+    x = (x & M2) + ((x >> np.uint64(2)) & M2)
+    return (x + (x >> np.uint64(4))) & M4
+
+
+def popcount(x):
+    """Count the set bits of every element of a uint8 or uint64 array."""
+    if HAS_BITWISE_COUNT:
+        return np.bitwise_count(x)
+    # numpy < 2.0: SWAR bit counting on 64-bit words, table lookup on bytes
+    if x.dtype == np.uint64:
+        return (_byte_counts(x) * H01) >> np.uint64(56)
+    return POPCOUNT_TABLE[x]
+
+
+def _row_popcount(x):
+    """Total set bits of every row of a 2-D uint8 or uint64 array, as int32."""
+    if HAS_BITWISE_COUNT or x.dtype != np.uint64:
+        counts = popcount(x)
+        # Accumulating column by column is much faster than a reduction over a short last axis
+        total = counts[:, 0].astype(np.int32)
+        for column in range(1, counts.shape[1]):
+            total += counts[:, column]
+        return total
+    # Add the per-byte counts of up to 31 words before folding the lanes, a byte holds at most 248
+    total = np.zeros(len(x), dtype=np.int32)
+    for start in range(0, x.shape[1], 31):
+        lanes = _byte_counts(x[:, start:start + 31]).sum(axis=1, dtype=np.uint64)
+        lanes = (lanes & M8) + ((lanes >> np.uint64(8)) & M8)
+        total += ((lanes * H0001) >> np.uint64(48)).astype(np.int32)
+    return total
+
+
+def as_words(codes):
+    """View packed uint8 codes as 64-bit words when the code width allows it."""
+    codes = np.ascontiguousarray(codes, dtype=np.uint8)
+    if codes.shape[-1] % 8 == 0:
+        return codes.view(np.uint64)
+    return codes
+
+
+def hamming_distances(query, codes, block_size=BLOCK_SIZE):
+    """
+    Compute the exact bit-level Hamming distance between one packed code and every row of `codes`.
+
+    Args:
+        query (np.ndarray): A packed uint8 code of shape (code_size,).
+        codes (np.ndarray): Packed uint8 codes of shape (n, code_size).
+        block_size (int, optional): The number of rows processed at a time.
+
+    Returns:
+        np.ndarray: The int32 distances, of shape (n,).
+    """
+    query = as_words(np.asarray(query).reshape(1, -1))
+    distances = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), block_size):
+        block = as_words(codes[start:start + block_size])
+        distances[start:start + len(block)] = _row_popcount(block ^ query)
+    return distances
+
+
+def iter_blocks(codes, block_size, mask=None, rows=None):
+    """
+    Yield (rows, block) pairs covering the searchable rows of `codes`, at most `block_size` rows at a time.
+
+    Without a filter the blocks are zero-copy slices; with `mask` (a boolean array of shape (n,)) or
+    `rows` (sorted row indices) only the selected rows of each block are gathered.
+    """
+    if rows is not None:
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            yield block_rows, codes[block_rows]
+        return
+    for start in range(0, len(codes), block_size):
+        block_rows = np.arange(start, min(start + block_size, len(codes)))
+        if mask is None:
+            yield block_rows, codes[start:start + block_size]
+            continue
+        block_rows = block_rows[mask[start:start + block_size]]
+        if len(block_rows):
+            yield block_rows, codes[block_rows]
+
+
+def hamming_search(query, codes, top_k, mask=None, rows=None, block_size=BLOCK_SIZE):
+    """
+    Find the `top_k` rows of `codes` nearest to `query` in Hamming distance.
+
+    Each block is reduced to its own top_k with np.argpartition and merged through a bounded heap,
+    so the full distance vector is never sorted.
+
+    Args:
+        query (np.ndarray): A packed uint8 code of shape (code_size,).
+        codes (np.ndarray): Packed uint8 codes of shape (n, code_size).
+        top_k (int): The number of nearest rows to return.
+        mask (np.ndarray, optional): A boolean array of shape (n,); rows where it is False are skipped.
+        rows (np.ndarray, optional): Sorted row indices; when given, only these rows are searched.
+        block_size (int, optional): The number of rows processed at a time.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The row indices and their distances, nearest first.
+    """
+    top = TopK(top_k)
+    for block_rows, block in iter_blocks(codes, block_size, mask=mask, rows=rows):
+        top.push(hamming_distances(query, block, block_size=block_size), block_rows)
+    return top.result()
+
+
+def hamming_distance_matrix(queries, codes):
+    """Compute the (len(queries), len(codes)) matrix of Hamming distances between two sets of packed codes."""
+    queries = as_words(queries)
+    codes = as_words(codes)
+    distances = np.empty((len(queries), len(codes)), dtype=np.int32)
+    for i, query in enumerate(queries):
+        distances[i] = _row_popcount(codes ^ query)
+    return distances
+
+
+def hamming_search_batch(queries, codes, top_k, mask=None, rows=None, query_tile=QUERY_TILE, row_tile=ROW_TILE):
+    """
+    Find the `top_k` nearest rows of `codes` for every query in `queries`.
+
+    The distance matrix is computed in (query_tile x row_tile) tiles so each block of codes is read
+    from memory once per tile of queries rather than once per query.
+
+    Args:
+        queries (np.ndarray): Packed uint8 codes of shape (q, code_size).
+        codes (np.ndarray): Packed uint8 codes of shape (n, code_size).
+        top_k (int): The number of nearest rows to return per query.
+        mask (np.ndarray, optional): A boolean array of shape (n,); rows where it is False are skipped.
+        rows (np.ndarray, optional): Sorted row indices; when given, only these rows are searched.
+
+    Returns:
+        List[Tuple[np.ndarray, np.ndarray]]: The row indices and distances for each query, nearest first.
+    """
+    queries = np.asarray(queries).reshape(len(queries), -1)
+    tops = [TopK(top_k) for _ in range(len(queries))]
+    for block_rows, block in iter_blocks(codes, row_tile, mask=mask, rows=rows):
+        k = min(top_k, len(block_rows))
+        for q_start in range(0, len(queries), query_tile):
+            distances = hamming_distance_matrix(queries[q_start:q_start + query_tile], block)
+            # k-th smallest distance of every query in the tile, ties at the boundary are kept
+            kth = np.partition(distances, k - 1, axis=1)[:, k - 1]
+            for offset, (tile_distances, tile_kth) in enumerate(zip(distances, kth)):
+                selected = np.flatnonzero(tile_distances <= tile_kth)
+                tops[q_start + offset].push(tile_distances[selected], block_rows[selected])
+    return [top.result() for top in tops]
+
+
+def sign_bit_disagreement(reference_codes, codes):
+    """
+    Measure how often the bits of `codes` differ from `reference_codes`, such as the codes of a
+    quantized model against those of the fp32 model for the same texts.
+
+    Args:
+        reference_codes (np.ndarray): Packed uint8 codes of shape (n, code_size).
+        codes (np.ndarray): Packed uint8 codes of the same shape.
+
+    Returns:
+        Dict[str, float]: The fraction of differing bits, the fraction of codes with any differing
+        bit, and the mean and maximum number of differing bits per code.
+    """
+    if reference_codes.shape != codes.shape:
+        raise ValueError(f"Expected codes of shape {reference_codes.shape}, got {codes.shape}")
+    distances = _row_popcount(as_words(reference_codes) ^ as_words(codes))
+    return {
+        "bit_error_rate": float(distances.sum() / max(reference_codes.size * 8, 1)),
+        "codes_changed": float((distances > 0).mean()) if len(distances) else 0.0,
+        "mean_bits_changed": float(distances.mean()) if len(distances) else 0.0,
+        "max_bits_changed": int(distances.max()) if len(distances) else 0,
+    }
@@ -1,38 +1,936 @@
-import numpy as np
-import struct
+import os
+import copy
+import heapq
+import hashlib
 import json
-from enum import Enum
-from typing import List, Union, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+import numpy as np
+from .hamming import BLOCK_SIZE, as_words, hamming_distance_matrix, hamming_distances, hamming_search, hamming_search_batch, popcount
+from .topk import TopK, top_k_smallest
+
+# Rows appended since the last merge are scanned linearly until there are this many of them (or 1/64 of the index)
+MERGE_MIN_ROWS = 4096
+# A hash table lookup costs about as much as this many rows of a linear scan
+LOOKUP_COST = 4
+
+
+@lru_cache(maxsize=None)
+def substring_masks(bits, radius):
+    """Return every `bits`-bit integer with exactly `radius` bits set, as a read-only uint64 array."""
+    masks = np.array([sum(1 << bit for bit in flipped) for flipped in combinations(range(bits), radius)], dtype=np.uint64)
+    masks.flags.writeable = False
+    return masks
+
+
+def substring_keys(codes, bounds):
+    """Return the (m, n) uint64 keys of the byte ranges `bounds` of packed `codes`."""
+    codes = np.asarray(codes, dtype=np.uint8).reshape(-1, codes.shape[-1])
+    keys = np.zeros((len(bounds), len(codes)), dtype=np.uint64)
+    for i, (start, end) in enumerate(bounds):
+        for column in range(start, end):
+            keys[i] <<= np.uint64(8)
+            keys[i] |= codes[:, column]
+    return keys
+
+
+def sort_keys(keys, num_bytes):
+    """argsort substring keys; keys of up to 2 bytes are radix sorted as uint16."""
+    if num_bytes <= 2:
+        return np.argsort(keys.astype(np.uint16), kind="stable")
+    return np.argsort(keys)
+
 
 class BinaryVectorIndex:
-    def __init__(self, embedding_size=64):
-        self.index = {}
-        self.embedding_size = embedding_size
-        
-    def add(self, chunk_id, binary_vector):
-        binary_vector = binary_vector.tolist()
-        self.index[chunk_id] = binary_vector
-    
-    def add_batch(self, chunk_ids, binary_vectors):
-        for chunk_id, binary_vector in zip(chunk_ids, binary_vectors):
-            self.add(chunk_id, binary_vector)
-        
-    def remove(self, chunk_id):
-        if chunk_id in self.index:
-            del self.index[chunk_id]
+    """
+    Multi-index hashing over the rows of a packed code matrix, for exact Hamming k-NN.
+
+    Each code is split into m byte-aligned substrings and every substring gets a hash table,
+    kept as sorted arrays of (key, row). A code within distance d of the query agrees with it
+    within distance d // m on at least one substring, so a search probes the tables with every
+    key at radius 0, 1, 2, ... of the query's substrings until the k-th best distance found is
+    below m * (radius + 1). When probing the next radius would cost more than scanning the
+    remaining rows, they are scanned instead. Results are identical to `hamming_search`.
+
+    The index only stores row numbers; the codes are passed to every search. Appended and
+    updated rows are scanned linearly until they are merged into the tables. Mutations never
+    modify arrays in place, so `view()` is a consistent snapshot for searching without a lock.
+    """
+
+    def __init__(self, substring_bytes=None):
+        self.substring_bytes = substring_bytes
+        self.bounds = ()
+        self.tables = ()
+        self.size = 0
+        self.layout_size = 0
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    def _layout(self, n, code_size):
+        # Substrings of about log2(n) bits leave about one row per hash bucket
+        substring_bytes = self.substring_bytes or int(np.clip(round(np.log2(max(n, 2)) / 8), 1, 8))
+        m = max(1, min(code_size, round(code_size / substring_bytes)))
+        edges = np.linspace(0, code_size, m + 1).round().astype(int)
+        self.bounds = tuple((int(start), int(end)) for start, end in zip(edges[:-1], edges[1:]))
+        self.layout_size = n
+
+    def build(self, codes):
+        """Index every row of `codes`, replacing the current tables."""
+        codes = np.asarray(codes)
+        self._layout(len(codes), codes.shape[1])
+        keys = substring_keys(codes, self.bounds)
+        tables = []
+        for (start, end), substring in zip(self.bounds, keys):
+            order = sort_keys(substring, end - start)
+            tables.append((substring[order], order.astype(np.int64)))
+        self.tables = tuple(tables)
+        self.size = len(codes)
+        self.pending = np.empty(0, dtype=np.int64)
+        return self
+
+    def add(self, rows, codes):
+        """
+        Index `rows`, which were appended to or overwritten in `codes`, the full code matrix.
+        They are scanned linearly until enough of them accumulate to merge them into the tables.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self.size = max(self.size, int(rows.max()) + 1 if len(rows) else 0)
+        self.pending = np.union1d(self.pending, rows)
+        if self.size > 4 * max(self.layout_size, MERGE_MIN_ROWS):
+            # The collection outgrew the substring layout
+            self.build(codes[:self.size])
+        elif len(self.pending) > max(MERGE_MIN_ROWS, self.size // 64):
+            self._merge(codes)
+
+    def _merge(self, codes):
+        if not self.tables:
+            self.build(codes[:self.size])
+            return
+        pending = self.pending
+        keys = substring_keys(codes[pending], self.bounds)
+        tables = []
+        for (table_keys, table_rows), substring in zip(self.tables, keys):
+            # Overwritten rows are indexed under their new keys only
+            keep = ~np.isin(table_rows, pending)
+            table_keys, table_rows = table_keys[keep], table_rows[keep]
+            order = np.argsort(substring)
+            positions = np.searchsorted(table_keys, substring[order], side="right")
+            tables.append((np.insert(table_keys, positions, substring[order]), np.insert(table_rows, positions, pending[order])))
+        self.tables = tuple(tables)
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def remap(self, live_rows):
+        """Renumber rows after store compaction; `live_rows[i]` is the old index of new row i."""
+        new_rows = np.full(max(self.size, int(live_rows.max()) + 1 if len(live_rows) else 0), -1, dtype=np.int64)
+        new_rows[live_rows] = np.arange(len(live_rows))
+        tables = []
+        for table_keys, table_rows in self.tables:
+            table_rows = new_rows[table_rows]
+            keep = table_rows >= 0
+            tables.append((table_keys[keep], table_rows[keep]))
+        self.tables = tuple(tables)
+        pending = new_rows[self.pending]
+        self.pending = pending[pending >= 0]
+        self.size = len(live_rows)
+
+    def clear(self):
+        self.__init__(substring_bytes=self.substring_bytes)
+
+    def view(self):
+        """Return a snapshot of the index that later mutations do not affect."""
+        return copy.copy(self)
+
+    def _lookup(self, table, keys):
+        table_keys, table_rows = table
+        starts = np.searchsorted(table_keys, keys, side="left")
+        counts = np.searchsorted(table_keys, keys, side="right") - starts
+        total = int(counts.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # Gather the rows of every matching bucket without a Python loop
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return table_rows[offsets]
+
+    def search(self, query, codes, top_k, mask=None, rows=None):
+        """
+        Find the `top_k` rows of `codes` nearest to `query`, like `hamming_search`.
+
+        Args:
+            query (np.ndarray): A packed uint8 code of shape (code_size,).
+            codes (np.ndarray): The packed uint8 codes the index was built over, of shape (n, code_size).
+            top_k (int): The number of nearest rows to return.
+            mask (np.ndarray, optional): A boolean array of shape (n,); rows where it is False are skipped.
+            rows (np.ndarray, optional): Sorted row indices; when given, only these rows are searched.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The row indices and their distances, nearest first.
+        """
+        query = np.asarray(query, dtype=np.uint8).reshape(-1)
+        if not self.tables or len(codes) > self.size:
+            return hamming_search(query, codes, top_k, mask=mask, rows=rows)
+        if rows is not None:
+            if len(rows) * LOOKUP_COST < len(codes):
+                # A selective filter is cheaper to scan than to probe
+                return hamming_search(query, codes, top_k, rows=rows)
+            mask = np.zeros(len(codes), dtype=bool)
+            mask[rows] = True
+        remaining = len(codes) if mask is None else int(np.count_nonzero(mask))
+        top = TopK(top_k)
+        seen = np.zeros(len(codes), dtype=bool)
+        pending = self.pending[self.pending < len(codes)]
+        seen[pending] = True
+        if mask is not None:
+            pending = pending[mask[pending]]
+        if len(pending):
+            top.push(hamming_distances(query, codes[pending]), pending)
+            remaining -= len(pending)
+        query_keys = substring_keys(query.reshape(1, -1), self.bounds)[:, 0]
+        widths = [8 * (end - start) for start, end in self.bounds]
+        radius = 0
+        while remaining > 0:
+            worst = top.worst()
+            if worst is not None and worst < len(self.bounds) * radius:
+                break
+            if radius > max(widths) or sum(comb(width, radius) for width in widths) * LOOKUP_COST > remaining:
+                # Probing further costs more than scanning whatever is left
+                unseen = ~seen if mask is None else mask & ~seen
+                rest = np.flatnonzero(unseen)
+                if len(rest):
+                    top.push(hamming_distances(query, codes[rest]), rest)
+                break
+            # Verify the rows found in all tables at this radius at once
+            candidates = np.concatenate([
+                self._lookup(table, query_key ^ substring_masks(width, radius))
+                for table, query_key, width in zip(self.tables, query_keys, widths)
+            ])
+            candidates = np.unique(candidates[~seen[candidates]])
+            seen[candidates] = True
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            remaining -= len(candidates)
+            if len(candidates):
+                top.push(hamming_distances(query, codes[candidates]), candidates)
+            radius += 1
+        return top.result()
+
+    def search_batch(self, queries, codes, top_k, mask=None, rows=None):
+        """Run `search` for every query in `queries`, like `hamming_search_batch`."""
+        return [self.search(query, codes, top_k, mask=mask, rows=rows) for query in np.asarray(queries)]
+
+
+def nearest_centroids(codes, centroids, block_size=BLOCK_SIZE):
+    """Return the index of the nearest centroid, in Hamming distance, of every row of `codes`."""
+    labels = np.zeros(len(codes), dtype=np.int64)
+    for start in range(0, len(codes), block_size):
+        block = np.ascontiguousarray(codes[start:start + block_size], dtype=np.uint8)
+        # A running minimum over the centroids avoids a strided argmin over the distance matrix
+        best = np.full(len(block), np.iinfo(np.int32).max, dtype=np.int32)
+        block_labels = labels[start:start + len(block)]
+        for label, centroid in enumerate(centroids):
+            distances = hamming_distances(centroid, block)
+            closer = distances < best
+            best[closer] = distances[closer]
+            block_labels[closer] = label
+    return labels
+
+
+def k_majority(codes, k, iterations=10, seed=0):
+    """
+    Cluster packed binary codes with k-majority, the Hamming-space counterpart of k-means: codes
+    are assigned to their nearest centroid, and each bit of a centroid becomes the majority vote
+    of that bit over its codes. Empty clusters are reseeded with random codes.
+
+    Returns:
+        np.ndarray: The (k, code_size) packed centroids.
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.asarray(codes, dtype=np.uint8)
+    k = min(k, len(codes))
+    centroids = codes[rng.choice(len(codes), k, replace=False)].copy()
+    bits = np.unpackbits(codes, axis=1)
+    for _ in range(iterations):
+        labels = nearest_centroids(codes, centroids)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        sums = np.zeros((k, bits.shape[1]), dtype=np.int32)
+        nonempty = np.flatnonzero(counts)
+        sums[nonempty] = np.add.reduceat(bits[order], np.cumsum(counts)[nonempty] - counts[nonempty], axis=0, dtype=np.int32)
+        # Ties keep the current bit, so a converged centroid does not flip back and forth
+        votes = 2 * sums - counts[:, None]
+        current = np.unpackbits(centroids, axis=1)
+        updated = np.packbits(np.where(votes == 0, current, votes > 0).astype(np.uint8), axis=1)
+        empty = np.flatnonzero(counts == 0)
+        updated[empty] = codes[rng.choice(len(codes), len(empty), replace=False)]
+        if np.array_equal(updated, centroids):
+            break
+        centroids = updated
+    return centroids
+
+
+class InvertedFileIndex:
+    """
+    Inverted-file (IVF) index over the rows of a packed code matrix, for approximate Hamming k-NN.
+
+    `nlist` centroids are trained with k-majority on a sample of the codes, and every row is
+    filed in the posting list of its nearest centroid. A search only scans the lists of the
+    `nprobe` centroids nearest to the query (more when they hold fewer than top_k rows), so it
+    trades recall for speed; `nprobe = nlist` is exact. With nlist=None, about sqrt(n) lists
+    are used and the centroids are retrained as the collection quadruples.
+
+    Rows appended or overwritten after training are assigned to their nearest centroid right
+    away. Like BinaryVectorIndex, mutations never modify the posting lists in place, so `view()`
+    is a consistent snapshot for searching without a lock.
+    """
+
+    # Rows are scanned linearly until there are this many of them to train on
+    MIN_TRAIN_ROWS = 4096
+    # Training uses a sample of at most this many codes per centroid
+    TRAIN_ROWS_PER_LIST = 64
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = ()
+        self.labels = np.empty(0, dtype=np.int64)
+        self.size = 0
+        self.trained_size = 0
+
+    def __len__(self):
+        return self.size
+
+    def build(self, codes):
+        """Index every row of `codes`, replacing the current lists; below MIN_TRAIN_ROWS rows they are scanned linearly."""
+        codes = np.asarray(codes)
+        if len(codes) < self.MIN_TRAIN_ROWS:
+            self.clear()
+            self.size = len(codes)
+            return self
+        return self.train(codes)
+
+    def train(self, codes):
+        """Train the centroids on `codes` and file every row of it, whatever the number of rows."""
+        codes = np.asarray(codes)
+        self.size = len(codes)
+        if not len(codes):
+            self.clear()
+            return self
+        nlist = self.nlist or max(1, int(round(np.sqrt(len(codes)))))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(codes), nlist * self.TRAIN_ROWS_PER_LIST)
+        sample = codes[np.sort(rng.choice(len(codes), sample_size, replace=False))]
+        self.centroids = k_majority(sample, nlist, self.iterations, self.seed)
+        self.labels = nearest_centroids(codes, self.centroids)
+        order = np.argsort(self.labels, kind="stable")
+        bounds = np.cumsum(np.bincount(self.labels, minlength=len(self.centroids)))
+        self.lists = tuple(np.split(order, bounds[:-1]))
+        self.trained_size = len(codes)
+        return self
+
+    def add(self, rows, codes):
+        """File `rows`, which were appended to or overwritten in `codes`, the full code matrix."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        self.size = max(self.size, int(rows[-1]) + 1 if len(rows) else 0)
+        if self.centroids is None or (self.nlist is None and self.size > 4 * self.trained_size):
+            if self.size >= self.MIN_TRAIN_ROWS:
+                self.train(codes[:self.size])
+            return
+        lists = list(self.lists)
+        # Overwritten rows leave the list they were filed in
+        overwritten = rows[rows < len(self.labels)]
+        overwritten = overwritten[self.labels[overwritten] >= 0]
+        for label in np.unique(self.labels[overwritten]):
+            lists[label] = lists[label][~np.isin(lists[label], overwritten)]
+        labels = nearest_centroids(codes[rows], self.centroids)
+        grown = np.full(self.size, -1, dtype=np.int64)
+        grown[:len(self.labels)] = self.labels
+        grown[rows] = labels
+        for label in np.unique(labels):
+            lists[label] = np.concatenate([lists[label], rows[labels == label]])
+        self.labels = grown
+        self.lists = tuple(lists)
+
+    def remap(self, live_rows):
+        """Renumber rows after store compaction; `live_rows[i]` is the old index of new row i."""
+        if self.centroids is None:
+            self.size = len(live_rows)
+            return
+        new_rows = np.full(max(self.size, int(live_rows.max()) + 1 if len(live_rows) else 0), -1, dtype=np.int64)
+        new_rows[live_rows] = np.arange(len(live_rows))
+        lists = []
+        for rows in self.lists:
+            rows = new_rows[rows]
+            lists.append(rows[rows >= 0])
+        self.lists = tuple(lists)
+        self.labels = self.labels[live_rows]
+        self.size = len(live_rows)
+
+    def clear(self):
+        self.__init__(nlist=self.nlist, nprobe=self.nprobe, iterations=self.iterations, seed=self.seed)
+
+    def view(self):
+        """Return a snapshot of the index that later mutations do not affect."""
+        return copy.copy(self)
+
+    def _probe(self, centroid_distances, top_k, mask):
+        # Lists nearest first, until nprobe lists are taken and they hold at least top_k rows
+        candidates = []
+        found = 0
+        for probed, label in enumerate(np.argsort(centroid_distances, kind="stable")):
+            if probed >= self.nprobe and found >= top_k:
+                break
+            rows = self.lists[label]
+            if mask is not None:
+                rows = rows[mask[rows]]
+            candidates.append(rows)
+            found += len(rows)
+        return np.sort(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+
+    def search(self, query, codes, top_k, mask=None, rows=None):
+        """
+        Find about the `top_k` rows of `codes` nearest to `query`, like `hamming_search`.
+
+        Args:
+            query (np.ndarray): A packed uint8 code of shape (code_size,).
+            codes (np.ndarray): The packed uint8 codes the index was built over, of shape (n, code_size).
+            top_k (int): The number of nearest rows to return.
+            mask (np.ndarray, optional): A boolean array of shape (n,); rows where it is False are skipped.
+            rows (np.ndarray, optional): Sorted row indices; when given, only these rows are searched.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The row indices and their distances, nearest first.
+        """
+        query = np.asarray(query, dtype=np.uint8).reshape(1, -1)
+        return self.search_batch(query, codes, top_k, mask=mask, rows=rows)[0]
+
+    def search_batch(self, queries, codes, top_k, mask=None, rows=None):
+        """Run `search` for every query in `queries`, like `hamming_search_batch`."""
+        queries = np.asarray(queries, dtype=np.uint8).reshape(len(queries), -1)
+        if self.centroids is None or len(codes) > self.size:
+            return hamming_search_batch(queries, codes, top_k, mask=mask, rows=rows)
+        if rows is not None:
+            if len(rows) <= self.size / len(self.centroids) * self.nprobe:
+                # A filter that selects fewer rows than nprobe lists hold is cheaper to scan exactly
+                return hamming_search_batch(queries, codes, top_k, rows=rows)
+            mask = np.zeros(len(codes), dtype=bool)
+            mask[rows] = True
+        results = []
+        for query, centroid_distances in zip(queries, hamming_distance_matrix(queries, self.centroids)):
+            candidates = self._probe(centroid_distances, top_k, mask)
+            results.append(hamming_search(query, codes, top_k, rows=candidates))
+        return results
+
+
+def word_distances(query, words):
+    """Hamming distances between one code and a few codes, both viewed with `as_words`."""
+    return popcount(words ^ query).sum(axis=-1, dtype=np.int32)
+
+
+class HnswIndex:
+    """
+    Hierarchical navigable small-world (HNSW) graph over the rows of a packed code matrix, for
+    approximate Hamming k-NN.
+
+    Every row is a node on layers 0..level, with the level drawn from an exponential distribution,
+    so each layer holds about 1/m of the nodes of the layer below. A search descends greedily from
+    the entry point on the top layer and runs a best-first search with `ef_search` candidates on
+    layer 0. Inserts search the same way with `ef_construction` candidates and link the node to up
+    to m (2m on layer 0) neighbours picked with the HNSW heuristic; neighbours that overflow are
+    pruned with the same heuristic.
+
+    The graph lives in flat arrays: `level0` holds the layer 0 neighbours of every node, `upper`
+    the neighbours of nodes on higher layers, at row `upper_index[node] + layer - 1`; -1 pads
+    unused slots. Deleted rows stay in the graph as tombstones, masked out of the results, until
+    compaction remaps the graph without them.
+
+    Inserts link nodes in place, so a `view()` may see edges to nodes added after it; searches
+    ignore nodes beyond the codes they are given.
+    """
+
+    def __init__(self, m=16, ef_construction=100, ef_search=64, seed=0):
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.seed = seed
+        self.level_multiplier = 1 / np.log(m)
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.levels = np.full(0, -1, dtype=np.int8)
+        self.level0 = np.full((0, self.m0), -1, dtype=np.int32)
+        self.upper_index = np.full(0, -1, dtype=np.int64)
+        self.upper = np.full((0, m), -1, dtype=np.int32)
+        self.upper_size = 0
+        self.entry_point = -1
+        self.max_level = -1
 
-    def search(self, query_vector, top_k):
-        query_vector = np.array(query_vector.tolist())
-        binary_vectors = np.array(list(self.index.values()))
-        chunk_ids = np.array(list(self.index.keys()))
+    def __len__(self):
+        return self.size
 
-        distances = np.count_nonzero(binary_vectors != query_vector[:binary_vectors.shape[1]], axis=1)
-        similarities = 1 - distances / binary_vectors.shape[1]
+    def _reserve(self, size, upper_size):
+        # Arrays grow geometrically, like the store; nodes of an older view keep the old arrays
+        capacity = len(self.levels)
+        if size > capacity:
+            capacity = max(1024, capacity)
+            while capacity < size:
+                capacity *= 2
+            levels = np.full(capacity, -1, dtype=np.int8)
+            levels[:len(self.levels)] = self.levels
+            level0 = np.full((capacity, self.m0), -1, dtype=np.int32)
+            level0[:len(self.level0)] = self.level0
+            upper_index = np.full(capacity, -1, dtype=np.int64)
+            upper_index[:len(self.upper_index)] = self.upper_index
+            self.levels, self.level0, self.upper_index = levels, level0, upper_index
+        if upper_size > len(self.upper):
+            upper_capacity = max(256, len(self.upper))
+            while upper_capacity < upper_size:
+                upper_capacity *= 2
+            upper = np.full((upper_capacity, self.m), -1, dtype=np.int32)
+            upper[:len(self.upper)] = self.upper
+            self.upper = upper
+
+    def _neighbors(self, node, layer):
+        row = self.level0[node] if layer == 0 else self.upper[self.upper_index[node] + layer - 1]
+        return row[row >= 0]
+
+    def _set_neighbors(self, node, layer, neighbors):
+        row = self.level0[node] if layer == 0 else self.upper[self.upper_index[node] + layer - 1]
+        row[:len(neighbors)] = neighbors
+        row[len(neighbors):] = -1
+
+    def _search_layer(self, query, words, entry_points, ef, layer, allowed=None):
+        """
+        Best-first search of one layer from `entry_points`; returns up to `ef` (distance, node)
+        pairs nearest first. Nodes outside `allowed` are traversed but never returned.
+        """
+        visited = np.zeros(len(words), dtype=bool)
+        entry_points = np.asarray(entry_points, dtype=np.int64)
+        visited[entry_points] = True
+        candidates = []
+        results = []
+        for distance, node in zip(word_distances(query, words[entry_points]).tolist(), entry_points.tolist()):
+            heapq.heappush(candidates, (distance, node))
+            if allowed is None or allowed[node]:
+                heapq.heappush(results, (-distance, -node))
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if len(results) >= ef and distance > -results[0][0]:
+                break
+            neighbors = self._neighbors(node, layer)
+            neighbors = neighbors[neighbors < len(words)]
+            neighbors = neighbors[~visited[neighbors]]
+            if not len(neighbors):
+                continue
+            visited[neighbors] = True
+            distances = word_distances(query, words[neighbors])
+            if len(results) >= ef:
+                # Most neighbours of an explored node are no nearer than the current results
+                nearer = distances < -results[0][0]
+                neighbors, distances = neighbors[nearer], distances[nearer]
+            for distance, neighbor in zip(distances.tolist(), neighbors.tolist()):
+                if len(results) < ef or distance < -results[0][0]:
+                    heapq.heappush(candidates, (distance, neighbor))
+                    if allowed is None or allowed[neighbor]:
+                        heapq.heappush(results, (-distance, -neighbor))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return sorted((-distance, -node) for distance, node in results)
+
+    def _select(self, words, nodes, distances, m):
+        """HNSW neighbour heuristic: keep a node only if it is nearer to the base than to every node kept so far."""
+        order = np.lexsort((nodes, distances))
+        nodes, distances = nodes[order], distances[order]
+        if len(nodes) <= m:
+            return nodes
+        node_words = words[nodes]
+        pairwise = word_distances(node_words[:, None], node_words[None, :])
+        selected = []
+        for i, distance in enumerate(distances.tolist()):
+            if selected and pairwise[i, selected].min() < distance:
+                continue
+            selected.append(i)
+            if len(selected) == m:
+                break
+        return nodes[selected]
+
+    def _link(self, node, neighbors, layer, words):
+        self._set_neighbors(node, layer, neighbors)
+        m = self.m0 if layer == 0 else self.m
+        for neighbor in neighbors.tolist():
+            linked = self._neighbors(neighbor, layer)
+            if node in linked:
+                continue
+            if len(linked) < m:
+                self._set_neighbors(neighbor, layer, np.append(linked, node))
+                continue
+            # The neighbour is full: keep the best m of its neighbours and the new node
+            linked = np.append(linked, node)
+            self._set_neighbors(neighbor, layer, self._select(words, linked, word_distances(words[neighbor], words[linked]), m))
+
+    def _insert(self, node, words):
+        query = words[node]
+        level = int(self.levels[node])
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, level, -1):
+            entry_points = [self._search_layer(query, words, entry_points, 1, layer)[0][1]]
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = [(distance, other) for distance, other in self._search_layer(query, words, entry_points, self.ef_construction, layer) if other != node]
+            if not found:
+                continue
+            nodes = np.array([other for _, other in found], dtype=np.int64)
+            distances = np.array([distance for distance, _ in found], dtype=np.int32)
+            self._link(node, self._select(words, nodes, distances, self.m0 if layer == 0 else self.m), layer, words)
+            entry_points = nodes.tolist()
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def build(self, codes):
+        """Insert every row of `codes`, replacing the current graph."""
+        self.clear()
+        self.add(np.arange(len(codes)), codes)
+        return self
+
+    def add(self, rows, codes):
+        """Insert `rows`, which were appended to or overwritten in `codes`, the full code matrix."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not len(rows):
+            return
+        self._reserve(int(rows[-1]) + 1, 0)
+        words = as_words(codes[:max(self.size, int(rows[-1]) + 1)])
+        for row in rows.tolist():
+            if self.levels[row] < 0:
+                level = int(-np.log(1.0 - self.rng.random()) * self.level_multiplier)
+                if level:
+                    self._reserve(0, self.upper_size + level)
+                    self.upper_index[row] = self.upper_size
+                    self.upper_size += level
+                self.levels[row] = level
+            else:
+                # An overwritten row is linked again from its new code
+                for layer in range(int(self.levels[row]) + 1):
+                    self._set_neighbors(row, layer, np.empty(0, dtype=np.int32))
+            self.size = max(self.size, row + 1)
+            self._insert(row, words)
+
+    def remap(self, live_rows):
+        """Renumber rows after store compaction, dropping the tombstones of the rows that are gone."""
+        new_rows = np.full(self.size + 1, -1, dtype=np.int32)
+        new_rows[live_rows] = np.arange(len(live_rows), dtype=np.int32)
+        levels = self.levels[live_rows]
+        # Edges to dropped nodes are removed, the remaining neighbours move to the front of each row
+        level0 = new_rows[self.level0[live_rows]]
+        level0 = np.take_along_axis(level0, np.argsort(level0 < 0, axis=1, kind="stable"), axis=1)
+        upper_counts = np.maximum(levels.astype(np.int64), 0)
+        upper_index = np.where(upper_counts > 0, np.cumsum(upper_counts) - upper_counts, -1)
+        upper_rows = np.concatenate([np.arange(start, start + count) for start, count in zip(self.upper_index[live_rows].tolist(), upper_counts.tolist()) if count] or [np.empty(0, dtype=np.int64)])
+        upper = new_rows[self.upper[upper_rows]]
+        upper = np.take_along_axis(upper, np.argsort(upper < 0, axis=1, kind="stable"), axis=1)
+        self.levels, self.level0, self.upper_index, self.upper = levels, level0, upper_index, upper
+        self.upper_size = len(upper)
+        self.size = len(live_rows)
+        if self.entry_point >= 0 and new_rows[self.entry_point] >= 0:
+            self.entry_point = int(new_rows[self.entry_point])
+        elif self.size:
+            self.entry_point = int(np.argmax(levels))
+        else:
+            self.entry_point = -1
+        self.max_level = int(self.levels[self.entry_point]) if self.entry_point >= 0 else -1
+
+    def clear(self):
+        self.__init__(m=self.m, ef_construction=self.ef_construction, ef_search=self.ef_search, seed=self.seed)
+
+    def view(self):
+        """Return a snapshot of the index for searching without a lock."""
+        return copy.copy(self)
+
+    @staticmethod
+    def fingerprint(codes):
+        """Checksum of every row, to tell whether a saved graph was built over exactly `codes`."""
+        digest = hashlib.sha256(str(codes.shape).encode("utf-8"))
+        # Hashed in blocks so a memory-mapped matrix is never copied whole
+        for start in range(0, len(codes), BLOCK_SIZE):
+            digest.update(np.ascontiguousarray(codes[start:start + BLOCK_SIZE]).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path, codes):
+        """Write the graph to `path`, with a fingerprint of the `codes` it was built over."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(
+                file,
+                params=np.array([self.m, self.ef_construction, self.ef_search, self.seed, self.size, self.upper_size, self.entry_point, self.max_level], dtype=np.int64),
+                fingerprint=np.array(self.fingerprint(codes[:self.size])),
+                levels=self.levels[:self.size],
+                level0=self.level0[:self.size],
+                upper_index=self.upper_index[:self.size],
+                upper=self.upper[:self.upper_size],
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path, codes):
+        """
+        Read a graph written by `save`, if it was built over the first rows of `codes`, and insert
+        the rows it is missing. Returns False, leaving the index untouched, if there is none.
+        """
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            m, ef_construction, _, seed, size, upper_size, entry_point, max_level = data["params"].tolist()
+            if m != self.m or size > len(codes) or str(data["fingerprint"]) != self.fingerprint(codes[:size]):
+                return False
+            self.clear()
+            self.ef_construction, self.seed = ef_construction, seed
+            self._reserve(size, upper_size)
+            self.levels[:size] = data["levels"]
+            self.level0[:size] = data["level0"]
+            self.upper_index[:size] = data["upper_index"]
+            self.upper[:upper_size] = data["upper"]
+        self.size, self.upper_size, self.entry_point, self.max_level = size, upper_size, entry_point, max_level
+        self.add(np.arange(size, len(codes)), codes)
+        return True
+
+    def search(self, query, codes, top_k, mask=None, rows=None):
+        """
+        Find about the `top_k` rows of `codes` nearest to `query`, like `hamming_search`.
+
+        Args:
+            query (np.ndarray): A packed uint8 code of shape (code_size,).
+            codes (np.ndarray): The packed uint8 codes the index was built over, of shape (n, code_size).
+            top_k (int): The number of nearest rows to return.
+            mask (np.ndarray, optional): A boolean array of shape (n,); rows where it is False are skipped.
+            rows (np.ndarray, optional): Sorted row indices; when given, only these rows are searched.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The row indices and their distances, nearest first.
+        """
+        query = np.asarray(query, dtype=np.uint8).reshape(-1)
+        ef = max(self.ef_search, top_k)
+        if self.entry_point < 0 or len(codes) > self.size:
+            return hamming_search(query, codes, top_k, mask=mask, rows=rows)
+        if rows is not None:
+            if len(rows) <= ef * self.m0:
+                # A selective filter is cheaper to scan exactly than to walk the graph around
+                return hamming_search(query, codes, top_k, rows=rows)
+            mask = np.zeros(len(codes), dtype=bool)
+            mask[rows] = True
+        words, query_words = as_words(codes), as_words(query.reshape(1, -1))[0]
+        entry_points = [self.entry_point]
+        for layer in range(self.max_level, 0, -1):
+            entry_points = [self._search_layer(query_words, words, entry_points, 1, layer)[0][1]]
+        found = self._search_layer(query_words, words, entry_points, ef, 0, allowed=mask)[:top_k]
+        if len(found) < top_k:
+            # Too many tombstones or filtered rows around the query to fill top_k from the graph
+            return hamming_search(query, codes, top_k, mask=mask)
+        return np.array([node for _, node in found], dtype=np.int64), np.array([distance for distance, _ in found], dtype=np.int32)
+
+    def search_batch(self, queries, codes, top_k, mask=None, rows=None):
+        """Run `search` for every query in `queries`, like `hamming_search_batch`."""
+        return [self.search(query, codes, top_k, mask=mask, rows=rows) for query in np.asarray(queries)]
+
+
+class ShardedScanIndex:
+    """
+    Exact Hamming k-NN by scanning contiguous shards of the code matrix on a thread pool.
+
+    The rows (or the filtered `rows`) are split into one shard per thread, aligned to the scan's
+    block size, and every shard is reduced to its own top_k by `hamming_search`. numpy releases
+    the GIL inside the XOR, popcount and partition kernels, so shards run on separate cores. The
+    per-shard results are merged with the same tie-breaking as a single scan, so results are
+    identical to `hamming_search`.
+
+    Collections smaller than two shards of `min_shard_rows` are scanned on the calling thread,
+    where the pool would cost more than it saves. The index keeps no per-row state, so adding,
+    remapping and clearing rows are no-ops and `view()` returns the index itself.
+    """
+
+    def __init__(self, num_threads=None, min_shard_rows=4 * BLOCK_SIZE):
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.min_shard_rows = min_shard_rows
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return 0
+
+    def build(self, codes):
+        return self
+
+    def add(self, rows, codes):
+        pass
+
+    def remap(self, live_rows):
+        pass
+
+    def clear(self):
+        pass
+
+    def view(self):
+        return self
+
+    def _pool(self):
+        # Created on first use and shared by every search, concurrent ones included
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="vlite-scan")
+            return self.executor
+
+    def shards(self, n):
+        """Split n rows into contiguous (start, stop) shards of whole scan blocks, one per thread at most."""
+        num_shards = min(self.num_threads, n // max(self.min_shard_rows, 1))
+        if num_shards <= 1:
+            return [(0, n)]
+        shard_size = -(-n // num_shards)
+        shard_size = -(-shard_size // BLOCK_SIZE) * BLOCK_SIZE
+        return [(start, min(start + shard_size, n)) for start in range(0, n, shard_size)]
+
+    def _scan(self, search, codes, mask, rows):
+        """Run `search(codes, mask, rows)` on every shard, and return the per-shard results with global row numbers."""
+        n = len(rows) if rows is not None else len(codes)
+        shards = self.shards(n)
+        if len(shards) == 1:
+            return [search(codes, mask, rows)]
+
+        def scan_shard(start, stop):
+            if rows is not None:
+                return search(codes, None, rows[start:stop])
+            results = search(codes[start:stop], mask[start:stop] if mask is not None else None, None)
+            return [(shard_rows + start, distances) for shard_rows, distances in results]
+
+        futures = [self._pool().submit(scan_shard, start, stop) for start, stop in shards]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _merge(results, top_k):
+        rows = np.concatenate([shard_rows for shard_rows, _ in results])
+        distances = np.concatenate([shard_distances for _, shard_distances in results])
+        selected = top_k_smallest(distances, top_k)
+        return rows[selected], distances[selected]
+
+    def search(self, query, codes, top_k, mask=None, rows=None):
+        shard_results = self._scan(lambda codes, mask, rows: [hamming_search(query, codes, top_k, mask=mask, rows=rows)], codes, mask, rows)
+        return self._merge([results[0] for results in shard_results], top_k)
+
+    def search_batch(self, queries, codes, top_k, mask=None, rows=None):
+        shard_results = self._scan(lambda codes, mask, rows: hamming_search_batch(queries, codes, top_k, mask=mask, rows=rows), codes, mask, rows)
+        return [self._merge(results, top_k) for results in zip(*shard_results)]
+
+
+def metadata_value_key(value):
+    """Map a metadata value to a hashable key; equal values, dicts and lists included, map to equal keys."""
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("__json__", json.dumps(value, sort_keys=True, default=str))
+
+
+class MetadataIndex:
+    """
+    Inverted index from metadata key/value pairs to the store rows that carry them.
+
+    `lookup` intersects the posting sets of a filter, smallest first, so a search only has to
+    visit the rows that match it.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.key_rows = {}
+        self.row_entries = {}
+
+    def add(self, row, metadata):
+        self.remove(row)
+        entries = []
+        for key, value in (metadata or {}).items():
+            value_key = metadata_value_key(value)
+            self.postings.setdefault(key, {}).setdefault(value_key, set()).add(row)
+            self.key_rows.setdefault(key, set()).add(row)
+            entries.append((key, value_key))
+        self.row_entries[row] = entries
+
+    def remove(self, row):
+        for key, value_key in self.row_entries.pop(row, ()):
+            values = self.postings[key]
+            values[value_key].discard(row)
+            if not values[value_key]:
+                del values[value_key]
+            self.key_rows[key].discard(row)
+
+    def match(self, key, value):
+        """Return the set of rows whose metadata[key] == value; a None value also matches rows without the key."""
+        rows = self.postings.get(key, {}).get(metadata_value_key(value), set())
+        if value is None:
+            without_key = self.row_entries.keys() - self.key_rows.get(key, set())
+            return rows | without_key
+        return rows
+
+    def lookup(self, where):
+        """Return the sorted rows matching every key/value pair of `where`."""
+        matches = sorted((self.match(key, value) for key, value in where.items()), key=len)
+        if not matches:
+            rows = self.row_entries.keys()
+        else:
+            rows = matches[0].intersection(*matches[1:])
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+    def remap(self, live_rows):
+        """Renumber rows after store compaction; `live_rows[i]` is the old index of new row i."""
+        new_rows = {old: new for new, old in enumerate(live_rows.tolist())}
+        row_entries = {new_rows[row]: entries for row, entries in self.row_entries.items() if row in new_rows}
+        self.__init__()
+        for row, entries in row_entries.items():
+            for key, value_key in entries:
+                self.postings.setdefault(key, {}).setdefault(value_key, set()).add(row)
+                self.key_rows.setdefault(key, set()).add(row)
+            self.row_entries[row] = entries
+
+    def clear(self):
+        self.__init__()
+
+
+def item_id_of(chunk_id):
+    """Chunk ids are f"{item_id}_{chunk_number}"; recover the item id."""
+    return chunk_id.rsplit("_", 1)[0]
+
+
+class ItemIndex:
+    """Maps item ids to the ids of their chunks, in insertion order, and chunk ids back to their item."""
+
+    def __init__(self):
+        self.chunks = {}
+        self.items = {}
+
+    def __contains__(self, item_id):
+        return item_id in self.chunks
+
+    def add(self, chunk_id):
+        item_id = item_id_of(chunk_id)
+        self.items[chunk_id] = item_id
+        self.chunks.setdefault(item_id, {})[chunk_id] = None
+
+    def remove(self, chunk_id):
+        item_id = self.items.pop(chunk_id, None)
+        if item_id is None:
+            return
+        chunks = self.chunks[item_id]
+        del chunks[chunk_id]
+        if not chunks:
+            del self.chunks[item_id]
 
-        sorted_indices = np.argsort(similarities)[::-1]
-        top_k_indices = sorted_indices[:top_k]
+    def get(self, item_id):
+        return list(self.chunks.get(item_id, ()))
 
-        top_k_ids = chunk_ids[top_k_indices]
-        top_k_scores = similarities[top_k_indices]
+    def item(self, chunk_id):
+        return self.items[chunk_id]
 
-        return top_k_ids.tolist(), top_k_scores.tolist()
\ No newline at end of file
+    def clear(self):
+        self.__init__()
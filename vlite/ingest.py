@@ -0,0 +1,146 @@
+import os
+import copy
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+import logging
+from .utils import chop_and_chunk, process_file
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def prepare_document(document, need_chunks=True, fast=True):
+    """
+    Turn one document into (item_id, chunks, metadata).
+
+    A document is a text, a dict with 'text' and optional 'metadata' and 'id', or a path-like
+    object naming a file, which is read and chunked by `process_file` and gets its path as
+    'source' metadata.
+    """
+    if isinstance(document, os.PathLike):
+        path = os.fspath(document)
+        return str(uuid4()), process_file(path), {"source": path}
+    if isinstance(document, dict):
+        text, metadata, item_id = document['text'], dict(document.get('metadata') or {}), document.get('id')
+    else:
+        text, metadata, item_id = document, {}, None
+    chunks = chop_and_chunk(text, fast=fast) if need_chunks else [text]
+    return item_id if item_id is not None else str(uuid4()), chunks, metadata
+
+
+class IngestPipeline:
+    """
+    Stream documents into a VLite collection through overlapping stages:
+
+    1. `num_workers` threads read and chunk documents, at most `max_pending` documents ahead.
+    2. One thread tokenizes each micro-batch of `batch_size` chunks while the previous one is embedded,
+       with its own copy of the model's tokenizer.
+    3. The calling thread runs the model on the micro-batch.
+    4. One thread commits the embedded micro-batch to the store and the write-ahead log while
+       the next one is embedded.
+
+    Every stage waits for the one after it once its queue is full, so the pipeline itself only
+    holds a bounded number of documents and micro-batches, however long the input is. The
+    collection still grows with it: like `add`, every committed chunk keeps its text and code in
+    the VLite's in-memory index. After each committed micro-batch, `progress` is called with the
+    stats of the run so far.
+    """
+
+    def __init__(self, vlite, batch_size=256, num_workers=None, max_pending=None, need_chunks=True, fast=True, metadata=None, progress=None):
+        self.vlite = vlite
+        self.batch_size = batch_size
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.num_workers
+        self.need_chunks = need_chunks
+        self.fast = fast
+        self.metadata = metadata or {}
+        self.progress = progress
+        self.documents = 0
+        self.chunks = 0
+        self.batches = 0
+        self.start_time = None
+
+    def stats(self):
+        elapsed = time.time() - self.start_time if self.start_time is not None else 0.0
+        return {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "elapsed": elapsed,
+            "chunks_per_s": self.chunks / elapsed if elapsed else 0.0,
+        }
+
+    def _prepared(self, documents, chunker):
+        """Chunk documents on the worker threads and yield them in input order."""
+        pending = deque()
+        for document in documents:
+            pending.append(chunker.submit(prepare_document, document, self.need_chunks, self.fast))
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _batches(self, prepared):
+        """Group the chunks of consecutive documents into micro-batches of (chunk_ids, texts, metadatas)."""
+        chunk_ids, texts, metadatas = [], [], []
+        for item_id, chunks, metadata in prepared:
+            self.documents += 1
+            metadata = {**metadata, **self.metadata}
+            for idx, chunk in enumerate(chunks):
+                chunk_ids.append(f"{item_id}_{idx}")
+                texts.append(chunk)
+                metadatas.append(metadata)
+                if len(texts) == self.batch_size:
+                    yield chunk_ids, texts, metadatas
+                    chunk_ids, texts, metadatas = [], [], []
+        if texts:
+            yield chunk_ids, texts, metadatas
+
+    def _tokenized(self, batches, tokenizer, tokenizer_copy):
+        """Tokenize every micro-batch one batch ahead of the one being embedded, with a copy of the model's tokenizer."""
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, tokenizer.submit(self.vlite.model.tokenize, batch[1], tokenizer_copy)))
+            if len(pending) > 1:
+                batch, encodings = pending.popleft()
+                yield batch, encodings.result()
+        while pending:
+            batch, encodings = pending.popleft()
+            yield batch, encodings.result()
+
+    def _write(self, chunk_ids, texts, metadatas, codes, vectors):
+        self.vlite._put_chunks(chunk_ids, texts, metadatas, codes, vectors)
+        self.vlite._log_put(chunk_ids)
+        return len(chunk_ids)
+
+    def _committed(self, written):
+        self.chunks += written.result()
+        self.batches += 1
+        if self.progress is not None:
+            self.progress(self.stats())
+
+    def run(self, documents):
+        """Ingest every document of the iterable `documents` and return the stats of the run."""
+        self.start_time = time.time()
+        precisions = ("binary", self.vlite.rescore) if self.vlite.rescore else ("binary",)
+        with ThreadPoolExecutor(self.num_workers, thread_name_prefix="vlite-chunk") as chunker, \
+                ThreadPoolExecutor(1, thread_name_prefix="vlite-tokenize") as tokenizer, \
+                ThreadPoolExecutor(1, thread_name_prefix="vlite-write") as writer:
+            written = None
+            batches = self._batches(self._prepared(documents, chunker))
+            # The embedding thread pads with the model's tokenizer, which must not be used by two threads at once
+            tokenizer_copy = copy.deepcopy(self.vlite.model.tokenizer)
+            for (chunk_ids, texts, metadatas), encodings in self._tokenized(batches, tokenizer, tokenizer_copy):
+                embeddings = self.vlite.model.embed_many(texts, precisions, encodings=encodings)
+                vectors = embeddings[1] if self.vlite.rescore else None
+                # At most one micro-batch is being written while the next one is embedded
+                if written is not None:
+                    self._committed(written)
+                written = writer.submit(self._write, chunk_ids, texts, metadatas, embeddings[0], vectors)
+            if written is not None:
+                self._committed(written)
+        stats = self.stats()
+        logger.info(f"[IngestPipeline.run] Ingested {stats['chunks']} chunks of {stats['documents']} documents in {stats['elapsed']:.5f} seconds")
+        return stats
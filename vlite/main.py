@@ -1,56 +1,159 @@
 import numpy as np
 from uuid import uuid4
-from .utils import check_cuda_available, check_mps_available
-from .model import EmbeddingModel
+from .device import resolve_device
+from .model import DEFAULT_CODE_BITS, EmbeddingModel
 from .utils import chop_and_chunk
 import datetime
 from .ctx import Ctx
+from .cache import EmbeddingCache
+from .store import BinaryVectorStore, as_binary_codes, as_query_codes
+from .index import BinaryVectorIndex, HnswIndex, InvertedFileIndex, ItemIndex, MetadataIndex, ShardedScanIndex
+from .ingest import IngestPipeline
+from .rescore import RESCORE_DTYPES, dequantize, quantize_embeddings, rescore, sign_embeddings
 import time
 import logging
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+# Search engines: "scan" compares the query with every code, "parallel" does the same over shards of the
+# codes on a thread pool, "mih" probes a multi-index hashing index (all three exact), "ivf" only scans
+# the posting lists of the centroids nearest to the query and "hnsw" walks a navigable small-world
+# graph (both approximate)
+ENGINES = {
+    "scan": None,
+    "parallel": ShardedScanIndex,
+    "mih": BinaryVectorIndex,
+    "ivf": InvertedFileIndex,
+    "hnsw": HnswIndex,
+}
+
+
 class VLite:
-    def __init__(self, collection=None, device=None, model_name='mixedbread-ai/mxbai-embed-large-v1'):
+    # The write-ahead log is folded into the base file once it outgrows it (and this many bytes)
+    WAL_COMPACT_MIN_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, collection=None, device=None, model_name='mixedbread-ai/mxbai-embed-large-v1', compaction_threshold=0.25, background_compaction=False, cache_size=10000, persist_cache=False, backend="torch", quantize=False, warmup=False, rescore=None, rescore_multiplier=4, code_bits=None, engine="scan", engine_options=None):
         start_time = time.time()
-        if device is None:
-            if check_cuda_available():
-                device = 'cuda'
-            elif check_mps_available():
-                device = 'mps'
-            else:
-                device = 'cpu'
+        # Probed in-process once per process; $VLITE_DEVICE overrides the detection
+        device = resolve_device(device)
+        logger.debug(f"[VLite.__init__] Device resolution time: {time.time() - start_time:.5f} seconds")
         logger.info(f"[VLite.__init__] Initializing VLite with device: {device}")
         self.device = device
         if collection is None:
             current_datetime = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             collection = f"vlite_{current_datetime}"
         self.collection = f"{collection}"
-        self.model = EmbeddingModel(model_name, device=device) if model_name else EmbeddingModel()
         self.ctx = Ctx()
+        # Identical chunks are embedded once; the persistent tier is a sidecar of the collection
+        cache = EmbeddingCache(cache_size, path=self.ctx.cache_path(self.collection) if persist_cache else None) if cache_size else None
+        # The model is only loaded by the first call that embeds text, unless it is warmed up now
+        # The code width of a new collection is `code_bits` (512 by default), existing ones keep theirs
+        model_options = dict(cache=cache, backend=backend, quantize=quantize, code_bits=code_bits or DEFAULT_CODE_BITS)
+        self.model = EmbeddingModel(model_name, device=device, **model_options) if model_name else EmbeddingModel(**model_options)
         self.index = {}
-        try:
-            ctx_file = self.ctx.read(collection)
+        self.store = BinaryVectorStore()
+        self.metadata_index = MetadataIndex()
+        self.item_index = ItemIndex()
+        # Deleted rows stay in the store as tombstones until they exceed this fraction of it
+        self.compaction_threshold = compaction_threshold
+        self.background_compaction = background_compaction
+        self._compaction_thread = None
+        # With rescore ("int8" or "float16"), every chunk also keeps an embedding of that precision and
+        # rescore_multiplier * top_k Hamming candidates are reranked by their dot product with the query
+        if rescore is not None and rescore not in RESCORE_DTYPES:
+            raise ValueError(f"Unsupported rescore precision: {rescore}, expected one of {sorted(RESCORE_DTYPES)}")
+        self.rescore = rescore
+        self.rescore_multiplier = rescore_multiplier
+        # "scan" and "mih" return the exact Hamming top-k, "ivf" and "hnsw" trade recall for speed
+        # engine_options configure the index, e.g. {"nlist": 1024, "nprobe": 16} for "ivf"
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}, expected one of {sorted(ENGINES)}")
+        self.engine = engine
+        self.search_index = ENGINES[engine](**(engine_options or {})) if ENGINES[engine] else None
+        # Serializes mutations and compaction; searches only hold it while taking a snapshot
+        self.lock = threading.RLock()
+        self.ctx_file = self.ctx.read(collection)
+        if self.ctx_file.exists():
+            ctx_file = self.ctx_file
             ctx_file.load()
+            self._check_header(ctx_file, code_bits)
 
+            chunk_ids = list(ctx_file.metadata.keys())
             self.index = {
                 chunk_id: {
                     'text': ctx_file.contexts[idx] if idx < len(ctx_file.contexts) else "",
                     'metadata': ctx_file.metadata.get(chunk_id, {}),
-                    'binary_vector': np.array(ctx_file.embeddings[idx]) if idx < len(ctx_file.embeddings) else np.zeros(self.model.dimension)
                 }
-                for idx, chunk_id in enumerate(ctx_file.metadata.keys())
+                for idx, chunk_id in enumerate(chunk_ids)
             }
-        except FileNotFoundError:
+            rescore_embeddings = ctx_file.rescore_array() if self.rescore else None
+            if rescore_embeddings is None or len(rescore_embeddings) != len(chunk_ids):
+                rescore_embeddings = None
+            elif rescore_embeddings.dtype != RESCORE_DTYPES[self.rescore]:
+                rescore_embeddings = quantize_embeddings(dequantize(rescore_embeddings), self.rescore)
+            if chunk_ids and len(ctx_file.embeddings) == len(chunk_ids):
+                # Search the (memory-mapped) codes of the file in place
+                self.store.attach(chunk_ids, ctx_file.embeddings, rescore_embeddings)
+            elif chunk_ids and len(ctx_file.embeddings):
+                codes = np.zeros((len(chunk_ids), ctx_file.embeddings.shape[1]), dtype=np.uint8)
+                embeddings = ctx_file.embeddings[:len(chunk_ids)]
+                codes[:len(embeddings)] = embeddings
+                self.store.append_batch(chunk_ids, codes, rescore_embeddings)
+            for chunk_id in self.store.rows:
+                self.metadata_index.add(self.store.rows[chunk_id], self.index[chunk_id]['metadata'])
+                self.item_index.add(chunk_id)
+            if self.search_index is not None and self.store.size:
+                self._load_search_index()
+            # The parsed sections now live in the index and the store; the file is only appended to from here on
+            ctx_file.unload()
+        else:
             logger.warning(f"[VLite.__init__] Collection file {self.collection} not found. Initializing empty attributes.")
+        if warmup:
+            self.model.warmup()
 
         end_time = time.time()
         logger.debug(f"[VLite.__init__] Execution time: {end_time - start_time:.5f} seconds")
         logger.info(f"[VLite.__init__] Using device: {self.device}")
 
+    def _check_header(self, ctx_file, code_bits):
+        """Check that a loaded collection was embedded by this model, and adopt its code width."""
+        embedding_model = ctx_file.header.get("embedding_model")
+        if embedding_model not in (None, "", "default") and embedding_model != self.model.model_name:
+            if ctx_file.version >= ctx_file.MODEL_NAME_VERSION:
+                raise ValueError(f"Collection {self.collection} was embedded with {embedding_model}, not {self.model.model_name}")
+            # Older files name the default model whatever they were embedded with, so the name proves nothing
+            logger.warning(f"[VLite._check_header] Collection {self.collection} names {embedding_model}, which files of version {ctx_file.version} do not record reliably; using {self.model.model_name}")
+        stored_bits = ctx_file.code_bits()
+        if not stored_bits:
+            return
+        if code_bits is not None and code_bits != stored_bits:
+            raise ValueError(f"Collection {self.collection} stores {stored_bits}-bit codes, not {code_bits}-bit codes")
+        self.model.code_bits = stored_bits
+
+    def _load_search_index(self):
+        # A graph saved next to the collection is reused; any other index is rebuilt from the codes
+        codes, _ = self.store.view()
+        index_path = self.ctx.index_path(self.collection)
+        if hasattr(self.search_index, "load") and self.search_index.load(index_path, codes):
+            logger.info(f"[VLite._load_search_index] Loaded the {self.engine} index from {index_path}")
+            return
+        start_time = time.time()
+        self.search_index.build(codes)
+        end_time = time.time()
+        logger.info(f"[VLite._load_search_index] Built the {self.engine} index over {len(codes)} rows in {end_time - start_time:.5f} seconds")
+        self._save_search_index()
+
+    def _save_search_index(self):
+        # A saved graph numbers rows like the file does, which has no tombstones; a graph saved while
+        # the store has some would not match the reloaded codes and is rebuilt on load instead
+        if hasattr(self.search_index, "save") and self.store.size == len(self.store):
+            codes, _ = self.store.view()
+            self.search_index.save(self.ctx.index_path(self.collection), codes)
+
     def add(self, data, metadata=None, item_id=None, need_chunks=False, fast=True):
         start_time = time.time()
         data = [data] if not isinstance(data, list) else data
@@ -76,38 +179,58 @@ class VLite:
             all_chunks.extend(chunks)
             all_metadata.extend([item_metadata] * len(chunks))
             all_ids.extend([item_id] * len(chunks))
-        binary_encoded_data = self.model.embed(all_chunks, precision="binary")
+        if self.rescore:
+            binary_encoded_data, rescore_vectors = self.model.embed_many(all_chunks, ("binary", self.rescore))
+        else:
+            binary_encoded_data, rescore_vectors = self.model.embed(all_chunks, precision="binary"), None
 
 
-        for idx, (chunk, binary_vector, metadata) in enumerate(zip(all_chunks, binary_encoded_data, all_metadata)):
-            chunk_id = f"{item_id}_{idx}"
-            self.index[chunk_id] = {
-                'text': chunk,
-                'metadata': metadata,
-                'binary_vector': binary_vector.tolist()
-            }
+        chunk_ids = [f"{item_id}_{idx}" for idx in range(len(all_chunks))]
+        self._put_chunks(chunk_ids, all_chunks, all_metadata, binary_encoded_data, rescore_vectors)
 
         if item_id not in [result[0] for result in results]:
             results.append((item_id, binary_encoded_data, metadata))
 
-        self.save()
+        self._log_put(chunk_ids)
         logger.info("[VLite.add] Text added successfully.")
         end_time = time.time()
         logger.debug(f"[VLite.add] Execution time: {end_time - start_time:.5f} seconds")
         return results
 
-        
+    def ingest(self, documents, batch_size=256, num_workers=None, max_pending=None, need_chunks=True, fast=True, metadata=None, progress=None):
+        """
+        Stream documents into the collection: chunking, tokenizing, embedding and writing overlap,
+        and each micro-batch of `batch_size` chunks is committed to the write-ahead log as soon as
+        it is embedded. The pipeline holds a bounded amount of input at a time, so long inputs are
+        streamed at the model's throughput; ingested chunks are kept in the index as with `add`.
+
+        Args:
+            documents (Iterable): Texts, dicts with 'text' and optional 'metadata' and 'id', or
+                path-like objects naming files to read with `process_file`; consumed lazily.
+            batch_size (int, optional): The number of chunks embedded and committed at a time.
+            num_workers (int, optional): The number of threads chunking documents, one per CPU by default.
+            max_pending (int, optional): How many documents may be chunked ahead of the embedding.
+            need_chunks (bool, optional): Whether texts are split into chunks, as in `add`.
+            fast (bool, optional): Whether to chunk by characters rather than by tokens.
+            metadata (dict, optional): Metadata added to every chunk.
+            progress (callable, optional): Called with the stats of the run after every committed micro-batch.
+
+        Returns:
+            dict: The numbers of documents, chunks and micro-batches ingested, the elapsed seconds and the chunks per second.
+        """
+        pipeline = IngestPipeline(self, batch_size=batch_size, num_workers=num_workers, max_pending=max_pending, need_chunks=need_chunks, fast=fast, metadata=metadata, progress=progress)
+        return pipeline.run(documents)
 
     def retrieve(self, text=None, top_k=5, metadata=None, return_scores=False):
         start_time = time.time()
         logger.info("[VLite.retrieve] Retrieving similar texts...")
         if text:
             logger.info(f"[VLite.retrieve] Retrieving top {top_k} similar texts for query: {text}")
-            query_binary_vectors = self.model.embed(text, precision="binary")
+            query_binary_vectors, query_vectors = self._embed_queries(text)
             # Perform search on the query binary vectors
             results = []
-            for query_binary_vector in query_binary_vectors:
-                chunk_results = self.rank_and_filter(query_binary_vector, top_k, metadata)
+            for query_binary_vector, query_vector in zip(query_binary_vectors, query_vectors):
+                chunk_results = self.rank_and_filter(query_binary_vector, top_k, metadata, query_vector=query_vector)
                 results.extend(chunk_results)
             # Sort the results by similarity score
             results.sort(key=lambda x: x[1])
@@ -115,56 +238,159 @@ class VLite:
             logger.info("[VLite.retrieve] Retrieval completed.")
             end_time = time.time()
             logger.debug(f"[VLite.retrieve] Execution time: {end_time - start_time:.5f} seconds")
-            if return_scores:
-                return [(idx, self.index[idx]['text'], self.index[idx]['metadata'], score) for idx, score in results]
+            return self._entries(results, return_scores)
+
+    def retrieve_batch(self, texts, top_k=5, where=None, return_scores=False):
+        start_time = time.time()
+        logger.info(f"[VLite.retrieve_batch] Retrieving top {top_k} similar texts for {len(texts)} queries")
+        # One forward pass for the whole batch
+        query_binary_vectors, query_vectors = self._embed_queries(texts)
+        results = self._search_batch(as_binary_codes(query_binary_vectors), top_k, where, return_scores, query_vectors)
+        logger.info("[VLite.retrieve_batch] Retrieval completed.")
+        end_time = time.time()
+        logger.debug(f"[VLite.retrieve_batch] Execution time: {end_time - start_time:.5f} seconds")
+        return results
+
+    def retrieve_by_vector(self, vector, top_k=5, metadata=None, return_scores=False):
+        """Like retrieve, for a query that is already embedded: a packed binary code or a float vector."""
+        start_time = time.time()
+        logger.info(f"[VLite.retrieve_by_vector] Retrieving top {top_k} similar texts for a query vector")
+        if not len(self.store):
+            raise ValueError("No valid binary vectors found for comparison.")
+        query_binary_vector = as_query_codes(vector, self.store.code_size)[0]
+        # Float queries can also be rescored, packed codes only get the Hamming ranking
+        query_vector = np.asarray(vector, dtype=np.float32).reshape(-1) if self._is_float(vector) else None
+        results = self.rank_and_filter(query_binary_vector, top_k, metadata, query_vector=query_vector)
+        end_time = time.time()
+        logger.debug(f"[VLite.retrieve_by_vector] Execution time: {end_time - start_time:.5f} seconds")
+        return self._entries(results, return_scores)
+
+    def retrieve_by_vectors(self, vectors, top_k=5, where=None, return_scores=False):
+        """Like retrieve_batch, for queries that are already embedded: packed binary codes or float vectors."""
+        start_time = time.time()
+        logger.info(f"[VLite.retrieve_by_vectors] Retrieving top {top_k} similar texts for {len(vectors)} query vectors")
+        if not len(self.store):
+            raise ValueError("No valid binary vectors found for comparison.")
+        query_vectors = np.asarray(vectors, dtype=np.float32) if self._is_float(vectors) else [None] * len(vectors)
+        results = self._search_batch(as_query_codes(vectors, self.store.code_size), top_k, where, return_scores, query_vectors)
+        end_time = time.time()
+        logger.debug(f"[VLite.retrieve_by_vectors] Execution time: {end_time - start_time:.5f} seconds")
+        return results
+
+    def _entries(self, results, return_scores=False):
+        """
+        Attach the text and metadata of every (chunk_id, score) search result. They are read under
+        the lock, and chunks deleted since the search snapshot was taken are left out.
+        """
+        with self.lock:
+            entries = [(idx, self.index[idx], score) for idx, score in results if idx in self.index]
+        if return_scores:
+            return [(idx, entry['text'], entry['metadata'], score) for idx, entry, score in entries]
+        return [(idx, entry['text'], entry['metadata']) for idx, entry, _ in entries]
+
+    def _embed_queries(self, texts):
+        """Embed query texts to binary codes, plus float vectors when the collection is rescored."""
+        if self.rescore:
+            return self.model.embed_many(texts, ("binary", "float32"))
+        query_binary_vectors = self.model.embed(texts, precision="binary")
+        return query_binary_vectors, [None] * len(query_binary_vectors)
+
+    @staticmethod
+    def _is_float(vectors):
+        return np.issubdtype(np.asarray(vectors).dtype, np.floating)
+
+    @staticmethod
+    def _rescores(query_vector, rescore_vectors):
+        return query_vector is not None and rescore_vectors is not None
+
+    def _candidates(self, top_k, query_vector, rescore_vectors):
+        # The Hamming scan only pre-selects candidates when there is something to rerank them with
+        if self._rescores(query_vector, rescore_vectors):
+            return top_k * self.rescore_multiplier
+        return top_k
+
+    def _engine(self):
+        # Called under the lock: the index snapshot matches the snapshot of the codes
+        return self.search_index.view() if self.search_index is not None else self.model
+
+    def _search_batch(self, query_binary_vectors, top_k, where=None, return_scores=False, query_vectors=None):
+        if not len(self.store) or query_binary_vectors.shape[1] != self.store.code_size:
+            raise ValueError("No valid binary vectors found for comparison.")
+        if query_vectors is None:
+            query_vectors = [None] * len(query_binary_vectors)
+        with self.lock:
+            corpus_binary_vectors, alive = self.store.view()
+            chunk_ids = self.store.chunk_ids
+            rescore_vectors = self.store.vectors if self.rescore else None
+            # Metadata filters select the candidate rows before the scan
+            rows = self.metadata_index.lookup(where) if where else None
+            engine = self._engine()
+        candidates = max(self._candidates(top_k, query_vector, rescore_vectors) for query_vector in query_vectors)
+        batch_results = engine.search_batch(query_binary_vectors, corpus_binary_vectors, candidates, mask=alive, rows=rows)
+        results = []
+        for (top_k_indices, top_k_scores), query_vector in zip(batch_results, query_vectors):
+            if self._rescores(query_vector, rescore_vectors):
+                top_k_indices, top_k_scores = rescore(query_vector, rescore_vectors, top_k_indices, top_k)
             else:
-                return [(idx, self.index[idx]['text'], self.index[idx]['metadata']) for idx, _ in results]
+                top_k_indices, top_k_scores = top_k_indices[:top_k], top_k_scores[:top_k]
+            top_k_ids = chunk_ids[top_k_indices].tolist()
+            results.append(self._entries(zip(top_k_ids, top_k_scores.tolist()), return_scores))
+        return results
 
-    def rank_and_filter(self, query_binary_vector, top_k, metadata=None):
+    def rank_and_filter(self, query_binary_vector, top_k, metadata=None, query_vector=None):
         start_time = time.time()
         logger.debug(f"[VLite.rank_and_filter] Shape of query vector: {query_binary_vector.shape}")
-        query_binary_vector = np.array(query_binary_vector).reshape(-1)
+        query_binary_vector = as_binary_codes(query_binary_vector).reshape(-1)
         logger.debug(f"[VLite.rank_and_filter] Shape of query vector after reshaping: {query_binary_vector.shape}")
-        # Collect all binary vectors and ensure they all have the same shape as the query vector
-        binary_vectors = [item['binary_vector'] for item in self.index.values() if len(item['binary_vector']) == len(query_binary_vector)]        
-        binary_vector_indices = [idx for idx, item in enumerate(self.index.values()) if len(item['binary_vector']) == len(query_binary_vector)]
-        if binary_vectors:
-            corpus_binary_vectors = np.asarray(binary_vectors, dtype=np.float32)
-            logger.debug(f"[VLite.rank_and_filter] Shape of corpus binary vectors array: {corpus_binary_vectors.shape}")
-        else:
+        if not len(self.store) or query_binary_vector.shape[0] != self.store.code_size:
             raise ValueError("No valid binary vectors found for comparison.")
-        top_k_indices, top_k_scores = self.model.search(query_binary_vector, corpus_binary_vectors, top_k)
+        # Search the store in place; deleted rows are masked out by their liveness flag
+        # Compaction swaps in new arrays, so the snapshot stays consistent without holding the lock
+        with self.lock:
+            corpus_binary_vectors, alive = self.store.view()
+            chunk_ids = self.store.chunk_ids
+            rescore_vectors = self.store.vectors if self.rescore else None
+            # Apply the metadata filter first so only matching rows are scanned
+            rows = self.metadata_index.lookup(metadata) if metadata else None
+            engine = self._engine()
+        logger.debug(f"[VLite.rank_and_filter] Shape of corpus binary vectors array: {corpus_binary_vectors.shape}")
+        candidates = self._candidates(top_k, query_vector, rescore_vectors)
+        top_k_indices, top_k_scores = engine.search(query_binary_vector, corpus_binary_vectors, candidates, mask=alive, rows=rows)
+        if self._rescores(query_vector, rescore_vectors):
+            # Second stage: rerank the Hamming candidates by their higher-precision embeddings
+            top_k_indices, top_k_scores = rescore(query_vector, rescore_vectors, top_k_indices, top_k)
         logger.debug(f"[VLite.rank_and_filter] Top {top_k} indices: {top_k_indices}")
         logger.debug(f"[VLite.rank_and_filter] Top {top_k} scores: {top_k_scores}")
         logger.debug(f"[VLite.rank_and_filter] No. of items in the collection: {len(self.index)}")
         logger.debug(f"[VLite.rank_and_filter] Vlite count: {self.count()}")
 
-        top_k_ids = [list(self.index.keys())[binary_vector_indices[idx]] for idx in top_k_indices]
-        # Apply metadata filter on the retrieved top_k items
-        filtered_ids = []
-        if metadata:
-            for chunk_id in top_k_ids:
-                item_metadata = self.index[chunk_id]['metadata']
-                if all(item_metadata.get(key) == value for key, value in metadata.items()):
-                    filtered_ids.append(chunk_id)
-            top_k_ids = filtered_ids[:top_k]
-            top_k_scores = top_k_scores[:len(top_k_ids)]
+        top_k_ids = chunk_ids[top_k_indices].tolist()
         end_time = time.time()
         logger.debug(f"[VLite.rank_and_filter] Execution time: {end_time - start_time:.5f} seconds")
         return list(zip(top_k_ids, top_k_scores))
 
     def update(self, id, text=None, metadata=None, vector=None):
         start_time = time.time()
-        chunk_ids = [chunk_id for chunk_id in self.index if chunk_id.startswith(f"{id}_")]
-        if chunk_ids:
+        with self.lock:
+            chunk_ids = self.item_index.get(id)
             for chunk_id in chunk_ids:
                 if text is not None:
                     self.index[chunk_id]['text'] = text
                 if metadata is not None:
-                    self.index[chunk_id]['metadata'].update(metadata)
+                    # Chunks of one item may share a metadata dict, give each its own updated copy
+                    self.index[chunk_id]['metadata'] = {**self.index[chunk_id]['metadata'], **metadata}
+                    self.metadata_index.add(self.store.rows[chunk_id], self.index[chunk_id]['metadata'])
                 if vector is not None:
-                    self.index[chunk_id]['vector'] = vector
-            self.save()
+                    code = as_query_codes(vector, self.store.code_size)
+                    self.store.set(chunk_id, code)
+                    if self.search_index is not None:
+                        self.search_index.add([self.store.rows[chunk_id]], self.store.codes)
+                    if self.store.vectors is not None:
+                        self.store.set_vector(chunk_id, self._rescore_vectors(vector, code)[0])
+            if chunk_ids:
+                # A saved graph is only rewritten by save(); the checksum makes the next load rebuild a stale one
+                self._log_put(chunk_ids)
+        if chunk_ids:
             logger.info(f"[VLite.update] Item with ID '{id}' updated successfully.")
             end_time = time.time()
             logger.debug(f"[VLite.update] Execution time: {end_time - start_time:.5f} seconds")
@@ -177,14 +403,21 @@ class VLite:
         if isinstance(ids, str):
             ids = [ids]
         deleted_count = 0
-        for id in ids:
-            chunk_ids = [chunk_id for chunk_id in self.index if chunk_id.startswith(f"{id}_")]
-            for chunk_id in chunk_ids:
-                if chunk_id in self.index:
+        deleted_chunk_ids = []
+        with self.lock:
+            for id in ids:
+                for chunk_id in self.item_index.get(id):
+                    # Only the liveness flag of the row is cleared, compaction reclaims it later
                     del self.index[chunk_id]
+                    self.metadata_index.remove(self.store.rows[chunk_id])
+                    self.store.remove(chunk_id)
+                    self.item_index.remove(chunk_id)
+                    deleted_chunk_ids.append(chunk_id)
                     deleted_count += 1
+            if deleted_count > 0:
+                self._log_delete(deleted_chunk_ids)
         if deleted_count > 0:
-            self.save()
+            self._maybe_compact_store()
             logger.info(f"[VLite.delete] Deleted {deleted_count} item(s) from the collection.")
         else:
             logger.warning("[VLite.delete] No items found with the specified IDs.")
@@ -198,17 +431,24 @@ class VLite:
             for id in ids:
                 item_chunks = []
                 item_metadata = {}
-                for chunk_id, chunk_data in self.index.items():
-                    if chunk_id.startswith(f"{id}_"):
-                        item_chunks.append(chunk_data['text'])
-                        item_metadata.update(chunk_data['metadata'])
+                for chunk_id in self.item_index.get(id):
+                    chunk_data = self.index[chunk_id]
+                    item_chunks.append(chunk_data['text'])
+                    item_metadata.update(chunk_data['metadata'])
                 if item_chunks:
                     item_text = ' '.join(item_chunks)
                     items.append((id, item_text, item_metadata))
+        elif where is not None:
+            # Only visit the chunks the metadata index matched
+            items = []
+            for chunk_id in self.store.chunk_ids[self.metadata_index.lookup(where)].tolist():
+                chunk_data = self.index[chunk_id]
+                items.append((self.item_index.item(chunk_id), chunk_data['text'], chunk_data['metadata']))
+            return items
         else:
             items = []
             for chunk_id, chunk_data in self.index.items():
-                item_id = chunk_id.split('_')[0]
+                item_id = self.item_index.item(chunk_id)
                 item_text = chunk_data['text']
                 item_metadata = chunk_data['metadata']
                 items.append((item_id, item_text, item_metadata))
@@ -218,8 +458,7 @@ class VLite:
 
     def set(self, id, text=None, metadata=None, vector=None):
         logger.info(f"[VLite.set] Setting attributes for item with ID: {id}")
-        chunk_ids = [chunk_id for chunk_id in self.index if chunk_id.startswith(f"{id}_")]
-        if chunk_ids:
+        if id in self.item_index:
             self.update(id, text, metadata, vector)
         else:
             self.add(text, metadata=metadata, item_id=id)
@@ -237,24 +476,15 @@ class VLite:
             metadatas = [metadatas]
 
         if len(texts) != len(embeddings):
-            print("asdasd",len(texts), len(embeddings))
             raise ValueError("The number of texts and embeddings must be the same.")
 
         if len(texts) != len(metadatas):
             raise ValueError("The number of texts and metadatas must be the same.")
 
-        for text, embedding, metadata in zip(texts, embeddings, metadatas):
-            item_id = str(uuid4())
-            chunk_id = f"{item_id}_0"
-
-            self.index[chunk_id] = {
-                'text': text,
-                'metadata': metadata,
-                'binary_vector': embedding.tolist()
-            }
-    
+        chunk_ids = [f"{uuid4()}_0" for _ in texts]
+        self._put_chunks(chunk_ids, texts, metadatas, embeddings)
 
-        self.save()
+        self._log_put(chunk_ids)
         logger.info("[VLite.set_batch] Texts added successfully.")
         end_time = time.time()
         logger.debug(f"[VLite.set_batch] Execution time: {end_time - start_time:.5f} seconds")
@@ -263,36 +493,167 @@ class VLite:
     def count(self):
         return len(self.index)
 
+    def _put_chunks(self, chunk_ids, texts, metadatas, codes, vectors=None):
+        if self.rescore and vectors is None:
+            vectors = self._rescore_vectors(codes, as_binary_codes(codes))
+        with self.lock:
+            if vectors is not None and self.store.vectors is None and self.store.size:
+                # Rows written before rescoring was enabled only have their codes to go by
+                codes_so_far, _ = self.store.view()
+                self.store.set_vectors(sign_embeddings(codes_so_far, np.asarray(vectors).shape[1], self.rescore))
+            # Chunks that are written again get a new row; drop the postings of the rows they replace
+            for chunk_id in chunk_ids:
+                if chunk_id in self.store:
+                    self.metadata_index.remove(self.store.rows[chunk_id])
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                self.index[chunk_id] = {
+                    'text': text,
+                    'metadata': metadata,
+                }
+            if vectors is not None:
+                vectors = self._fit_vectors(vectors)
+            rows = self.store.append_batch(chunk_ids, codes, vectors)
+            if self.search_index is not None:
+                self.search_index.add(rows, self.store.codes)
+            for chunk_id, row, metadata in zip(chunk_ids, rows.tolist(), metadatas):
+                self.metadata_index.add(row, metadata)
+                self.item_index.add(chunk_id)
+        self._maybe_compact_store()
+
+    def _rescore_vectors(self, vectors, codes):
+        """Rescoring embeddings for vectors supplied by the caller: quantized if they are floats, else the signs of their codes."""
+        if self._is_float(vectors):
+            return self._fit_vectors(quantize_embeddings(np.asarray(vectors).reshape(len(codes), -1), self.rescore))
+        width = self.store.vectors.shape[1] if self.store.vectors is not None else codes.shape[1] * 8
+        return sign_embeddings(codes, width, self.rescore)
+
+    def _fit_vectors(self, vectors):
+        # Pad or cut rescoring embeddings to the width the store already holds
+        vectors = np.asarray(vectors).reshape(len(vectors), -1)
+        if self.store.vectors is None or vectors.shape[1] == self.store.vectors.shape[1]:
+            return vectors
+        fitted = np.zeros((len(vectors), self.store.vectors.shape[1]), dtype=vectors.dtype)
+        width = min(fitted.shape[1], vectors.shape[1])
+        fitted[:, :width] = vectors[:, :width]
+        return fitted
+
+    def _ctx_vectors(self, chunk_ids):
+        with self.lock:
+            rows = [self.store.rows[chunk_id] for chunk_id in chunk_ids]
+            return self.store.codes[rows]
+
+    def _ctx_rescore_vectors(self, chunk_ids):
+        with self.lock:
+            if self.store.vectors is None:
+                return None
+            rows = [self.store.rows[chunk_id] for chunk_id in chunk_ids]
+            return self.store.vectors[rows]
+
+    def _log_put(self, chunk_ids):
+        # Append the new state of each chunk to the write-ahead log instead of rewriting the collection
+        vectors = self._ctx_vectors(chunk_ids)
+        rescore_vectors = self._ctx_rescore_vectors(chunk_ids)
+        if rescore_vectors is None:
+            rescore_vectors = [None] * len(chunk_ids)
+        self.ctx_file.append_put(
+            (chunk_id, vector, self.index[chunk_id]['text'], self.index[chunk_id]['metadata'], rescore_vector)
+            for chunk_id, vector, rescore_vector in zip(chunk_ids, vectors, rescore_vectors)
+        )
+        self._maybe_compact()
+
+    def _log_delete(self, chunk_ids):
+        self.ctx_file.append_delete(chunk_ids)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        # Compacting only once the log outgrows the base keeps the amortized cost per mutation constant
+        wal_size = self.ctx_file.wal_size()
+        if wal_size > max(self.ctx_file.base_size(), self.WAL_COMPACT_MIN_SIZE):
+            logger.info(f"[VLite._maybe_compact] Compacting {wal_size} bytes of log into {self.collection}")
+            self.save()
+
+    def compact(self):
+        """Reclaim the rows of deleted and replaced chunks from the vector store."""
+        start_time = time.time()
+        with self.lock:
+            dead_rows = self.store.size - len(self.store)
+            live_rows = self.store.compact()
+            self.metadata_index.remap(live_rows)
+            if self.search_index is not None:
+                self.search_index.remap(live_rows)
+        end_time = time.time()
+        logger.info(f"[VLite.compact] Reclaimed {dead_rows} dead rows in {end_time - start_time:.5f} seconds")
+        return dead_rows
+
+    def _maybe_compact_store(self):
+        if self.store.dead_fraction() <= self.compaction_threshold:
+            return
+        if not self.background_compaction:
+            self.compact()
+        elif self._compaction_thread is None or not self._compaction_thread.is_alive():
+            self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+            self._compaction_thread.start()
+
     def save(self):
         logger.info(f"[VLite.save] Saving collection to {self.collection}")
-        with self.ctx.create(self.collection) as ctx_file:
+        # Write the in-memory state as a new base file, which also retires the write-ahead log
+        with self.lock:
+            persist_index = hasattr(self.search_index, "save")
+            if persist_index and self.store.size > len(self.store):
+                # A saved graph numbers rows like the file does, which has no tombstones
+                self.compact()
+            # Rows are written in store order, so they keep their row numbers when the file is loaded
+            codes, alive = self.store.view()
+            chunk_ids = self.store.chunk_ids[np.flatnonzero(alive)].tolist()
+            ctx_file = self.ctx.create(self.collection)
             ctx_file.set_header(
-                embedding_model="mixedbread-ai/mxbai-embed-large-v1",
-                embedding_size=64,  # Set the correct embedding size here
-                embedding_dtype=self.model.embedding_dtype,
-                context_length=self.model.context_length
+                embedding_model=self.model.model_name,
+                embedding_size=self.store.code_size or 0,
+                embedding_dtype=self.store.codes.dtype.name,
+                context_length=self.model.context_length,
+                code_bits=self.model.code_bits
             )
-            for chunk_id, chunk_data in self.index.items():
-                ctx_file.add_embedding(chunk_data['binary_vector'])
-                ctx_file.add_context(chunk_data['text'])
-                if 'metadata' in chunk_data:
-                    ctx_file.add_metadata(chunk_id, chunk_data['metadata'])
+            ctx_file.embeddings = self._ctx_vectors(chunk_ids)
+            rescore_vectors = self._ctx_rescore_vectors(chunk_ids)
+            if rescore_vectors is not None:
+                ctx_file.rescore_embeddings = rescore_vectors
+            for chunk_id in chunk_ids:
+                ctx_file.add_context(self.index[chunk_id]['text'])
+                ctx_file.add_metadata(chunk_id, self.index[chunk_id]['metadata'])
+            ctx_file.save()
+            if persist_index:
+                self._save_search_index()
         logger.info("[VLite.save] Collection saved successfully.")
 
     def clear(self):
         logger.info("[VLite.clear] Clearing the collection...")
-        self.index = {}
-        self.ctx.delete(self.collection)
+        with self.lock:
+            self.index = {}
+            self.store.clear()
+            self.metadata_index.clear()
+            self.item_index.clear()
+            if self.search_index is not None:
+                self.search_index.clear()
+            self.ctx.delete(self.collection)
         logger.info("[VLite.clear] Collection cleared.")
 
+    def warmup(self):
+        """Load the embedding model and run one forward pass ahead of the first request."""
+        self.model.warmup()
+
     def info(self):
         print("[VLite.info] Collection Information:")
         print(f"[VLite.info] Items: {self.count()}")
         print(f"[VLite.info] Collection file: {self.collection}")
         print(f"[VLite.info] Embedding model: {self.model}")
+        if self.model.cache is not None:
+            print(f"[VLite.info] Embedding cache: {self.model.cache.stats()}")
 
     def __repr__(self):
         return f"VLite(collection={self.collection}, device={self.device}, model={self.model})"
 
     def dump(self):
-        return self.index
\ No newline at end of file
+        return {
+            chunk_id: {**chunk_data, 'binary_vector': self.store.get(chunk_id).tolist()}
+            for chunk_id, chunk_data in self.index.items()
+        }
\ No newline at end of file
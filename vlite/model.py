@@ -1,53 +1,201 @@
 import numpy as np
-from transformers import AutoModel, AutoTokenizer
 import time
-import torch
+import threading
 from typing import Dict
 import logging
+from .hamming import hamming_distances, hamming_search, hamming_search_batch
+from .batching import token_budget_batches
+from .cache import EmbeddingCache
+from .backends import load_backend
+from .rescore import normalize, quantize_embeddings
+
+# The dtype embeddings of each precision are returned in
+PRECISION_DTYPES = {
+    "binary": np.uint8,
+    "int8": np.int8,
+    "float16": np.float16,
+    "float32": np.float32,
+}
+# Widths, in bits, binary codes can be cut to: the first `code_bits` features of each embedding are kept
+CODE_BITS = (128, 256, 512, 1024)
+DEFAULT_CODE_BITS = 512
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class EmbeddingModel:
-    def __init__(self, model_name="mixedbread-ai/mxbai-embed-large-v1", device='cpu', log_enabled=True):
+    def __init__(self, model_name="mixedbread-ai/mxbai-embed-large-v1", device='cpu', log_enabled=True, max_batch_tokens=16384, max_batch_size=256, cache=None, backend="torch", backend_options=None, quantize=False, code_bits=DEFAULT_CODE_BITS):
         self.log_enabled = log_enabled
         start_time = time.time()
         self.device = device
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name).to(self.device)
-        self.dimension = 1024 #hardcoded
-        self.context_length = 512 #hardcoded
+        self.model_name = model_name
+        # The backend runs the transformer: "torch" (PyTorch on `device`) or "onnx" (ONNX Runtime on the CPU)
+        # With `quantize`, the linear layers run with dynamically quantized int8 weights
+        if quantize:
+            backend_options = {**(backend_options or {}), 'quantize': True}
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        # The tokenizer and the backend are loaded on first use, see load()
+        self._tokenizer = None
+        self._backend = None
+        self._load_lock = threading.Lock()
+        # Defaults of the default model, replaced by the model's configuration once it is loaded
+        self.dimension = 1024
+        self.context_length = 512
+        if code_bits not in CODE_BITS:
+            raise ValueError(f"Unsupported code width: {code_bits} bits, expected one of {CODE_BITS}")
+        self.code_bits = code_bits
         self.embedding_dtype = "float32"
+        # Forward passes are bounded to this many (padded) tokens and inputs
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        # Optional EmbeddingCache consulted before running the model
+        self.cache = cache
         end_time = time.time()
         logger.debug(f"[EmbeddingModel.__init__] Execution time: {end_time - start_time:.5f} seconds")
 
+    @property
+    def loaded(self):
+        return self._backend is not None
+
+    def load(self):
+        """Load the tokenizer and the backend, unless they are loaded already."""
+        with self._load_lock:
+            if self._backend is not None:
+                return self
+            start_time = time.time()
+            from transformers import AutoConfig, AutoTokenizer
+            config = AutoConfig.from_pretrained(self.model_name)
+            self.dimension = getattr(config, "hidden_size", self.dimension)
+            self.context_length = getattr(config, "max_position_embeddings", self.context_length)
+            if self.code_bits > self.dimension:
+                raise ValueError(f"{self.model_name} embeddings have {self.dimension} features, too few for {self.code_bits}-bit codes")
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self._backend = load_backend(self.backend_name, self.model_name, device=self.device, **self.backend_options)
+            end_time = time.time()
+            logger.info(f"[EmbeddingModel.load] Loaded {self.model_name} ({self.backend_name}) in {end_time - start_time:.5f} seconds")
+        return self
+
+    def warmup(self):
+        """Load the model and run one forward pass, so the first real request pays for neither."""
+        self.load()
+        self.embed_texts(["warmup"])
+        return self
+
+    @property
+    def tokenizer(self):
+        return self.load()._tokenizer
+
+    @property
+    def backend(self):
+        return self.load()._backend
+
     def embed(self, texts, precision="binary"):
-        logger.info(f"[EmbeddingModel.embed] Embedding texts with precision: {precision}")
+        return self.embed_many(texts, (precision,))[0]
+
+    def embed_many(self, texts, precisions, encodings=None):
+        """
+        Embed `texts` with a single pass through the model and return their embeddings in each of
+        `precisions`: "binary" (packed sign bits), "int8" or "float16" (L2-normalized, for rescoring)
+        or "float32" (L2-normalized). `encodings`, from `tokenize(texts)`, skips tokenizing again.
+        """
+        logger.info(f"[EmbeddingModel.embed] Embedding texts with precisions: {precisions}")
         if isinstance(texts, str):
             texts = [texts]
-        # Tokenization
-        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors='pt').to(self.device)
-        # Forward pass
-        with torch.no_grad():
-            outputs = self.model(**inputs).last_hidden_state
-        # Normalize embeddings across the feature dimension for all tokens
-        outputs = torch.nn.functional.normalize(outputs, p=2, dim=2)
-        embeddings = outputs[:, 0]  # Use the [CLS] token's embedding after normalization
+        for precision in precisions:
+            if precision not in PRECISION_DTYPES:
+                raise ValueError(f"Unsupported precision: {precision}")
+        if self.cache is None:
+            return self.embed_texts(texts, precisions, encodings)
+        cached = {
+            precision: self.cache.get_many([self.cache_key(precision, text) for text in texts])
+            for precision in precisions
+        }
+        # Texts repeated within the call are embedded once
+        missing = {}
+        for idx, text in enumerate(texts):
+            if any(cached[precision][idx] is None for precision in precisions):
+                missing.setdefault(text, idx)
+        if missing:
+            if encodings is not None:
+                encodings = {key: [values[idx] for idx in missing.values()] for key, values in encodings.items()}
+            missing = {text: position for position, text in enumerate(missing)}
+            computed = self.embed_texts(list(missing), precisions, encodings)
+            for precision, embeddings in zip(precisions, computed):
+                self.cache.put_many([self.cache_key(precision, text) for text in missing], embeddings)
+                cached[precision] = [
+                    embeddings[missing[text]] if code is None else code
+                    for text, code in zip(texts, cached[precision])
+                ]
+        logger.debug(f"[EmbeddingModel.embed] Embedded {len(missing)} of {len(texts)} texts, cache: {self.cache.stats()}")
+        # The cache holds raw bytes, view them in the dtype of each precision
+        return [
+            np.stack([np.asarray(code).reshape(-1).view(np.uint8).view(PRECISION_DTYPES[precision]) for code in cached[precision]])
+            for precision in precisions
+        ]
+
+    def cache_key(self, precision, text):
+        # Binary codes of different widths are different embeddings
         if precision == "binary":
-            # Optionally reduce dimension to 512 if needed
-            embeddings = embeddings[:, :512]  # Slicing the first 512 features if reduction is desired
-            # Convert to binary (0 or 1)
-            binary_embeddings = (embeddings > 0).byte()
-            logger.debug(f"[EmbeddingModel.embed] Shape before packing (binary): {binary_embeddings.shape}")
-            # Convert binary embeddings to numpy and pack bits
-            quantized_embeddings = np.packbits(binary_embeddings.cpu().numpy(), axis=-1).astype(np.int8) - 128
-            logger.debug(f"[EmbeddingModel.embed] Quantized embeddings shape: {quantized_embeddings.shape}")
-            return quantized_embeddings
-        else:
-            raise ValueError(f"Unsupported precision: {precision}")
+            precision = f"binary{self.code_bits}"
+        # So are those of different backends, or of a model with quantized weights, whose signs can differ
+        runtime = f"{self.model_name}\0{self.backend_name}"
+        if self.backend_options.get("quantize"):
+            runtime += "\0int8"
+        return EmbeddingCache.key(runtime, precision, text)
+
+    def tokenize(self, texts, tokenizer=None):
+        """
+        Tokenize `texts` without padding; each micro-batch is only padded to its own longest input.
+        Fast tokenizers are not reentrant, so a thread tokenizing while another embeds passes its
+        own copy of the model's `tokenizer`.
+        """
+        tokenizer = tokenizer if tokenizer is not None else self.tokenizer
+        return dict(tokenizer(texts, truncation=True))
 
-    def pooling(self, outputs: torch.Tensor, inputs: Dict, strategy: str = 'cls') -> np.ndarray:
+    def embed_texts(self, texts, precisions=("binary",), encodings=None):
+        if encodings is None:
+            encodings = self.tokenize(texts)
+        lengths = [len(input_ids) for input_ids in encodings['input_ids']]
+        batches = token_budget_batches(lengths, self.max_batch_tokens, self.max_batch_size)
+        logger.debug(f"[EmbeddingModel.embed_texts] Embedding {len(texts)} texts in {len(batches)} batches")
+        outputs = [None] * len(precisions)
+        for batch in batches:
+            inputs = self.tokenizer.pad(
+                {key: [values[i] for i in batch] for key, values in encodings.items()},
+                padding=True,
+                return_tensors='np'
+            )
+            # Forward pass, the backend returns the [CLS] token's embedding
+            embeddings = self.backend(inputs)
+            for idx, precision in enumerate(precisions):
+                quantized = self.quantize(embeddings, precision)
+                if outputs[idx] is None:
+                    outputs[idx] = np.zeros((len(texts), quantized.shape[1]), dtype=quantized.dtype)
+                # Outputs are written back at the original positions of the batch's inputs
+                outputs[idx][batch] = quantized
+        logger.debug(f"[EmbeddingModel.embed_texts] Embedded {len(texts)} texts")
+        return outputs
+
+    def quantize(self, embeddings, precision):
+        if precision == "float32":
+            return normalize(embeddings)
+        if precision != "binary":
+            return quantize_embeddings(embeddings, precision)
+        # L2 normalization does not change the sign of any feature, so the codes are taken before it
+        if embeddings.shape[1] < self.code_bits:
+            raise ValueError(f"Expected embeddings of at least {self.code_bits} features, got {embeddings.shape[1]}")
+        # Keep the first code_bits features; Matryoshka-trained models front-load them with information
+        embeddings = embeddings[:, :self.code_bits]
+        # Convert to binary (0 or 1)
+        binary_embeddings = (embeddings > 0).astype(np.uint8)
+        logger.debug(f"[EmbeddingModel.quantize] Shape before packing (binary): {binary_embeddings.shape}")
+        # Pack bits
+        return np.packbits(binary_embeddings, axis=-1)
+
+    def pooling(self, outputs: "torch.Tensor", inputs: Dict, strategy: str = 'cls') -> np.ndarray:
+        import torch
         logger.info(f"[EmbeddingModel.pooling] Pooling strategy: {strategy}")
         if strategy == 'cls':
             pooled_output = outputs[:, 0]
@@ -60,7 +208,8 @@ class EmbeddingModel:
             raise NotImplementedError
         return pooled_output
 
-    def normalize(self, v: torch.Tensor) -> torch.Tensor:
+    def normalize(self, v: "torch.Tensor") -> "torch.Tensor":
+        import torch
         logger.debug("[EmbeddingModel.normalize] Normalizing embeddings")
         return torch.nn.functional.normalize(v, p=2, dim=1)
 
@@ -71,20 +220,16 @@ class EmbeddingModel:
     def hamming_distance(self, embedding1, embedding2):
         logger.debug("[EmbeddingModel.hamming_distance] Calculating Hamming distance")
         # Calculate Hamming distance directly using bitwise operations
-        return np.sum(embedding1 != embedding2, axis=1)
+        return hamming_distances(embedding1, embedding2)
 
-    def search(self, query_embedding, embeddings, top_k):
+    def search(self, query_embedding, embeddings, top_k, mask=None, rows=None):
         logger.info(f"[EmbeddingModel.search] Searching for top {top_k} similar embeddings")
-        embeddings_tensor = torch.from_numpy(embeddings).to(self.device).to(dtype=torch.float32)
-        query_embedding_tensor = torch.from_numpy(query_embedding).unsqueeze(0).to(self.device).to(dtype=torch.float32)
-        
-        # Calculate Hamming distance
-        distances = torch.sum(query_embedding_tensor.int() ^ embeddings_tensor.int(), dim=1)
-        
-        top_k = min(top_k, len(embeddings))  # Limit top_k to the number of embeddings
-        top_k_indices = torch.topk(distances, top_k, largest=False).indices.cpu().numpy()
-
-        
-        top_k_scores = distances[top_k_indices].cpu().numpy()
+        # Blockwise bit-level Hamming scan with partial top-k selection; rows outside the mask (or `rows`) are skipped
+        top_k_indices, top_k_scores = hamming_search(query_embedding, embeddings, top_k, mask=mask, rows=rows)
 
         return top_k_indices, top_k_scores
+
+    def search_batch(self, query_embeddings, embeddings, top_k, mask=None, rows=None):
+        logger.info(f"[EmbeddingModel.search_batch] Searching for top {top_k} similar embeddings for {len(query_embeddings)} queries")
+        # Tiled (queries x corpus) Hamming scan shared by all queries of the batch
+        return hamming_search_batch(query_embeddings, embeddings, top_k, mask=mask, rows=rows)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Precisions embeddings can be stored in for rescoring, and the dtype of each
+RESCORE_DTYPES = {
+    "int8": np.int8,
+    "float16": np.float16,
+}
+INT8_MAX = 127
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def quantize_embeddings(embeddings, precision):
+    """
+    L2-normalize float embeddings and store them as int8 (scalar-quantized) or float16.
+
+    int8 embeddings are scaled so their largest feature maps to 127, which spends the whole
+    int8 range on every vector. The scale is not kept: rescoring only compares directions.
+    """
+    embeddings = normalize(embeddings)
+    if precision == "int8":
+        scale = INT8_MAX / np.maximum(np.abs(embeddings).max(axis=-1, keepdims=True), 1e-12)
+        return np.clip(np.rint(embeddings * scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+    if precision == "float16":
+        return embeddings.astype(np.float16)
+    raise ValueError(f"Unsupported rescore precision: {precision}, expected one of {sorted(RESCORE_DTYPES)}")
+
+
+def sign_embeddings(codes, size, precision):
+    """
+    Rescoring embeddings for rows that only have packed binary codes: the +-1 vector of their
+    bits, zero-padded (or cut) to `size` features, so they still rank consistently with the rest.
+    """
+    signs = np.unpackbits(np.asarray(codes, dtype=np.uint8), axis=-1).astype(np.float32) * 2 - 1
+    embeddings = np.zeros((len(signs), size), dtype=np.float32)
+    width = min(size, signs.shape[1])
+    embeddings[:, :width] = signs[:, :width]
+    return quantize_embeddings(embeddings, precision)
+
+
+def dequantize(embeddings):
+    """Back to unit-length float32 embeddings, whatever precision they were stored in."""
+    return normalize(embeddings)
+
+
+def rescore(query_embedding, embeddings, rows, top_k):
+    """
+    Rerank candidate `rows` by the dot product of their stored embeddings with a float query.
+
+    Args:
+        query_embedding (np.ndarray): The float query embedding, of shape (size,).
+        embeddings (np.ndarray): The stored int8 or float16 embeddings, of shape (n, size).
+        rows (np.ndarray): The candidate rows, such as the Hamming top-k.
+        top_k (int): The number of rows to return.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The best rows and their cosine distances (1 - similarity), nearest first.
+    """
+    query_embedding = normalize(query_embedding).reshape(-1)
+    candidates = dequantize(embeddings[rows])
+    width = min(len(query_embedding), candidates.shape[1])
+    distances = 1 - candidates[:, :width] @ query_embedding[:width]
+    order = np.lexsort((rows, distances))[:top_k]
+    return rows[order], distances[order]
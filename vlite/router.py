@@ -0,0 +1,241 @@
+import time
+import zlib
+import threading
+import multiprocessing
+from uuid import uuid4
+import numpy as np
+import logging
+from .device import resolve_device
+from .model import DEFAULT_CODE_BITS, EmbeddingModel
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def shard_of(item_id, num_shards):
+    """The shard an item is written to: a stable hash of its id, the same in every process."""
+    return zlib.crc32(str(item_id).encode("utf-8")) % num_shards
+
+
+def merge_results(shard_results, top_k, return_scores=False):
+    """
+    Merge the (id, text, metadata, score) results of every shard for one query into one list.
+
+    Args:
+        shard_results (List[Tuple[str, list]]): The collection of every shard and its results, nearest first.
+        top_k (int): The number of results to return.
+        return_scores (bool, optional): Whether to keep the scores in the results.
+
+    Returns:
+        list: The `top_k` results with the smallest scores, as (id, text, metadata, collection) tuples,
+        or (id, text, metadata, score, collection) ones with `return_scores`. Ties keep shard order.
+    """
+    merged = [(idx, text, metadata, score, collection) for collection, results in shard_results for idx, text, metadata, score in results]
+    merged.sort(key=lambda result: result[3])
+    if return_scores:
+        return merged[:top_k]
+    return [(idx, text, metadata, collection) for idx, text, metadata, _, collection in merged[:top_k]]
+
+
+def _search_shard(vlite, vectors, top_k, where):
+    # An empty shard has nothing to compare with, rather than an error
+    if not len(vlite.store):
+        return [[] for _ in vectors]
+    return vlite.retrieve_by_vectors(vectors, top_k=top_k, where=where, return_scores=True)
+
+
+def _count(vlite):
+    return vlite.count()
+
+
+# Calls served by the workers on top of the VLite methods
+WORKER_CALLS = {
+    "_search_shard": _search_shard,
+    "_count": _count,
+}
+
+
+def _serve(connection, collection, options):
+    """Worker process: open one collection and run the calls the router sends until it sends None."""
+    from .main import VLite
+    try:
+        vlite = VLite(collection=collection, **options)
+    except Exception as error:
+        connection.send((False, error))
+        return
+    connection.send((True, None))
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        name, args, kwargs = message
+        try:
+            if name in WORKER_CALLS:
+                result = WORKER_CALLS[name](vlite, *args, **kwargs)
+            else:
+                result = getattr(vlite, name)(*args, **kwargs)
+            connection.send((True, result))
+        except Exception as error:
+            connection.send((False, error))
+    connection.close()
+
+
+class VLiteRouter:
+    """
+    Serve several collections, such as the shards of one logical collection, from worker processes.
+
+    Every collection is opened by a VLite in its own process, so searches run on as many cores as
+    there are collections and no single process has to hold every collection. A query is embedded
+    once by the router and its float vector is sent to every worker; each worker returns its own
+    top_k and the router merges them by score, tagging every result with the collection it came
+    from. All collections are opened with the same options, so their scores are comparable.
+
+    Items are added to the collection picked by a hash of their id; updates, deletes and reads go
+    to every collection, so items placed some other way are found too. Workers only load the
+    embedding model if they are asked to embed added texts.
+
+    Calls are serialized by a lock; each call runs on all the workers at once.
+    """
+
+    def __init__(self, collections, model_name='mixedbread-ai/mxbai-embed-large-v1', device=None, backend="torch", quantize=False, **options):
+        start_time = time.time()
+        if not collections:
+            raise ValueError("VLiteRouter needs at least one collection")
+        self.collections = list(collections)
+        options = dict(options, model_name=model_name, device=device, backend=backend, quantize=quantize)
+        # Loaded by the first query that needs embedding
+        self.model = EmbeddingModel(model_name, device=resolve_device(device), backend=backend, quantize=quantize, code_bits=options.get("code_bits") or DEFAULT_CODE_BITS)
+        self.lock = threading.Lock()
+        # Spawned workers do not inherit the threads or the CUDA state of this process
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        for collection in self.collections:
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_serve, args=(worker_connection, collection, options), name=f"vlite-{collection}", daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        try:
+            self._gather(range(len(self.collections)))
+        except Exception:
+            self.close()
+            raise
+        end_time = time.time()
+        logger.info(f"[VLiteRouter.__init__] Started {len(self.collections)} workers in {end_time - start_time:.5f} seconds")
+
+    def _receive(self, shard):
+        try:
+            ok, result = self.connections[shard].recv()
+        except EOFError:
+            raise RuntimeError(f"The worker of collection {self.collections[shard]} exited") from None
+        if not ok:
+            raise result
+        return result
+
+    def _gather(self, shards):
+        """Receive the reply of every shard; the first error is raised once all replies are in."""
+        results, errors = [], []
+        for shard in shards:
+            try:
+                results.append(self._receive(shard))
+            except Exception as error:
+                results.append(None)
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        return results
+
+    def _fan_out(self, name, *args, **kwargs):
+        with self.lock:
+            for connection in self.connections:
+                connection.send((name, args, kwargs))
+            return self._gather(range(len(self.connections)))
+
+    def call(self, collection, name, *args, **kwargs):
+        """Run the VLite method `name` on the worker of one collection and return its result."""
+        shard = self.collections.index(collection)
+        with self.lock:
+            self.connections[shard].send((name, args, kwargs))
+            return self._receive(shard)
+
+    def retrieve(self, text, top_k=5, where=None, return_scores=False):
+        return self.retrieve_batch([text], top_k, where, return_scores)[0]
+
+    def retrieve_batch(self, texts, top_k=5, where=None, return_scores=False):
+        start_time = time.time()
+        vectors = self.model.embed(texts, precision="float32")
+        results = self.retrieve_by_vectors(vectors, top_k, where, return_scores)
+        end_time = time.time()
+        logger.debug(f"[VLiteRouter.retrieve_batch] Execution time: {end_time - start_time:.5f} seconds")
+        return results
+
+    def retrieve_by_vector(self, vector, top_k=5, where=None, return_scores=False):
+        return self.retrieve_by_vectors(np.asarray(vector).reshape(1, -1), top_k, where, return_scores)[0]
+
+    def retrieve_by_vectors(self, vectors, top_k=5, where=None, return_scores=False):
+        """
+        Search every collection for the `top_k` nearest items of each query vector, a float
+        embedding or a packed binary code, and merge the results of all collections.
+
+        Returns:
+            List[list]: For every query, (id, text, metadata, collection) tuples, nearest first;
+            with `return_scores`, (id, text, metadata, score, collection) tuples.
+        """
+        vectors = np.asarray(vectors)
+        shard_results = self._fan_out("_search_shard", vectors, top_k, where)
+        return [
+            merge_results(list(zip(self.collections, query_results)), top_k, return_scores)
+            for query_results in zip(*shard_results)
+        ]
+
+    def add(self, data, metadata=None, item_id=None, need_chunks=False, fast=True):
+        """Add an item to the collection its id hashes to, and return that collection."""
+        item_id = str(uuid4()) if item_id is None else item_id
+        collection = self.collections[shard_of(item_id, len(self.collections))]
+        self.call(collection, "add", data, metadata=metadata, item_id=item_id, need_chunks=need_chunks, fast=fast)
+        return collection
+
+    def update(self, id, text=None, metadata=None, vector=None):
+        """Update the item in whichever collection holds it, including ones not filled by this router."""
+        return any(self._fan_out("update", id, text=text, metadata=metadata, vector=vector))
+
+    def delete(self, ids):
+        return sum(self._fan_out("delete", ids))
+
+    def get(self, ids=None, where=None):
+        """The items of every collection, as (id, text, metadata, collection) tuples."""
+        return [
+            (*item, collection)
+            for collection, items in zip(self.collections, self._fan_out("get", ids=ids, where=where))
+            for item in items
+        ]
+
+    def count(self):
+        return sum(self._fan_out("_count"))
+
+    def save(self):
+        self._fan_out("save")
+
+    def close(self):
+        """Stop the workers; collections are not saved, changes since the last save stay in their logs."""
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self.connections, self.processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"VLiteRouter(collections={self.collections}, model={self.model})"
@@ -1,9 +1,10 @@
 from fastapi import FastAPI, HTTPException, File, UploadFile
 from pydantic import BaseModel
+import numpy as np
 from typing import List, Optional, Union
 from vlite.main import VLite
 from vlite.utils import process_file, process_pdf, process_webpage
-from setup import __version__
+from vlite.version import __version__
 
 app = FastAPI(
     title="VLite API",
@@ -22,6 +23,12 @@ class RetrieveRequest(BaseModel):
     top_k: int = 5
     metadata: Optional[dict] = None
 
+class RetrieveVectorRequest(BaseModel):
+    vectors: List[List[float]]
+    binary: bool = False
+    top_k: int = 5
+    metadata: Optional[dict] = None
+
 class UpdateRequest(BaseModel):
     text: Optional[str] = None
     metadata: Optional[dict] = None
@@ -110,6 +117,29 @@ async def retrieve_text(request: RetrieveRequest):
     results = vlite.retrieve(text=request.text, top_k=request.top_k, metadata=request.metadata)
     return results
 
+@app.post("/retrieve_vector", response_model=List[List[tuple]], summary="Retrieve similar texts for query vectors")
+async def retrieve_vector(request: RetrieveVectorRequest):
+    """
+    Retrieve similar texts from the VLite collection for queries that are already embedded, without running the embedding model.
+
+    - **request**: The retrieval request parameters.
+        - **vectors**: The query vectors: float embeddings, binarized on the fly, or packed binary codes.
+        - **binary** (optional): Whether the vectors are packed binary codes (bytes in [0, 255]). Default is False.
+        - **top_k** (optional): The number of top similar texts to retrieve per query. Default is 5.
+        - **metadata** (optional): Metadata to filter the retrieved texts.
+
+    Returns:
+    - For each query vector, a list of tuples containing the ID, text, metadata and distance of the similar texts.
+    """
+    vectors = np.array(request.vectors, dtype=np.float32)
+    if request.binary:
+        vectors = vectors.astype(np.int64)
+    try:
+        results = vlite.retrieve_by_vectors(vectors, top_k=request.top_k, where=request.metadata, return_scores=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return results
+
 @app.delete("/delete", response_model=int, summary="Delete items from the collection")
 async def delete_texts(ids: Union[str, List[str]]):
     """
@@ -0,0 +1,207 @@
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def as_binary_codes(vectors):
+    """
+    Convert binary vectors to packed uint8 codes.
+
+    Codes produced by older versions of EmbeddingModel.embed are int8 values shifted by -128
+    (and are stored that way in VERSION 1 .ctx files, as float32). Those are shifted back so
+    every code in the store is the plain output of np.packbits. Codes of any other integer dtype
+    are taken as packed bytes already.
+    """
+    vectors = np.asarray(vectors)
+    if vectors.dtype == np.uint8:
+        return vectors
+    if vectors.dtype == np.int8 or np.issubdtype(vectors.dtype, np.floating):
+        return (vectors.astype(np.int16) + 128).astype(np.uint8)
+    # Any other integer dtype holds plain packed bytes
+    if vectors.size and (vectors.min() < 0 or vectors.max() > 255):
+        raise ValueError("Packed binary codes must be bytes in [0, 255]")
+    return vectors.astype(np.uint8)
+
+
+def as_query_codes(vectors, code_size):
+    """
+    Convert query vectors to packed uint8 codes of `code_size` bytes.
+
+    Float vectors are binarized on the fly like EmbeddingModel.embed does: their first
+    code_size * 8 features are thresholded at zero and packed. Integer vectors are taken as
+    packed codes already, in uint8 or legacy int8 form.
+    """
+    vectors = np.asarray(vectors)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if np.issubdtype(vectors.dtype, np.floating):
+        if vectors.shape[1] < code_size * 8:
+            raise ValueError(f"Expected float vectors of at least {code_size * 8} features, got {vectors.shape[1]}")
+        return np.packbits(vectors[:, :code_size * 8] > 0, axis=1)
+    if vectors.shape[1] != code_size:
+        raise ValueError(f"Expected binary codes of {code_size} bytes, got {vectors.shape[1]}")
+    return as_binary_codes(vectors)
+
+
+class BinaryVectorStore:
+    """
+    Columnar storage for the packed binary codes of a collection.
+
+    All codes live in one preallocated uint8 matrix that grows geometrically. Row i of `codes`
+    belongs to the chunk `chunk_ids[i]` and is only searchable while `alive[i]` is set.
+
+    Optionally, row i of `vectors` holds a higher-precision (int8 or float16) embedding of the
+    same chunk, used to rescore the Hamming candidates.
+    """
+
+    def __init__(self, code_size=None, capacity=1024):
+        self.code_size = code_size
+        self.capacity = 0
+        self.size = 0
+        self.codes = np.zeros((0, code_size or 0), dtype=np.uint8)
+        self.chunk_ids = np.empty(0, dtype=object)
+        self.alive = np.zeros(0, dtype=bool)
+        self.rows = {}
+        self.vectors = None
+        self._initial_capacity = capacity
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.rows
+
+    def _reserve(self, n):
+        required = self.size + n
+        if required <= self.capacity:
+            return
+        capacity = max(self.capacity, self._initial_capacity)
+        while capacity < required:
+            capacity *= 2
+        codes = np.zeros((capacity, self.code_size), dtype=np.uint8)
+        if self.size:
+            codes[:self.size] = self.codes[:self.size]
+        chunk_ids = np.empty(capacity, dtype=object)
+        chunk_ids[:self.size] = self.chunk_ids[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        if self.vectors is not None:
+            vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=self.vectors.dtype)
+            vectors[:self.size] = self.vectors[:self.size]
+            self.vectors = vectors
+        self.codes, self.chunk_ids, self.alive = codes, chunk_ids, alive
+        self.capacity = capacity
+        logger.debug(f"[BinaryVectorStore._reserve] Grew capacity to {capacity} rows")
+
+    def attach(self, chunk_ids, codes, vectors=None):
+        """
+        Adopt an existing code matrix (and rescoring vectors), such as a memory map of a .ctx file,
+        without copying it. The matrix is only copied into memory once rows are appended.
+        """
+        self.code_size = codes.shape[1]
+        self.codes = codes
+        self.vectors = vectors
+        self.size = self.capacity = len(codes)
+        self.chunk_ids = np.empty(len(codes), dtype=object)
+        self.chunk_ids[:] = chunk_ids
+        self.alive = np.ones(len(codes), dtype=bool)
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+
+    def append(self, chunk_id, code):
+        return self.append_batch([chunk_id], [code])[0]
+
+    def append_batch(self, chunk_ids, codes, vectors=None):
+        codes = as_binary_codes(codes).reshape(len(chunk_ids), -1)
+        if self.code_size is None:
+            self.code_size = codes.shape[1]
+        elif codes.shape[1] != self.code_size:
+            raise ValueError(f"Expected binary codes of {self.code_size} bytes, got {codes.shape[1]}")
+        if vectors is not None:
+            vectors = np.asarray(vectors).reshape(len(chunk_ids), -1)
+            if self.vectors is None:
+                self.vectors = np.zeros((self.capacity, vectors.shape[1]), dtype=vectors.dtype)
+            elif vectors.shape[1] != self.vectors.shape[1]:
+                raise ValueError(f"Expected rescoring vectors of {self.vectors.shape[1]} features, got {vectors.shape[1]}")
+        self._reserve(len(chunk_ids))
+        start = self.size
+        rows = np.arange(start, start + len(chunk_ids))
+        self.codes[start:start + len(chunk_ids)] = codes
+        if vectors is not None:
+            self.vectors[start:start + len(chunk_ids)] = vectors
+        self.chunk_ids[start:start + len(chunk_ids)] = chunk_ids
+        self.alive[start:start + len(chunk_ids)] = True
+        self.size += len(chunk_ids)
+        for chunk_id, row in zip(chunk_ids, rows.tolist()):
+            previous = self.rows.get(chunk_id)
+            if previous is not None:
+                self.alive[previous] = False
+            self.rows[chunk_id] = row
+        return rows
+
+    def remove(self, chunk_id):
+        row = self.rows.pop(chunk_id, None)
+        if row is None:
+            return False
+        self.alive[row] = False
+        return True
+
+    def get(self, chunk_id):
+        return self.codes[self.rows[chunk_id]]
+
+    def set(self, chunk_id, code):
+        code = as_binary_codes(code).reshape(-1)
+        if code.shape[0] != self.code_size:
+            raise ValueError(f"Expected binary codes of {self.code_size} bytes, got {code.shape[0]}")
+        self.codes[self.rows[chunk_id]] = code
+
+    def set_vectors(self, vectors):
+        """Give every row written so far a rescoring vector."""
+        self.vectors = np.zeros((self.capacity, vectors.shape[1]), dtype=vectors.dtype)
+        self.vectors[:self.size] = vectors
+
+    def set_vector(self, chunk_id, vector):
+        self.vectors[self.rows[chunk_id]] = vector
+
+    def get_vector(self, chunk_id):
+        return self.vectors[self.rows[chunk_id]]
+
+    def dead_fraction(self):
+        """Fraction of the rows written so far that belong to deleted or replaced chunks."""
+        if not self.size:
+            return 0.0
+        return (self.size - len(self.rows)) / self.size
+
+    def compact(self):
+        """
+        Drop the rows of deleted and replaced chunks, keeping live rows in their current order.
+
+        The live codes are copied into newly allocated arrays, so views taken before compaction
+        stay valid. Returns the old row index of every new row, for remapping row-keyed structures.
+        """
+        live_rows = np.flatnonzero(self.alive[:self.size])
+        n = len(live_rows)
+        capacity = max(self._initial_capacity, n)
+        codes = np.zeros((capacity, self.code_size or 0), dtype=np.uint8)
+        codes[:n] = self.codes[live_rows]
+        chunk_ids = np.empty(capacity, dtype=object)
+        chunk_ids[:n] = self.chunk_ids[live_rows]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:n] = True
+        if self.vectors is not None:
+            vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=self.vectors.dtype)
+            vectors[:n] = self.vectors[live_rows]
+            self.vectors = vectors
+        logger.debug(f"[BinaryVectorStore.compact] Reclaimed {self.size - n} of {self.size} rows")
+        self.codes, self.chunk_ids, self.alive = codes, chunk_ids, alive
+        self.size, self.capacity = n, capacity
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(chunk_ids[:n].tolist())}
+        return live_rows
+
+    def view(self):
+        """Return zero-copy views of the codes and liveness of all rows written so far."""
+        return self.codes[:self.size], self.alive[:self.size]
+
+    def clear(self):
+        self.__init__(code_size=self.code_size, capacity=self._initial_capacity)
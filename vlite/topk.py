@@ -0,0 +1,64 @@
+import heapq
+import numpy as np
+
+
+def top_k_smallest(distances, top_k):
+    """Return the indices of the `top_k` smallest distances, in ascending order, without a full sort."""
+    top_k = min(top_k, len(distances))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < len(distances):
+        # Keep every tie of the k-th distance so the smaller rows win deterministically
+        kth = distances[np.argpartition(distances, top_k - 1)[top_k - 1]]
+        candidates = np.flatnonzero(distances <= kth)
+    else:
+        candidates = np.arange(len(distances))
+    order = np.lexsort((candidates, distances[candidates]))[:top_k]
+    return candidates[order]
+
+
+class TopK:
+    """
+    Bounded heap that keeps the `k` smallest (distance, row) pairs pushed into it.
+
+    Blocks of distances are reduced with np.argpartition first, so only k candidates per block
+    ever reach the heap. Ties are broken by the smaller row.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.dtype = np.int32
+
+    def __len__(self):
+        return len(self.heap)
+
+    def worst(self):
+        """The largest distance still kept, or None while fewer than k pairs were pushed."""
+        if len(self.heap) < self.k:
+            return None
+        return -self.heap[0][0]
+
+    def push(self, distances, rows):
+        if self.k <= 0 or not len(distances):
+            return
+        self.dtype = distances.dtype
+        selected = top_k_smallest(distances, self.k)
+        distances, rows = distances[selected], rows[selected]
+        worst = self.worst()
+        if worst is not None:
+            keep = distances <= worst
+            distances, rows = distances[keep], rows[keep]
+        for distance, row in zip(distances.tolist(), rows.tolist()):
+            item = (-distance, -row)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+
+    def result(self):
+        """Return the kept rows and distances, nearest first."""
+        items = sorted((-distance, -row) for distance, row in self.heap)
+        rows = np.array([row for _, row in items], dtype=np.int64)
+        distances = np.array([distance for distance, _ in items], dtype=self.dtype)
+        return rows, distances
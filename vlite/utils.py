@@ -1,26 +1,11 @@
 import os
 import re
-import PyPDF2
-import docx2txt
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 from typing import List
-import tiktoken
 import numpy as np
 import itertools
-import platform
-import subprocess
 
-try:
-    from surya.ocr import run_ocr
-    from surya.model.detection import segformer
-    from surya.model.recognition.model import load_model
-    from surya.model.recognition.processor import load_processor
-    from surya.input.load import load_from_file, load_pdf
-
-except ImportError:
-    run_ocr = None
+# Parsers, tokenizers and OCR models are imported by the functions that use them, so importing
+# vlite does not pay for them
 
 def chop_and_chunk(text, max_seq_length=512, fast=False):
     """
@@ -28,7 +13,10 @@ def chop_and_chunk(text, max_seq_length=512, fast=False):
     """
     if isinstance(text, str):
         text = [text]
-    enc = tiktoken.get_encoding("cl100k_base")
+    if not fast:
+        # Fast mode chunks by characters and never needs the encoding
+        import tiktoken
+        enc = tiktoken.get_encoding("cl100k_base")
     chunks = []
     for t in text:
         if fast:
@@ -61,7 +49,13 @@ def process_pdf(file_path: str, chunk_size: int = 512, use_ocr: bool = False, la
         List[str]: A list of text chunks.
     """
     if use_ocr:
-        if run_ocr is None:
+        try:
+            from surya.ocr import run_ocr
+            from surya.model.detection import segformer
+            from surya.model.recognition.model import load_model
+            from surya.model.recognition.processor import load_processor
+            from surya.input.load import load_pdf
+        except ImportError:
             raise ImportError("OCR functionality is not available. Please install vlite with OCR support: pip install vlite[ocr]")
         
         if langs is None:
@@ -77,6 +71,7 @@ def process_pdf(file_path: str, chunk_size: int = 512, use_ocr: bool = False, la
         print(predictions)
         text = [' '.join(result.text for result in prediction.text_lines) for prediction in predictions]
     else:
+        import PyPDF2
         print(f"Not using OCR for {file_path}")
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -113,6 +108,7 @@ def process_docx(file_path: str, chunk_size: int = 512) -> List[str]:
     Returns:
         List[str]: A list of text chunks.
     """
+    import docx2txt
     text = docx2txt.process(file_path)
     return chop_and_chunk(text, chunk_size)
 
@@ -126,6 +122,7 @@ def process_csv(file_path: str) -> List[str]:
     Returns:
         List[str]: A list of rows as strings.
     """
+    import pandas as pd
     df = pd.read_csv(file_path)
     rows = df.astype(str).values.tolist()
     return rows
@@ -161,6 +158,8 @@ def process_webpage(url: str, chunk_size: int = 512) -> List[str]:
     Returns:
         List[str]: A list of text chunks.
     """
+    import requests
+    from bs4 import BeautifulSoup
     response = requests.get(url)
     soup = BeautifulSoup(response.text, 'html.parser')
     text = soup.get_text()
@@ -215,6 +214,7 @@ def visualize_tokens(token_values: List[str]) -> None:
     print(("".join(interleaved) + "\u001b[0m"))
 
 def load_file(pdf_path):
+    import PyPDF2
     extracted_text = []
     with open(pdf_path, "rb") as file:
         reader = PyPDF2.PdfReader(file)
@@ -223,18 +223,15 @@ def load_file(pdf_path):
     return extracted_text
 
 def count_tokens(text):
+    import tiktoken
     enc = tiktoken.get_encoding("cl100k_base")
     token_ids = enc.encode(text, disallowed_special=())
     return len(token_ids)
 
 def check_cuda_available():
-    try:
-        subprocess.check_output(['nvidia-smi'])
-        return True
-    except Exception:
-        return False
+    from .device import cuda_available
+    return cuda_available()
 
 def check_mps_available():
-    if platform.system() == "Darwin" or platform.processor().upper() == "ARM":
-        return True
-    return False
\ No newline at end of file
+    from .device import mps_available
+    return mps_available()